@@ -0,0 +1,181 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+from metrics import CACHE_LOOKUPS
+
+
+def normalize_question(question: str) -> str:
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip(" ?!.")
+
+
+class _QuestionVectors:
+    """Unit vectors of one document's cached questions, rows of a preallocated matrix.
+
+    Freed rows are reused and the matrix doubles when full, so a lookup is
+    one matrix-vector product instead of stacking every vector again.
+    """
+
+    def __init__(self, dim: int, capacity: int = 16):
+        self.matrix = np.zeros((capacity, dim), dtype="float32")
+        self.keys = [None] * capacity
+        self.rows = {}
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def add(self, key, vector: np.ndarray):
+        row = self.rows.get(key)
+        if row is None:
+            if not self.free:
+                self._grow()
+            row = self.rows[key] = self.free.pop()
+            self.keys[row] = key
+        self.matrix[row] = vector
+
+    def remove(self, key):
+        row = self.rows.pop(key, None)
+        if row is not None:
+            self.keys[row] = None
+            self.free.append(row)
+
+    def best(self, query: np.ndarray):
+        """(key, cosine similarity) of the closest question."""
+        scores = self.matrix @ query
+        if self.free:
+            scores[self.free] = -np.inf
+        row = int(np.argmax(scores))
+        return self.keys[row], float(scores[row])
+
+    def _grow(self):
+        capacity = len(self.keys)
+        self.matrix = np.vstack([self.matrix, np.zeros_like(self.matrix)])
+        self.keys.extend([None] * capacity)
+        self.free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+
+class AnswerCache:
+    """Per-document cache of answers to previously asked questions.
+
+    The exact tier matches on the normalized question text. The optional
+    semantic tier (off by default) compares the question's embedding (the
+    one already used for retrieval) against cached questions for the same
+    document and reuses an answer when cosine similarity reaches
+    ``similarity``. Questions that differ only in a number or a name
+    ("clause 4" vs. "clause 5") can clear a high threshold, so enable it
+    only where such near-duplicates should share an answer.
+    Entries expire after ``ttl_seconds`` and the least recently used are
+    dropped beyond ``max_entries``.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: int = 3600, similarity: float = 0.95,
+                 semantic: bool = False):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self.semantic = semantic
+        self._entries = OrderedDict()  # (doc_id, question) -> (answer, stored_at)
+        self._vectors = {}  # doc_id -> _QuestionVectors
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _expired(self, stored_at: float) -> bool:
+        return time.time() - stored_at > self.ttl_seconds
+
+    def _drop(self, key):
+        del self._entries[key]
+        vectors = self._vectors.get(key[0])
+        if vectors is not None:
+            vectors.remove(key)
+            if not vectors.rows:
+                del self._vectors[key[0]]
+
+    def get(self, doc_id: str, question: str) -> Optional[str]:
+        """Exact-tier lookup; does not count a miss so a semantic lookup can follow."""
+        key = (doc_id, normalize_question(question))
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if self._expired(item[1]):
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            CACHE_LOOKUPS.inc(cache="answer", result="hit")
+            return item[0]
+
+    def get_similar(self, doc_id: str, query_vector: List[float]) -> Optional[str]:
+        if not self.semantic or query_vector is None:
+            with self._lock:
+                self.misses += 1
+            CACHE_LOOKUPS.inc(cache="answer", result="miss")
+            return None
+        query = self._unit(query_vector)
+        with self._lock:
+            vectors = self._vectors.get(doc_id)
+            while vectors is not None and vectors.rows and vectors.matrix.shape[1] == len(query):
+                key, score = vectors.best(query)
+                if score < self.similarity:
+                    break
+                answer, stored_at = self._entries[key]
+                if self._expired(stored_at):
+                    # Drop it and look again among the rest
+                    self._drop(key)
+                    vectors = self._vectors.get(doc_id)
+                    continue
+                self._entries.move_to_end(key)
+                self.semantic_hits += 1
+                CACHE_LOOKUPS.inc(cache="answer", result="hit")
+                return answer
+            self.misses += 1
+        CACHE_LOOKUPS.inc(cache="answer", result="miss")
+        return None
+
+    def put(self, doc_id: str, question: str, answer: str, query_vector: List[float] = None):
+        key = (doc_id, normalize_question(question))
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (answer, time.time())
+            if self.semantic and query_vector is not None:
+                vector = self._unit(query_vector)
+                vectors = self._vectors.get(doc_id)
+                if vectors is None or vectors.matrix.shape[1] != len(vector):
+                    vectors = self._vectors[doc_id] = _QuestionVectors(len(vector))
+                vectors.add(key, vector)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, doc_id: str):
+        """Drop the answers for ``doc_id``, including those stored under ``"<doc_id>:<version>"`` keys."""
+        prefix = doc_id + ":"
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == doc_id or k[0].startswith(prefix)]:
+                self._drop(key)
+            self.invalidations += 1
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype="float32")
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
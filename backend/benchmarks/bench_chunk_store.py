@@ -0,0 +1,190 @@
+"""Memory and access cost of the chunk store vs. per-chunk LangChain Documents.
+
+Usage (from the backend directory):
+    python benchmarks/bench_chunk_store.py                 # 10,000-page synthetic corpus
+    python benchmarks/bench_chunk_store.py --pages 2000
+
+Builds the chunks of a synthetic corpus (sample_pdfs.py text, split like
+ingestion.py does) and measures the Python heap each layout keeps alive
+with tracemalloc:
+
+  documents + FAISS docstore   what an upload held before: the chunk list
+                               plus the FAISS store's own Document copies
+  documents (reloaded)         a reloaded document: one Document list shared
+                               with an InMemoryDocstore
+  ChunkStore                   the columnar store in memory
+  ChunkStore (mmap)            the same store saved and memory-mapped
+
+and the same for the BM25 keyword index each document also keeps: the
+dict-of-dicts postings it used to have against BM25Index's flat arrays.
+Then it times random chunk reads, reading every text (the summary path),
+and a dense search through each docstore. FAISS vectors live outside the
+Python heap and are the same for every layout, so they are not counted.
+"""
+import argparse
+import gc
+from collections import Counter, defaultdict
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from langchain.text_splitter import RecursiveCharacterTextSplitter  # noqa: E402
+from langchain_community.docstore.in_memory import InMemoryDocstore  # noqa: E402
+from langchain_community.vectorstores import FAISS  # noqa: E402
+from langchain_core.documents import Document  # noqa: E402
+
+from chunk_store import ChunkDocuments, ChunkStore  # noqa: E402
+from document_registry import build_vectorstore  # noqa: E402
+from embedding_service import BatchingEmbeddings, fake_encoder  # noqa: E402
+from hybrid_retrieval import BM25Index, tokenize  # noqa: E402
+from ingestion import CHUNK_OVERLAP, CHUNK_SIZE  # noqa: E402
+from sample_pdfs import document_pages  # noqa: E402
+from vector_sync import chunk_hash  # noqa: E402
+
+DOC_ID = "0" * 32
+
+
+def corpus_documents(n_pages: int, seed: int):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = []
+    for page_number, lines in enumerate(document_pages(n_pages, seed)):
+        for piece in splitter.split_text("\n".join(lines)):
+            chunks.append(Document(page_content=piece, metadata={
+                "doc_id": DOC_ID, "source": "corpus.pdf", "page": page_number,
+                "chunk_id": len(chunks), "chunk_hash": chunk_hash(piece)}))
+    return chunks
+
+
+def measure(build):
+    """(object, Python heap bytes it keeps alive, seconds to build)."""
+    gc.collect()
+    tracemalloc.start()
+    began = time.perf_counter()
+    obj = build()
+    seconds = time.perf_counter() - began
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size, seconds
+
+
+def timed(fn, repeat=1):
+    began = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - began) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dim", type=int, default=16, help="fake vector size for the FAISS stores")
+    parser.add_argument("--reads", type=int, default=20000, help="random chunk reads to time")
+    args = parser.parse_args()
+
+    began = time.perf_counter()
+    texts_and_metadata = [(d.page_content, d.metadata) for d in corpus_documents(args.pages, args.seed)]
+    n = len(texts_and_metadata)
+    text_bytes = sum(len(t.encode("utf-8")) for t, _ in texts_and_metadata)
+    print(f"corpus: {args.pages} pages, {n} chunks, {text_bytes / 2**20:.1f} MiB of text "
+          f"({time.perf_counter() - began:.1f}s to generate)")
+    encode = fake_encoder(args.dim)
+    embeddings = BatchingEmbeddings(encode)
+    vectors = encode([t for t, _ in texts_and_metadata[:1]]) * n  # identical vectors: only docstores are compared
+
+    def fresh_documents():
+        # New text and hash strings, as ingestion and reloads allocate, so the heap counts them
+        return [Document(page_content=t.encode().decode(), metadata=dict(m, chunk_hash=m["chunk_hash"].encode().decode()))
+                for t, m in texts_and_metadata]
+
+    def uploaded():
+        docs = fresh_documents()
+        store = FAISS.from_embeddings([(d.page_content, v) for d, v in zip(docs, vectors)], embeddings,
+                                      metadatas=[d.metadata for d in docs])
+        return docs, store
+
+    def reloaded():
+        docs = fresh_documents()
+        ids = [str(i) for i in range(n)]
+        return docs, InMemoryDocstore(dict(zip(ids, docs))), dict(enumerate(ids))
+
+    rows = []
+    (docs, faiss_store), size, seconds = measure(uploaded)
+    rows.append(("documents + FAISS docstore", size, seconds))
+    index = faiss_store.index
+    del faiss_store
+    (_, docstore, _), size, seconds = measure(reloaded)
+    rows.append(("documents (reloaded)", size, seconds))
+    del docstore
+
+    store, size, seconds = measure(lambda: ChunkStore.from_documents(docs))
+    rows.append(("ChunkStore", size, seconds))
+    with tempfile.TemporaryDirectory() as directory:
+        store.save(directory)
+        mapped, size, seconds = measure(lambda: ChunkStore.open(directory))
+        rows.append(("ChunkStore (mmap)", size, seconds))
+
+        baseline = rows[0][1]
+        print(f"\n  {'layout':<28} {'heap MiB':>9} {'bytes/chunk':>12} {'vs. upload':>10} {'build s':>8}")
+        for name, size, seconds in rows:
+            print(f"  {name:<28} {size / 2**20:>9.1f} {size / n:>12.0f} {size / baseline:>9.1%} {seconds:>8.2f}")
+        on_disk = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+        print(f"  mapped files: {on_disk / 2**20:.1f} MiB, in the page cache and shared by workers once read")
+
+        texts = [t for t, _ in texts_and_metadata]
+        _, legacy_size, legacy_seconds = measure(lambda: bm25_postings_legacy(texts))
+        _, bm25_size, bm25_seconds = measure(lambda: BM25Index.from_texts(texts))
+        print(f"\n  {'keyword index':<28} {'heap MiB':>9} {'bytes/chunk':>12} {'vs. text':>10} {'build s':>8}")
+        for name, size, seconds in (("BM25 dict of dicts (before)", legacy_size, legacy_seconds),
+                                    ("BM25Index (CSR arrays)", bm25_size, bm25_seconds)):
+            print(f"  {name:<28} {size / 2**20:>9.1f} {size / n:>12.0f} {size / text_bytes:>9.1%} {seconds:>8.2f}")
+        print(f"  chunks + BM25 per document: {(rows[1][1] + legacy_size) / 2**20:.1f} MiB reloaded before, "
+              f"{(rows[2][1] + bm25_size) / 2**20:.1f} MiB with ChunkStore and BM25Index")
+
+        rng = random.Random(args.seed)
+        picks = [rng.randrange(n) for _ in range(args.reads)]
+        chunks = ChunkDocuments(mapped)
+        legacy = build_vectorstore_legacy(index, docs, embeddings)
+        compact = build_vectorstore(index, mapped, embeddings)
+        query = vectors[0]
+        print(f"\n  {'operation':<36} {'Documents':>12} {'ChunkStore':>12}")
+        for name, old, new, repeat in (
+            ("random Document read (us)", lambda: [docs[i] for i in picks],
+             lambda: [chunks[i] for i in picks], 1e6 / args.reads),
+            ("random text read (us)", lambda: [docs[i].page_content for i in picks],
+             lambda: [mapped.text(i) for i in picks], 1e6 / args.reads),
+            ("all texts, summary path (ms)", lambda: [d.page_content for d in docs],
+             lambda: list(mapped.texts()), 1e3),
+            ("dense search k=20 (ms)", lambda: legacy.similarity_search_by_vector(query, k=20),
+             lambda: compact.similarity_search_by_vector(query, k=20), 1e3),
+        ):
+            print(f"  {name:<36} {timed(old) * repeat:>12.2f} {timed(new) * repeat:>12.2f}")
+    embeddings.close()
+
+
+def bm25_postings_legacy(texts):
+    # The postings BM25Index kept before its flat arrays: term -> {chunk: term frequency}
+    postings = defaultdict(dict)
+    lengths = []
+    for doc, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            postings[term][doc] = tf
+        lengths.append(sum(counts.values()))
+    return postings, lengths
+
+
+def build_vectorstore_legacy(index, chunks, embeddings) -> FAISS:
+    # What document_registry.build_vectorstore did before the chunk store
+    ids = [str(i) for i in range(len(chunks))]
+    return FAISS(embedding_function=embeddings, index=index, docstore=InMemoryDocstore(dict(zip(ids, chunks))),
+                 index_to_docstore_id=dict(enumerate(ids)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Query-embedding throughput and latency: one call per request vs. micro-batching.
+
+Usage (from the backend directory):
+    python benchmarks/bench_embedding_service.py --concurrency 1 4 16 64
+    python benchmarks/bench_embedding_service.py --backend onnx_int8 --threads 4
+    python benchmarks/bench_embedding_service.py --fake   # no model download
+
+``direct`` embeds each request on its own through asyncio.to_thread, the
+way /ask did before. ``batched`` goes through BatchingEmbeddings. At each
+concurrency level, that many clients send queries back to back until
+``--requests`` are done. ``--fake`` swaps the model for a sleep of
+``--fake-fixed-ms`` plus ``--fake-per-text-ms`` per text, which mimics the
+fixed per-call overhead that batching amortizes.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embedding_service import BatchingEmbeddings, load_encoder  # noqa: E402
+
+QUERIES = [
+    "What is the termination notice period?",
+    "Who are the parties to the agreement?",
+    "Summarize section 4.2 on payment terms",
+    "What does clause 7b say about liability?",
+    "Which data is collected and for how long is it kept?",
+    "What are the main findings of the report?",
+]
+
+
+def fake_encoder(fixed_ms, per_text_ms, dim=384):
+    def encode(texts):
+        time.sleep((fixed_ms + per_text_ms * len(texts)) / 1000)
+        return [[0.0] * dim for _ in texts]
+    return encode
+
+
+async def run_level(name, embed, concurrency, total):
+    latencies = []
+    counter = iter(range(total))
+
+    async def client():
+        for i in counter:
+            began = time.perf_counter()
+            await embed(f"{QUERIES[i % len(QUERIES)]} #{i}")
+            latencies.append(time.perf_counter() - began)
+
+    began = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - began
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+    print(f"{name:<8} {concurrency:>11} {total / elapsed:>9.1f} {pct(0.5):>8.2f} {pct(0.95):>8.2f} {pct(0.99):>8.2f}")
+
+
+async def run(args):
+    if args.fake:
+        encode = fake_encoder(args.fake_fixed_ms, args.fake_per_text_ms)
+    else:
+        if args.threads:
+            import torch
+            torch.set_num_threads(args.threads)
+        encode = load_encoder(args.model, args.backend, args.batch_size)
+    encode(["warm up"])
+
+    print(f"{'mode':<8} {'concurrency':>11} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for concurrency in args.concurrency:
+        await run_level("direct", lambda q: asyncio.to_thread(encode, [q]), concurrency, args.requests)
+        service = BatchingEmbeddings(encode, max_batch_size=args.batch_size, max_wait_ms=args.max_wait_ms,
+                                     num_threads=args.threads)
+        await run_level("batched", service.aembed_query, concurrency, args.requests)
+        stats = service.stats()
+        service.close()
+        print(f"{'':<8} mean batch {stats['mean_batch_size']}, mean encode {stats['mean_encode_ms']} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.getenv("HF_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx", "onnx_int8"])
+    parser.add_argument("--threads", type=int, default=0, help="torch.set_num_threads (0 = library default)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--fake", action="store_true", help="use a sleep-based stand-in for the model")
+    parser.add_argument("--fake-fixed-ms", type=float, default=8)
+    parser.add_argument("--fake-per-text-ms", type=float, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Compare the index modes of index_factory on synthetic and real embeddings.
+
+Usage (from the backend directory):
+    python benchmarks/bench_index_modes.py --vectors 100000 --dim 384
+    python benchmarks/bench_index_modes.py --pdf-dir path/to/pdfs
+    python benchmarks/bench_index_modes.py --embeddings vectors.npy --nprobe 8 16 64 --ef-search 32 64 128
+
+For each mode it reports build time (training included), serialized bytes
+per vector, single-query p50/p95 latency and recall@k against the exact
+flat index. IVF modes are measured at every ``--nprobe`` and HNSW at every
+``--ef-search``. Synthetic vectors are drawn around random centroids so
+they cluster the way sentence embeddings do.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from index_factory import FLAT, HNSW, IVF_FLAT, IVF_PQ, build_index, tune  # noqa: E402
+
+
+def synthetic_vectors(n, dim, clusters=256, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((clusters, dim)).astype("float32")
+    vectors = centroids[rng.integers(0, clusters, n)] + 0.35 * rng.standard_normal((n, dim)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def pdf_vectors(pdf_dir, model_name):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from ingestion import CHUNK_OVERLAP, CHUNK_SIZE
+    from pdf_pages import count_pages, extract_pages
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    texts = []
+    for path in sorted(glob.glob(os.path.join(pdf_dir, "**", "*.pdf"), recursive=True)):
+        pages, _ = extract_pages(path, 0, count_pages(path))
+        texts.extend(piece for _, text in pages for piece in splitter.split_text(text))
+    embeddings = HuggingFaceEmbeddings(model_name=model_name, model_kwargs={"device": "cpu"})
+    return np.asarray(embeddings.embed_documents(texts), dtype="float32")
+
+
+def measure(index, queries, truth, k):
+    latencies = []
+    found = 0
+    for q, expected in zip(queries, truth):
+        began = time.perf_counter()
+        _, ids = index.search(q[None, :], k)
+        latencies.append((time.perf_counter() - began) * 1000)
+        found += len(set(ids[0]) & set(expected))
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+    return found / (len(queries) * k), pct(0.5), pct(0.95)
+
+
+def run(name, vectors, args):
+    n, dim = vectors.shape
+    rng = np.random.default_rng(1)
+    # Queries are perturbed corpus vectors, so each has real near neighbours
+    queries = vectors[rng.choice(n, args.queries, replace=False)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype("float32")
+    print(f"\n{name}: {n} vectors, dim {dim}, {args.queries} queries, recall@{args.k} vs. flat")
+    print(f"{'mode':<10} {'param':<14} {'build s':>8} {'B/vector':>9} {'recall':>7} {'p50 ms':>7} {'p95 ms':>7}")
+
+    truth = None
+    for mode in (FLAT, IVF_FLAT, IVF_PQ, HNSW):
+        began = time.perf_counter()
+        index = build_index(vectors, mode)
+        build_s = time.perf_counter() - began
+        bytes_per_vector = len(faiss.serialize_index(index)) / n
+        if mode == FLAT:
+            _, truth = index.search(queries, args.k)
+        if mode in (IVF_FLAT, IVF_PQ):
+            settings = [("nprobe", v, dict(nprobe=v)) for v in args.nprobe]
+        elif mode == HNSW:
+            settings = [("efSearch", v, dict(ef_search=v)) for v in args.ef_search]
+        else:
+            settings = [("exact", "", {})]
+        for label, value, params in settings:
+            tune(index, **params)
+            recall, p50, p95 = measure(index, queries, truth, args.k)
+            print(f"{mode:<10} {f'{label} {value}':<14} {build_s:>8.2f} {bytes_per_vector:>9.1f} "
+                  f"{recall:>7.3f} {p50:>7.3f} {p95:>7.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--embeddings", help=".npy file of real embeddings (n x dim float32)")
+    parser.add_argument("--pdf-dir", help="embed the PDFs in this directory as the real corpus")
+    parser.add_argument("--embedding-model", default=os.getenv("HF_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 32, 128])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[32, 64, 128])
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(1)
+    run("synthetic", synthetic_vectors(args.vectors, args.dim), args)
+    if args.embeddings:
+        run(os.path.basename(args.embeddings), np.load(args.embeddings).astype("float32"), args)
+    if args.pdf_dir:
+        run(args.pdf_dir, pdf_vectors(args.pdf_dir, args.embedding_model), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Compare cold-start time and RSS for rebuilding vs. memory-mapping a FAISS index.
+
+Usage (from the backend directory):
+    python benchmarks/bench_index_reload.py --chunks 50000 --dim 384 --workers 4
+
+A synthetic document is written with the DocumentRegistry on-disk layout.
+Each mode is then measured in fresh worker processes:
+
+- rebuild: re-add the stored vectors to a new IndexFlatL2. This is a lower
+  bound for the old behaviour, which also re-ran the embedder.
+- read:    faiss.read_index without mmap (full copy into process memory).
+- mmap:    read_index with the mmap flags used by the registry.
+
+For each mode it reports load time, the RSS growth of one worker, the
+private (non-shared) memory added across all workers, and peak RSS. Pages
+of a memory-mapped index are shared, so they only show up once in practice.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from document_registry import INDEX_FILE, read_index  # noqa: E402
+
+
+def rss_bytes():
+    """Return (resident, private) bytes; mmapped file pages count as shared."""
+    with open("/proc/self/statm") as f:
+        fields = [int(x) for x in f.read().split()]
+    page = os.sysconf("SC_PAGE_SIZE")
+    return fields[1] * page, (fields[1] - fields[2]) * page
+
+
+def worker(mode, path, vectors_path, barrier, results):
+    start_rss, start_private = rss_bytes()
+    start = time.perf_counter()
+    if mode == "rebuild":
+        vectors = np.load(vectors_path)
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors)
+        del vectors
+    else:
+        index = read_index(os.path.join(path, INDEX_FILE.format(version=1)), mmap=(mode == "mmap"))
+    # Touch every vector once, as a first real search would
+    query = np.zeros((1, index.d), dtype="float32")
+    index.search(query, 4)
+    elapsed = time.perf_counter() - start
+    barrier.wait()
+    rss, private = rss_bytes()
+    results.put({
+        "load_s": elapsed,
+        "rss_delta": rss - start_rss,
+        "private_delta": private - start_private,
+        "maxrss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    })
+    barrier.wait()
+
+
+def run_mode(mode, path, vectors_path, workers):
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, path, vectors_path, barrier, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    rows = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return {
+        "mode": mode,
+        "load_s_mean": sum(r["load_s"] for r in rows) / len(rows),
+        "rss_delta_mb_mean": sum(r["rss_delta"] for r in rows) / len(rows) / 2**20,
+        "private_mb_total": sum(r["private_delta"] for r in rows) / 2**20,
+        "peak_rss_mb_max": max(r["maxrss"] for r in rows) / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="docmind-bench-")
+    try:
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((args.chunks, args.dim), dtype="float32")
+        index = faiss.IndexFlatL2(args.dim)
+        index.add(vectors)
+        faiss.write_index(index, os.path.join(tmp, INDEX_FILE.format(version=1)))
+        vectors_path = os.path.join(tmp, "vectors.npy")
+        np.save(vectors_path, vectors)
+        del vectors, index
+
+        results = [run_mode(mode, tmp, vectors_path, args.workers) for mode in ("rebuild", "read", "mmap")]
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.chunks} vectors x {args.dim} dims, {args.workers} workers "
+          f"(index size {args.chunks * args.dim * 4 / 2**20:.1f} MB)")
+    print(f"{'mode':<8} {'load (s)':>10} {'RSS/worker (MB)':>17} {'private total (MB)':>20} {'peak RSS (MB)':>15}")
+    for r in results:
+        print(f"{r['mode']:<8} {r['load_s_mean']:>10.3f} {r['rss_delta_mb_mean']:>17.1f} "
+              f"{r['private_mb_total']:>20.1f} {r['peak_rss_mb_max']:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
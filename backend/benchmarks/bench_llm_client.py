@@ -0,0 +1,57 @@
+"""Drive the shared LLM client at a given concurrency against the stub server.
+
+Usage (from the backend directory, with stub_llm_server.py running):
+    python benchmarks/bench_llm_client.py --base-url http://localhost:9100/v1 --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_client import LLMClient  # noqa: E402
+
+
+async def run(args):
+    client = LLMClient(args.model, api_key="stub", base_url=args.base_url, max_concurrency=args.concurrency)
+    latencies = []
+    failures = 0
+    gate = asyncio.Semaphore(args.concurrency)
+
+    async def one(i):
+        nonlocal failures
+        async with gate:
+            began = time.perf_counter()
+            try:
+                await client.complete(f"request {i}", max_tokens=args.max_tokens)
+                latencies.append(time.perf_counter() - began)
+            except Exception:
+                failures += 1
+
+    began = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - began
+    await client.aclose()
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else float("nan")
+    print(f"{args.requests} requests, concurrency {args.concurrency}: {elapsed:.2f}s, "
+          f"{args.requests / elapsed:.1f} req/s, {failures} failures")
+    if latencies:
+        print(f"latency mean {statistics.mean(latencies):.3f}s p50 {pct(0.5):.3f}s p95 {pct(0.95):.3f}s p99 {pct(0.99):.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:9100/v1")
+    parser.add_argument("--model", default="llama3-8b-8192")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--max-tokens", type=int, default=64)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
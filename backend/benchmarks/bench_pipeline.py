@@ -0,0 +1,133 @@
+"""Microbenchmarks for each ingestion and query stage: parse, split, embed, index, search.
+
+Usage (from the backend directory):
+    python benchmarks/bench_pipeline.py                      # sample PDFs, fake embedder, offline
+    python benchmarks/bench_pipeline.py --pdf-dir path/to/pdfs --model sentence-transformers/all-MiniLM-L6-v2
+    python benchmarks/bench_pipeline.py --backend onnx_int8 --index-mode hnsw
+
+Each stage runs in this process on one thread, so the numbers are the
+per-core cost that the app's worker pools multiply. By default documents
+come from sample_pdfs.py and vectors from the deterministic fake encoder,
+so everything runs offline. Pass ``--model`` to time a real embedding model.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from langchain.text_splitter import RecursiveCharacterTextSplitter  # noqa: E402
+
+from embedding_service import fake_encoder, load_encoder  # noqa: E402
+from hybrid_retrieval import BM25Index  # noqa: E402
+from index_factory import build_index, choose_mode, tune  # noqa: E402
+from ingestion import CHUNK_OVERLAP, CHUNK_SIZE  # noqa: E402
+from pdf_pages import count_pages, extract_pages  # noqa: E402
+from sample_pdfs import sample_pdfs  # noqa: E402
+
+QUERIES = [
+    "What is the termination notice period?",
+    "Summarize section 4.2 on payment terms",
+    "What does clause 7b say about liability?",
+    "How long is collected data retained?",
+    "Which values exceed the threshold in the table?",
+    "What remedy applies to a breach of warranty?",
+]
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pct = lambda p: samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+    return pct(0.5), pct(0.95), pct(0.99)
+
+
+def row(stage, items, unit, seconds, latencies=None):
+    rate = f"{items / seconds:>10.1f} {unit}/s" if seconds else f"{'-':>10} {unit}/s"
+    line = f"  {stage:<12} {items:>7} {unit:<7} {seconds:>8.3f} s {rate}"
+    if latencies:
+        line += "   p50 %.3f  p95 %.3f  p99 %.3f ms" % percentiles(latencies)
+    print(line)
+
+
+def run(name, path, encode, args):
+    print(f"\n{name} ({os.path.basename(path)})")
+
+    began = time.perf_counter()
+    n_pages = count_pages(path)
+    pages, _ = extract_pages(path, 0, n_pages)
+    row("parse", n_pages, "pages", time.perf_counter() - began)
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    began = time.perf_counter()
+    texts = [piece for _, text in pages for piece in splitter.split_text(text)]
+    row("split", len(texts), "chunks", time.perf_counter() - began)
+    if not texts:
+        print("  no text extracted")
+        return
+
+    began = time.perf_counter()
+    vectors = []
+    for start in range(0, len(texts), args.batch_size):
+        vectors.extend(encode(texts[start:start + args.batch_size]))
+    vectors = np.asarray(vectors, dtype="float32")
+    row("embed", len(texts), "chunks", time.perf_counter() - began)
+
+    mode = choose_mode(len(texts)) if args.index_mode == "auto" else args.index_mode
+    began = time.perf_counter()
+    index = tune(build_index(vectors, mode))
+    row(f"index {mode}", len(texts), "chunks", time.perf_counter() - began)
+
+    began = time.perf_counter()
+    bm25 = BM25Index.from_texts(texts)
+    row("bm25 build", len(texts), "chunks", time.perf_counter() - began)
+
+    queries = [QUERIES[i % len(QUERIES)] for i in range(args.queries)]
+    began = time.perf_counter()
+    query_vectors = np.asarray(encode(queries), dtype="float32")
+    row("embed query", len(queries), "queries", time.perf_counter() - began)
+
+    latencies = []
+    for q in query_vectors:
+        began = time.perf_counter()
+        index.search(q[None, :], args.k)
+        latencies.append(time.perf_counter() - began)
+    row("dense search", len(queries), "queries", sum(latencies), latencies)
+
+    latencies = []
+    for q in queries:
+        began = time.perf_counter()
+        bm25.search(q, args.k)
+        latencies.append(time.perf_counter() - began)
+    row("bm25 search", len(queries), "queries", sum(latencies), latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", help="benchmark these PDFs instead of the generated samples")
+    parser.add_argument("--model", help="sentence-transformers model to time instead of the fake encoder")
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx", "onnx_int8"])
+    parser.add_argument("--dim", type=int, default=384, help="fake encoder dimension")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--index-mode", default="auto", choices=["auto", "flat", "ivf_flat", "ivf_pq", "hnsw"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(1)
+    encode = load_encoder(args.model, args.backend, args.batch_size) if args.model else fake_encoder(args.dim)
+    encode(["warm up"])
+    print(f"encoder: {args.model or f'fake ({args.dim} dims)'}")
+    if args.pdf_dir:
+        paths = {os.path.basename(p): p for p in sorted(glob.glob(os.path.join(args.pdf_dir, "**", "*.pdf"), recursive=True))}
+    else:
+        paths = sample_pdfs()
+    for name, path in paths.items():
+        run(name, path, encode, args)
+
+
+if __name__ == "__main__":
+    main()
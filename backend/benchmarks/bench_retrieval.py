@@ -0,0 +1,153 @@
+"""Compare recall@k and retrieval latency of dense-only vs. hybrid retrieval.
+
+Usage (from the backend directory):
+    python benchmarks/bench_retrieval.py --pdf-dir path/to/pdfs --queries 300 --k 4
+    python benchmarks/bench_retrieval.py --pdf-dir path/to/pdfs --rerank-model cross-encoder/ms-marco-MiniLM-L-6-v2
+
+The PDFs are split exactly like ingestion does and embedded with
+``--embedding-model``. Queries are drawn from the corpus itself:
+
+- exact:  an identifier-like token (section number, clause id, code, name
+          with digits) plus the two words before it
+- phrase: an eight-word window of a chunk
+
+A query counts as recalled when a chunk containing its text is in the top
+k. Latency covers retrieval only; the query embedding is computed once up
+front because every mode shares it. Without ``--pdf-dir`` a synthetic
+corpus of numbered clauses is generated instead.
+"""
+import argparse
+import asyncio
+import glob
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from hybrid_retrieval import BM25Index, CrossEncoderReranker, HybridRetriever  # noqa: E402
+from ingestion import CHUNK_OVERLAP, CHUNK_SIZE  # noqa: E402
+from pdf_pages import count_pages, extract_pages  # noqa: E402
+
+WORDS = ("agreement party notice term payment service data report period liability "
+         "obligation section schedule clause fee delivery account record policy value").split()
+
+
+def load_pdf_texts(pdf_dir):
+    texts = []
+    for path in sorted(glob.glob(os.path.join(pdf_dir, "**", "*.pdf"), recursive=True)):
+        pages, _ = extract_pages(path, 0, count_pages(path))
+        texts.extend(text for _, text in pages if text.strip())
+    return texts
+
+
+def synthetic_texts(n_pages, seed=0):
+    rng = random.Random(seed)
+    pages = []
+    for p in range(n_pages):
+        lines = []
+        for s in range(1, 6):
+            body = " ".join(rng.choice(WORDS) for _ in range(rng.randint(25, 60)))
+            lines.append(f"Section {p + 1}.{s} clause C-{rng.randint(100, 999)} {body}.")
+        pages.append("\n".join(lines))
+    return pages
+
+
+def make_queries(chunks, n, seed=0):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n * 4):
+        if len(queries) >= n:
+            break
+        words = rng.choice(chunks).page_content.split()
+        if len(words) < 10:
+            continue
+        if len(queries) % 2 == 0:
+            ids = [i for i, w in enumerate(words) if i >= 2 and re.search(r"\d", w)]
+            if not ids:
+                continue
+            i = rng.choice(ids)
+            queries.append(("exact", " ".join(words[i - 2:i + 1])))
+        else:
+            i = rng.randrange(len(words) - 8)
+            queries.append(("phrase", " ".join(words[i:i + 8])))
+    return queries
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else float("nan")
+
+
+async def run(args):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    texts = load_pdf_texts(args.pdf_dir) if args.pdf_dir else synthetic_texts(args.synthetic_pages)
+    if not texts:
+        sys.exit(f"No PDF text found under {args.pdf_dir}")
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = [Document(page_content=piece) for text in texts for piece in splitter.split_text(text)]
+    for i, chunk in enumerate(chunks):
+        chunk.metadata["chunk_id"] = i
+    print(f"{len(texts)} pages, {len(chunks)} chunks")
+
+    embeddings = HuggingFaceEmbeddings(model_name=args.embedding_model, model_kwargs={"device": "cpu"})
+    began = time.perf_counter()
+    vectors = embeddings.embed_documents([c.page_content for c in chunks])
+    store = FAISS.from_embeddings([(c.page_content, v) for c, v in zip(chunks, vectors)], embeddings,
+                                  metadatas=[c.metadata for c in chunks])
+    print(f"embedded and indexed in {time.perf_counter() - began:.1f}s")
+    began = time.perf_counter()
+    bm25 = BM25Index.from_texts([c.page_content for c in chunks])
+    print(f"BM25 index built in {time.perf_counter() - began:.3f}s ({len(bm25.terms)} terms)")
+
+    queries = make_queries(chunks, args.queries)
+    query_vectors = embeddings.embed_documents([q for _, q in queries])
+
+    modes = {
+        "dense": None,
+        "hybrid": HybridRetriever(candidates=args.candidates),
+    }
+    if args.rerank_model:
+        reranker = CrossEncoderReranker(args.rerank_model)
+        reranker.rerank("warm up", ["warm up"])
+        modes["hybrid+rerank"] = HybridRetriever(candidates=args.candidates, reranker=reranker,
+                                                 rerank_top_n=args.rerank_top_n, budget_ms=args.budget_ms)
+
+    print(f"{'mode':<14} {'kind':<7} {'recall@' + str(args.k):>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, retriever in modes.items():
+        hits = {"exact": [], "phrase": []}
+        latencies = {"exact": [], "phrase": []}
+        for (kind, query), vector in zip(queries, query_vectors):
+            began = time.perf_counter()
+            if retriever is None:
+                docs = store.similarity_search_by_vector(vector, k=args.k)
+            else:
+                docs = await retriever.search(chunks, bm25, store, query, vector, k=args.k)
+            latencies[kind].append((time.perf_counter() - began) * 1000)
+            hits[kind].append(any(query in d.page_content for d in docs))
+        for kind, values in hits.items():
+            recall = sum(values) / len(values) if values else float("nan")
+            print(f"{name:<14} {kind:<7} {recall:>9.3f} {percentile(latencies[kind], 0.5):>8.2f} {percentile(latencies[kind], 0.95):>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", help="directory of PDFs to use as the corpus")
+    parser.add_argument("--synthetic-pages", type=int, default=200, help="pages to generate when no --pdf-dir is given")
+    parser.add_argument("--embedding-model", default=os.getenv("HF_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--rerank-model", default="")
+    parser.add_argument("--rerank-top-n", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=250)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
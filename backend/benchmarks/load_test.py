@@ -0,0 +1,313 @@
+"""Load test the FastAPI app end to end, offline, against local stand-ins.
+
+Usage (from the backend directory):
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --workloads ask evaluate --concurrency 1 8 32 --requests 200
+    python benchmarks/load_test.py --llm-latency 0.8 --tokens-per-second 100 --env RETRIEVAL_MODE=dense
+    python benchmarks/load_test.py --llm-requests-per-minute 300 --env LLM_FALLBACK_MODELS=llama3-70b-8192:llama3-8b-8192
+    python benchmarks/load_test.py --output before.json   # then compare with a run on your branch
+    python benchmarks/load_test.py --app-url http://localhost:8000 --app-pid 1234   # an app you started
+
+The harness starts stub_llm_server.py and ``uvicorn main:app`` with
+EMBEDDING_PROVIDER=fake and throwaway data directories, waits for /ready,
+uploads the "medium" sample document and then drives each workload
+(upload, ask, challenge, evaluate) at each concurrency level: that many
+clients send requests back to back until ``--requests`` are done. It
+reports throughput, p50/p95/p99 latency of successful requests, errors,
+and the peak RSS of the app and its worker processes during the level.
+
+Uploads cycle through ``--upload-variants`` distinct documents and ask
+questions are made unique, so caches only help as much as they would
+with real traffic; pass ``--repeat-questions`` to measure cache hits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+from sample_pdfs import SAMPLES, sample_pdfs  # noqa: E402
+
+QUESTIONS = [
+    "What is the termination notice period?",
+    "Who are the parties to the agreement?",
+    "Summarize section 4.2 on payment terms",
+    "What does clause 7b say about liability?",
+    "How long is collected data retained?",
+    "Which values exceed the threshold in the table?",
+    "What remedy applies to a breach of warranty?",
+    "Which law governs the agreement?",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _proc_status(pid, field):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _descendants(pid):
+    pids, todo = [], [pid]
+    while todo:
+        current = todo.pop()
+        pids.append(current)
+        for task in os.listdir(f"/proc/{current}/task") if os.path.isdir(f"/proc/{current}/task") else []:
+            try:
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    todo.extend(int(child) for child in f.read().split())
+            except OSError:
+                pass
+    return pids
+
+
+class RssSampler:
+    """Samples the summed RSS of a process and its children (Linux /proc)."""
+
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def current(self) -> int:
+        return sum(_proc_status(p, "VmRSS") for p in _descendants(self.pid)) if self.pid else 0
+
+    def start(self):
+        self.peak = self.current()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.current())
+
+    def stop(self) -> int:
+        self._stop.set()
+        self._thread.join()
+        return max(self.peak, self.current())
+
+
+def start_process(args, env, log_path):
+    log = open(log_path, "w")
+    return subprocess.Popen(args, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_ready(url, process=None, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            response = httpx.get(url, timeout=2)
+            if response.status_code == 200:
+                return
+            if response.json().get("status") == "failed":
+                raise RuntimeError(f"{url} reports failed start-up")
+        except (httpx.HTTPError, ValueError):
+            pass
+        time.sleep(0.25)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+class Workloads:
+    def __init__(self, args, doc_id, uploads):
+        self.args = args
+        self.doc_id = doc_id
+        self.uploads = uploads
+
+    def question(self, i):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        return question if self.args.repeat_questions else f"{question} ({i})"
+
+    async def upload(self, client, i):
+        name, data = self.uploads[i % len(self.uploads)]
+        files = {"file": (name, data, "application/pdf")}
+        return await client.post("/upload-document", files=files, data={"summary_words": "100"})
+
+    async def ask(self, client, i):
+        return await client.post("/ask", data={"doc_id": self.doc_id, "query": self.question(i)})
+
+    async def challenge(self, client, i):
+        return await client.post("/challenge", data={"doc_id": self.doc_id})
+
+    async def evaluate(self, client, i):
+        data = {"doc_id": self.doc_id, "question": self.question(i), "answer": "Thirty days written notice."}
+        return await client.post("/evaluate", data=data)
+
+
+async def run_level(base_url, request, concurrency, total, timeout, offset=0):
+    latencies, errors = [], 0
+    # Request numbers continue across levels, so unique questions stay unique
+    counter = iter(range(offset, offset + total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                began = time.perf_counter()
+                try:
+                    response = await request(client, i)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - began)
+                else:
+                    errors += 1
+
+        began = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - began
+    latencies.sort()
+    pct = lambda p: round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else None
+    return {"requests": total, "errors": errors, "seconds": round(elapsed, 3),
+            "rps": round(len(latencies) / elapsed, 2), "p50_ms": pct(0.5), "p95_ms": pct(0.95), "p99_ms": pct(0.99)}
+
+
+async def run(args, base_url, app_pid):
+    workdir = args.workdir
+    uploads = []
+    for seed in range(1, args.upload_variants + 1):
+        path = sample_pdfs(os.path.join(workdir, "samples"), {"upload": args.upload_pages}, seed=seed)["upload"]
+        with open(path, "rb") as f:
+            uploads.append((os.path.basename(path), f.read()))
+
+    seed_path = sample_pdfs(os.path.join(workdir, "samples"), {"medium": SAMPLES["medium"]})["medium"]
+    began = time.perf_counter()
+    with open(seed_path, "rb") as f:
+        response = httpx.post(f"{base_url}/upload-document", files={"file": ("medium.pdf", f, "application/pdf")},
+                              data={"summary_words": "150"}, timeout=args.timeout)
+    response.raise_for_status()
+    doc_id = response.json()["doc_id"]
+    print(f"seed document {doc_id}: {time.perf_counter() - began:.2f}s, ingestion {response.json().get('ingestion')}")
+
+    workloads = Workloads(args, doc_id, uploads)
+    sampler = RssSampler(app_pid)
+    results = []
+    offset = 0
+    print(f"\n{'workload':<10} {'concurrency':>11} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'errors':>7} {'peak MB':>8}")
+    for name in args.workloads:
+        for concurrency in args.concurrency:
+            if app_pid:
+                sampler.start()
+            level = await run_level(base_url, getattr(workloads, name), concurrency, args.requests, args.timeout, offset)
+            offset += args.requests
+            level.update(workload=name, concurrency=concurrency,
+                         peak_rss_mb=round(sampler.stop() / 2**20, 1) if app_pid else None)
+            results.append(level)
+            fmt = lambda v: "-" if v is None else v
+            print(f"{name:<10} {concurrency:>11} {level['rps']:>8} {fmt(level['p50_ms']):>9} {fmt(level['p95_ms']):>9} "
+                  f"{fmt(level['p99_ms']):>9} {level['errors']:>7} {fmt(level['peak_rss_mb']):>8}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workloads", nargs="+", default=["upload", "ask", "challenge", "evaluate"],
+                        choices=["upload", "ask", "challenge", "evaluate"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=100, help="requests per workload and concurrency level")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--upload-pages", type=int, default=10)
+    parser.add_argument("--upload-variants", type=int, default=8)
+    parser.add_argument("--repeat-questions", action="store_true", help="reuse the same questions so caches hit")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="stub seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=300)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-requests-per-minute", type=float, default=0, help="stub per-model request limit")
+    parser.add_argument("--llm-tokens-per-minute", type=float, default=0, help="stub per-model token limit")
+    parser.add_argument("--app-workers", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra app environment")
+    parser.add_argument("--app-url", help="test this running app instead of starting one")
+    parser.add_argument("--app-pid", type=int, help="pid of the --app-url process, for RSS")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+    args.workdir = tempfile.mkdtemp(prefix="docmind-load-")
+
+    processes = []
+    try:
+        if args.app_url:
+            base_url, app_pid = args.app_url.rstrip("/"), args.app_pid
+        else:
+            llm_port, app_port = free_port(), free_port()
+            processes.append(start_process(
+                [sys.executable, os.path.join(BENCH_DIR, "stub_llm_server.py"), "--port", str(llm_port),
+                 "--latency", str(args.llm_latency), "--tokens-per-second", str(args.tokens_per_second),
+                 "--error-rate", str(args.llm_error_rate),
+                 "--requests-per-minute", str(args.llm_requests_per_minute),
+                 "--tokens-per-minute", str(args.llm_tokens_per_minute)],
+                dict(os.environ), os.path.join(args.workdir, "stub_llm.log")))
+            data_dir = os.path.join(args.workdir, "data")
+            env = dict(
+                os.environ,
+                LLM_BASE_URL=f"http://127.0.0.1:{llm_port}/v1",
+                GROQ_API_KEY="stub",
+                EMBEDDING_PROVIDER="fake",
+                USE_PINECONE="false",
+                STARTUP_WARMUP="blocking",
+                DOCUMENT_STORE_DIR=os.path.join(data_dir, "documents"),
+                EMBEDDING_CACHE_PATH=os.path.join(data_dir, "embedding_cache.sqlite3"),
+                SUMMARY_CACHE_PATH=os.path.join(data_dir, "summary_cache.sqlite3"),
+            )
+            env.update(item.split("=", 1) for item in args.env)
+            app = start_process(
+                [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(app_port),
+                 "--workers", str(args.app_workers), "--log-level", "warning"],
+                env, os.path.join(args.workdir, "app.log"))
+            processes.append(app)
+            base_url, app_pid = f"http://127.0.0.1:{app_port}", app.pid
+            wait_ready(f"http://127.0.0.1:{llm_port}/stats", processes[0])
+        wait_ready(f"{base_url}/ready", processes[-1] if processes else None)
+        if app_pid and not os.path.isdir(f"/proc/{app_pid}"):
+            print("RSS is read from /proc and is not available on this platform")
+            app_pid = None
+
+        results = asyncio.run(run(args, base_url, app_pid))
+        if not args.app_url:
+            print(f"\nstub LLM: {httpx.get(f'http://127.0.0.1:{llm_port}/stats').json()}")
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"args": {k: v for k, v in vars(args).items() if k != "workdir"}, "results": results}, f, indent=2)
+    except Exception:
+        print(f"logs kept in {args.workdir}")
+        args.workdir = None
+        raise
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if args.workdir:
+            shutil.rmtree(args.workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Deterministic sample PDFs for the benchmarks, written without any PDF library.
+
+Usage (from the backend directory):
+    python benchmarks/sample_pdfs.py            # writes data/samples/{small,medium,large}.pdf
+    python benchmarks/sample_pdfs.py --pages 500 --out big.pdf
+
+The text reads like a contract or report: numbered sections ("4.2 Payment
+terms"), clause references and repeated boilerplate headers, so splitting,
+BM25 and extraction see realistic input. The same seed always produces
+the same bytes, so runs are comparable and nothing has to be downloaded.
+"""
+import argparse
+import os
+import random
+from typing import Dict, List
+
+SAMPLES = {"small": 5, "medium": 50, "large": 300}
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "samples")
+
+LINES_PER_PAGE = 52
+LINE_WIDTH = 95
+
+TOPICS = ["Payment terms", "Termination", "Liability", "Confidentiality", "Data retention", "Methods",
+          "Results", "Warranties", "Governing law", "Definitions", "Findings", "Service levels"]
+WORDS = ("the party shall provide notice within thirty days of any change to the agreement and its annex "
+         "data collected under this policy is retained for the period stated in clause results of the "
+         "analysis show that the measured values exceed the threshold described in table figure report "
+         "supplier customer obligations payment invoice fees liability damages warranty remedy breach").split()
+
+
+def document_pages(n_pages: int, seed: int = 0) -> List[List[str]]:
+    """Lines of text for each page of a synthetic document."""
+    rng = random.Random(seed)
+    pages, lines, section = [], [], 0
+    while len(pages) < n_pages:
+        if not lines:
+            lines.append(f"Sample Agreement {seed} - Confidential - Page {len(pages) + 1}")
+        if rng.random() < 0.12:
+            section += 1
+            lines.append("")
+            lines.append(f"{section // 3 + 1}.{section % 3 + 1} {rng.choice(TOPICS)}")
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(12, 30)))
+        sentence = f"{sentence.capitalize()} (see clause {rng.randint(1, 12)}{rng.choice('abc')})."
+        line = ""
+        for word in sentence.split():
+            if len(line) + len(word) + 1 > LINE_WIDTH:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}".strip()
+        lines.append(line)
+        if len(lines) >= LINES_PER_PAGE:
+            pages.append(lines[:LINES_PER_PAGE])
+            lines = []
+    return pages
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: List[List[str]]):
+    """Write pages of plain lines as a minimal PDF 1.4 file with Helvetica text."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        body = "BT /F1 10 Tf 14 TL 50 780 Td " + " ".join(f"({_escape(line)}) '" for line in lines) + " ET"
+        stream = body.encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{k} 0 R" for k in kids).encode(), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, obj)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(out)
+    os.replace(tmp_path, path)
+
+
+def sample_pdfs(directory: str = DEFAULT_DIR, sizes: Dict[str, int] = None, seed: int = 0) -> Dict[str, str]:
+    """Paths of the sample PDFs by name, writing any that do not exist yet."""
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for name, n_pages in (sizes or SAMPLES).items():
+        path = os.path.join(directory, f"{name}.pdf" if seed == 0 else f"{name}-{seed}.pdf")
+        if not os.path.exists(path):
+            write_pdf(path, document_pages(n_pages, seed))
+        paths[name] = path
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, help="write one document with this many pages")
+    parser.add_argument("--out", help="output path for --pages")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.pages:
+        out = args.out or f"sample-{args.pages}.pdf"
+        write_pdf(out, document_pages(args.pages, args.seed))
+        print(out)
+    else:
+        for name, path in sample_pdfs(seed=args.seed).items():
+            print(f"{name:<7} {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Local OpenAI/Groq-compatible chat-completions stub for load tests.
+
+Usage (from the backend directory):
+    python benchmarks/stub_llm_server.py --port 9100 --latency 0.5 --tokens-per-second 200
+    LLM_BASE_URL=http://localhost:9100/v1 GROQ_API_KEY=stub python main.py
+
+Every completion waits ``--latency`` seconds, then "generates" ``max_tokens``
+words (default 64) at ``--tokens-per-second``. Requests with
+``"stream": true`` get the words back as OpenAI-style SSE chunks.
+``--error-rate`` makes that fraction of requests fail with 429 and a
+Retry-After header. ``--requests-per-minute`` / ``--tokens-per-minute``
+enforce Groq-style per-model limits: every response carries
+``x-ratelimit-*`` headers and requests over the limit get a 429. Prompts that ask for questions get "Q: ...?" /
+"A: ..." lines, so the challenge endpoints have something to parse.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import zlib
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = ("the document describes results methods data section clause report "
+         "analysis summary findings table figure value policy term party").split()
+
+config = {"latency": 0.5, "tokens_per_second": 200.0, "error_rate": 0.0, "default_tokens": 64,
+          "requests_per_minute": 0, "tokens_per_minute": 0}
+stats = {"requests": 0, "errors": 0, "rate_limited": 0, "in_flight": 0, "max_in_flight": 0, "by_model": {}}
+# (model, "requests" | "tokens") -> [level, last refill time]; buckets refill continuously like Groq's
+buckets = {}
+
+app = FastAPI()
+
+
+def fake_text(prompt: str, n_tokens: int) -> str:
+    # Seeded by the prompt, so identical requests get identical answers across runs
+    rng = random.Random(zlib.crc32(prompt.encode("utf-8")))
+    words = [rng.choice(WORDS) for _ in range(n_tokens)]
+    if not re.search(r"\bquestions\b", prompt, re.IGNORECASE):
+        return " ".join(words)
+    lines = []
+    for i in range(0, len(words), 8):
+        line = " ".join(words[i:i + 8])
+        lines.append(f"A: {line}" if lines and lines[-1].startswith("Q:") else f"Q: {line}?")
+    return "\n".join(lines)
+
+
+def take(model: str, cost: dict) -> dict:
+    """Charge ``cost`` against the model's buckets; headers to send, with "retry" set if over."""
+    headers, retry = {}, 0.0
+    now = time.monotonic()
+    for kind, amount in cost.items():
+        limit = config[f"{kind}_per_minute"]
+        if not limit:
+            continue
+        level, updated = buckets.get((model, kind), (limit, now))
+        level = min(limit, level + (now - updated) * limit / 60)
+        if level >= amount:
+            level -= amount
+        else:
+            retry = max(retry, (amount - level) * 60 / limit)
+        buckets[(model, kind)] = (level, now)
+        headers[f"x-ratelimit-limit-{kind}"] = str(int(limit))
+        headers[f"x-ratelimit-remaining-{kind}"] = str(int(level))
+        headers[f"x-ratelimit-reset-{kind}"] = f"{(limit - level) * 60 / limit:.2f}s"
+    if retry:
+        headers["retry-after"] = f"{retry:.2f}"
+    return headers
+
+
+@app.post("/v1/chat/completions")
+@app.post("/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    model = body.get("model", "stub")
+    stats["by_model"][model] = stats["by_model"].get(model, 0) + 1
+    if random.random() < config["error_rate"]:
+        stats["errors"] += 1
+        return JSONResponse(status_code=429, content={"error": {"message": "rate limited"}}, headers={"retry-after": "0.2"})
+
+    prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+    n_tokens = int(body.get("max_tokens") or config["default_tokens"])
+    headers = take(model, {"requests": 1, "tokens": len(prompt.split()) + n_tokens})
+    if "retry-after" in headers:
+        stats["rate_limited"] += 1
+        return JSONResponse(status_code=429, content={"error": {"message": "rate limit reached"}}, headers=headers)
+    if body.get("stream"):
+        return StreamingResponse(stream_completion(body, prompt, n_tokens), media_type="text/event-stream", headers=headers)
+
+    stats["in_flight"] += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+    try:
+        began = time.perf_counter()
+        await asyncio.sleep(config["latency"] + n_tokens / config["tokens_per_second"])
+        content = fake_text(prompt, n_tokens)
+    finally:
+        stats["in_flight"] -= 1
+
+    prompt_tokens = len(prompt.split())
+    return JSONResponse(headers=headers, content={
+        "id": f"stub-{stats['requests']}",
+        "object": "chat.completion",
+        "model": body.get("model", "stub"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": n_tokens, "total_tokens": prompt_tokens + n_tokens},
+        "x_stub_seconds": round(time.perf_counter() - began, 4),
+    })
+
+
+async def stream_completion(body, prompt, n_tokens):
+    stats["in_flight"] += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+    try:
+        await asyncio.sleep(config["latency"])
+        # One word per chunk, keeping the whitespace (and newlines) before it
+        for word in re.findall(r"\s*\S+", fake_text(prompt, n_tokens)):
+            await asyncio.sleep(1 / config["tokens_per_second"])
+            chunk = {
+                "id": f"stub-{stats['requests']}",
+                "object": "chat.completion.chunk",
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+    finally:
+        stats["in_flight"] -= 1
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=config["latency"], help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=config["tokens_per_second"])
+    parser.add_argument("--error-rate", type=float, default=config["error_rate"], help="fraction of requests answered with 429")
+    parser.add_argument("--requests-per-minute", type=float, default=0, help="per-model request limit (0: none)")
+    parser.add_argument("--tokens-per-minute", type=float, default=0, help="per-model token limit (0: none)")
+    args = parser.parse_args()
+    config.update(latency=args.latency, tokens_per_second=args.tokens_per_second, error_rate=args.error_rate,
+                  requests_per_minute=args.requests_per_minute, tokens_per_minute=args.tokens_per_minute)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import re
+from typing import TYPE_CHECKING, List, Sequence
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+SECTION_PROMPT = """Read the following section of a document and write {n} simple questions that test understanding of it. Give each question a short reference answer taken from the text.
+
+Use exactly this format:
+Q: <question ending with a question mark>
+A: <reference answer>
+
+Section:
+{text}"""
+
+
+def sample_sections(chunks: Sequence["Document"], n_sections: int, chunks_per_section: int = 2) -> List[List["Document"]]:
+    """Pick ``n_sections`` runs of consecutive chunks spread evenly over the document."""
+    if not chunks:
+        return []
+    n_sections = min(n_sections, max(1, len(chunks) // chunks_per_section))
+    sections = []
+    for i in range(n_sections):
+        start = (i * len(chunks)) // n_sections
+        sections.append(chunks[start:start + chunks_per_section])
+    return sections
+
+
+def parse_questions(content: str) -> List[dict]:
+    """Parse "Q: ... / A: ..." pairs from a model response."""
+    pairs = []
+    question = None
+    for line in content.split("\n"):
+        line = line.strip()
+        q = re.match(r"^(?:\d+[\.\)]\s*)?Q\s*[:\.]\s*(.+)$", line, re.IGNORECASE)
+        a = re.match(r"^A\s*[:\.]\s*(.+)$", line, re.IGNORECASE)
+        if q:
+            question = q.group(1).strip()
+        elif a and question:
+            pairs.append({"question": question.rstrip(" ?"), "answer": a.group(1).strip()})
+            question = None
+    return pairs
+
+
+async def build_challenge_bank(chunks: Sequence["Document"], llm, n_sections: int = 6,
+                               questions_per_section: int = 2, version: int = 1) -> List[dict]:
+    """Generate questions with reference answers across the whole document.
+
+    Sections are sampled evenly and sent to the LLM concurrently. Each bank
+    entry records the chunk ids its question was generated from. Ids are
+    prefixed with the document ``version``, so an id handed out for one
+    version never names a question of another.
+    """
+    sections = sample_sections(chunks, n_sections)
+
+    async def generate(section):
+        text = "\n".join(c.page_content for c in section)
+        try:
+            content = await llm.complete(SECTION_PROMPT.format(n=questions_per_section, text=text), temperature=0.5)
+        except Exception as e:
+            logger.warning(f"Challenge generation failed for a section: {e}")
+            return []
+        chunk_ids = [c.metadata.get("chunk_id") for c in section]
+        return [dict(pair, chunk_ids=chunk_ids) for pair in parse_questions(content)[:questions_per_section]]
+
+    results = await asyncio.gather(*(generate(section) for section in sections))
+    bank = []
+    for items in results:
+        for item in items:
+            bank.append(dict(item, id=f"{version}-{len(bank)}"))
+    return bank
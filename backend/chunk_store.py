@@ -0,0 +1,259 @@
+import json
+import mmap
+import os
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Iterator, List, Optional
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+TEXT_FILE = "text.bin"
+OFFSETS_FILE = "offsets.npy"
+PAGES_FILE = "pages.npy"
+HASHES_FILE = "hashes.npy"
+DOCS_FILE = "docs.npy"
+DOC_TABLE_FILE = "docs.json"
+
+NO_PAGE = -1
+HASH_DTYPE = "S32"
+HASH_SIZE = np.dtype(HASH_DTYPE).itemsize
+
+
+class ChunkStore:
+    """Columnar, read-only storage for the chunks of one or more documents.
+
+    All chunk text is one UTF-8 buffer sliced by an ``offsets`` array, and
+    page numbers, chunk hashes and documents are NumPy arrays, so a chunk
+    costs a few dozen bytes on top of its text instead of a Document with
+    its own metadata dict. Saved stores are memory-mapped when opened:
+    workers share the pages and nothing is read until a chunk is used.
+    Reads slice the buffer without copying it; only the ``str`` returned
+    for a chunk is materialized.
+
+    Metadata is limited to ``page``, ``chunk_hash``, ``doc_id`` and
+    ``source``, plus ``chunk_id``, which is the chunk's position.
+    """
+
+    def __init__(self, text, offsets: np.ndarray, pages: np.ndarray, hashes: np.ndarray, docs: np.ndarray,
+                 doc_table: List[List[str]]):
+        self._text = text
+        self.offsets = offsets
+        self.pages = pages
+        self.hashes = hashes
+        self.docs = docs
+        # [doc_id, source] per entry in ``docs``
+        self.doc_table = doc_table
+        self._positions = None
+
+    @classmethod
+    def from_documents(cls, documents: Sequence) -> "ChunkStore":
+        builder = ChunkStoreBuilder()
+        for d in documents:
+            builder.add(d.page_content, d.metadata)
+        return builder.build()
+
+    @classmethod
+    def open(cls, directory: str, memory_map: bool = True) -> "ChunkStore":
+        """Load a store written by ``save``, memory-mapping it unless ``memory_map`` is false."""
+        mode = "r" if memory_map else None
+        arrays = [np.load(os.path.join(directory, name), mmap_mode=mode)
+                  for name in (OFFSETS_FILE, PAGES_FILE, HASHES_FILE, DOCS_FILE)]
+        with open(os.path.join(directory, DOC_TABLE_FILE), encoding="utf-8") as f:
+            doc_table = json.load(f)
+        with open(os.path.join(directory, TEXT_FILE), "rb") as f:
+            if memory_map and os.fstat(f.fileno()).st_size:
+                text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                text = f.read()
+        return cls(text, *arrays, doc_table)
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, TEXT_FILE), "wb") as f:
+            f.write(self._text)
+        for name, array in ((OFFSETS_FILE, self.offsets), (PAGES_FILE, self.pages), (HASHES_FILE, self.hashes),
+                            (DOCS_FILE, self.docs)):
+            np.save(os.path.join(directory, name), np.ascontiguousarray(array))
+        with open(os.path.join(directory, DOC_TABLE_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.doc_table, f)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def text_bytes(self, i: int) -> memoryview:
+        """The UTF-8 bytes of chunk ``i``, as a view into the buffer."""
+        return memoryview(self._text)[int(self.offsets[i]):int(self.offsets[i + 1])]
+
+    def text(self, i: int) -> str:
+        return str(self.text_bytes(i), "utf-8")
+
+    def texts(self, start: int = 0, stop: int = None) -> Iterator[str]:
+        view = memoryview(self._text)
+        bounds = self.offsets[start:(len(self) if stop is None else stop) + 1].tolist()
+        for begin, end in zip(bounds, bounds[1:]):
+            yield str(view[begin:end], "utf-8")
+
+    def metadata(self, i: int) -> dict:
+        doc_id, source = self.doc_table[self.docs[i]]
+        metadata = {"doc_id": doc_id, "source": source, "chunk_id": i}
+        page = int(self.pages[i])
+        if page != NO_PAGE:
+            metadata["page"] = page
+        chunk_hash = self.hashes[i]
+        if chunk_hash:
+            metadata["chunk_hash"] = chunk_hash.decode("ascii")
+        return metadata
+
+    def document(self, i: int) -> Document:
+        return Document(page_content=self.text(i), metadata=self.metadata(i))
+
+    def positions(self) -> "HashPositions":
+        """Chunk hash -> index of its first chunk, built on first use."""
+        if self._positions is None:
+            self._positions = HashPositions(self.hashes)
+        return self._positions
+
+    @property
+    def nbytes(self) -> int:
+        return (len(self._text) + self.offsets.nbytes + self.pages.nbytes + self.hashes.nbytes + self.docs.nbytes)
+
+
+class ChunkStoreBuilder:
+    """Appends chunks straight into the columns of a ChunkStore.
+
+    Ingestion adds each chunk as it is split, so a document is never held
+    as a list of Documents. ``build`` hands the columns over without copying
+    them; nothing can be added afterwards.
+    """
+
+    def __init__(self):
+        self._text = bytearray()
+        self._offsets = array("q", [0])
+        self._pages = array("i")
+        self._hashes = bytearray()
+        self._docs = array("I")
+        self._doc_rows = {}
+
+    def add(self, text: str, metadata: dict) -> int:
+        """Append a chunk and return its position."""
+        self._text += text.encode("utf-8")
+        self._offsets.append(len(self._text))
+        self._pages.append(metadata.get("page", NO_PAGE))
+        self._hashes += metadata.get("chunk_hash", "").encode("ascii")[:HASH_SIZE].ljust(HASH_SIZE, b"\0")
+        key = (str(metadata.get("doc_id", "")), str(metadata.get("source", "")))
+        self._docs.append(self._doc_rows.setdefault(key, len(self._doc_rows)))
+        return len(self._pages) - 1
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def build(self) -> ChunkStore:
+        return ChunkStore(
+            self._text,
+            np.frombuffer(self._offsets, dtype=np.int64),
+            np.frombuffer(self._pages, dtype=np.int32),
+            np.frombuffer(self._hashes, dtype=HASH_DTYPE),
+            np.frombuffer(self._docs, dtype=np.uint32),
+            [list(key) for key in self._doc_rows],
+        )
+
+
+class HashPositions(Mapping):
+    """Read-only ``{chunk_hash: first index}`` backed by a sorted permutation of the hashes."""
+
+    def __init__(self, hashes: np.ndarray):
+        self._hashes = hashes
+        self._order = None
+        self._sorted = None
+
+    def _lookup(self, chunk_hash) -> Optional[int]:
+        if not isinstance(chunk_hash, str) or not chunk_hash:
+            return None
+        if self._order is None:
+            # Stable, so the first of repeated hashes sorts first
+            self._order = np.argsort(self._hashes, kind="stable")
+            self._sorted = self._hashes[self._order]
+        key = chunk_hash.encode("ascii", "replace")
+        j = int(np.searchsorted(self._sorted, key))
+        if j < len(self._sorted) and self._sorted[j] == key:
+            return int(self._order[j])
+        return None
+
+    def __getitem__(self, chunk_hash) -> int:
+        i = self._lookup(chunk_hash)
+        if i is None:
+            raise KeyError(chunk_hash)
+        return i
+
+    def __contains__(self, chunk_hash) -> bool:
+        return self._lookup(chunk_hash) is not None
+
+    def __iter__(self):
+        seen = set()
+        for h in self._hashes:
+            if h and h not in seen:
+                seen.add(h)
+                yield h.decode("ascii")
+
+    def __len__(self) -> int:
+        return len(set(h for h in self._hashes if h))
+
+
+class ChunkDocuments(Sequence):
+    """A ChunkStore seen as a list of Documents, built only for the chunks read."""
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.store.document(j) for j in range(*i.indices(len(self.store)))]
+        if i < 0:
+            i += len(self.store)
+        if not 0 <= i < len(self.store):
+            raise IndexError("chunk index out of range")
+        return self.store.document(i)
+
+    def texts(self) -> Iterator[str]:
+        """Chunk texts without building Documents."""
+        return self.store.texts()
+
+
+class ChunkDocstore(Docstore):
+    """LangChain docstore over a ChunkStore; ids are chunk positions."""
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+
+    def search(self, search):
+        try:
+            i = int(search)
+        except (TypeError, ValueError):
+            return f"ID {search} not found."
+        if not 0 <= i < len(self.store):
+            return f"ID {search} not found."
+        return self.store.document(i)
+
+
+class PositionIds(Mapping):
+    """``index_to_docstore_id`` for a FAISS index whose rows are in chunk order, without a dict."""
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def __getitem__(self, i) -> int:
+        i = int(i)
+        if not 0 <= i < self.size:
+            raise KeyError(i)
+        return i
+
+    def __iter__(self):
+        return iter(range(self.size))
+
+    def __len__(self) -> int:
+        return self.size
@@ -0,0 +1,197 @@
+import logging
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import TYPE_CHECKING, Sequence, Tuple
+
+from metrics import Histogram
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# "cl100k_base" (tiktoken, close to the Llama 3 vocabulary) or "estimate"
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "cl100k_base")
+# Most context tokens one request may spend, whatever the model allows
+CONTEXT_BUDGET_TOKENS = int(os.getenv("CONTEXT_BUDGET_TOKENS", "1500"))
+DEFAULT_CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", "8192"))
+MODEL_CONTEXT_WINDOWS = {
+    "llama3-8b-8192": 8192,
+    "llama3-70b-8192": 8192,
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.3-70b-versatile": 131072,
+}
+# Chat formatting and tokenizer mismatch
+SAFETY_TOKENS = 64
+# Shortest shared text treated as splitter overlap rather than coincidence
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = int(os.getenv("CHUNK_OVERLAP", "100")) * 2
+
+CONTEXT_TOKENS = Histogram("docmind_context_tokens", "Context tokens packed into a prompt, by endpoint", ["endpoint"],
+                           buckets=(64, 128, 256, 512, 1024, 1536, 2048, 3072, 4096, 8192))
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+class EstimatingTokenizer:
+    """Offline approximation of a BPE tokenizer: short words are one token,
+    long ones one per four characters, punctuation one each. Errs high."""
+
+    name = "estimate"
+
+    @staticmethod
+    def _cost(word: str) -> int:
+        return 1 if len(word) <= 6 else -(-len(word) // 4)
+
+    def count(self, text: str) -> int:
+        return sum(self._cost(m.group()) for m in _WORD_RE.finditer(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        used = 0
+        for m in _WORD_RE.finditer(text):
+            used += self._cost(m.group())
+            if used > max_tokens:
+                return text[:m.start()].rstrip()
+        return text
+
+
+class TiktokenTokenizer:
+    def __init__(self, encoding_name: str):
+        import tiktoken
+        self.name = encoding_name
+        self._encoding = tiktoken.get_encoding(encoding_name)
+
+    def count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        tokens = self._encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else self._encoding.decode(tokens[:max_tokens])
+
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def get_tokenizer():
+    """The configured tokenizer, loaded once; falls back to estimating.
+
+    tiktoken downloads its vocabulary on first use (cached under
+    TIKTOKEN_CACHE_DIR), so call this off the event loop at startup.
+    """
+    global _tokenizer
+    with _tokenizer_lock:
+        if _tokenizer is None:
+            if CONTEXT_TOKENIZER == EstimatingTokenizer.name:
+                _tokenizer = EstimatingTokenizer()
+            else:
+                try:
+                    _tokenizer = TiktokenTokenizer(CONTEXT_TOKENIZER)
+                except Exception as e:
+                    logger.warning(f"Tokenizer {CONTEXT_TOKENIZER} unavailable ({type(e).__name__}: {e}); estimating token counts")
+                    _tokenizer = EstimatingTokenizer()
+        return _tokenizer
+
+
+@lru_cache(maxsize=16384)
+def count_tokens(text: str) -> int:
+    return get_tokenizer().count(text)
+
+
+def context_budget(model: str, prompt: str = "", completion_tokens: int = 512, budget: int = None) -> int:
+    """Tokens left for context once the prompt and the completion are accounted for."""
+    window = MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+    available = window - count_tokens(prompt) - completion_tokens - SAFETY_TOKENS
+    return max(0, min(budget or CONTEXT_BUDGET_TOKENS, available))
+
+
+def overlap(previous: str, text: str) -> int:
+    """Length of the longest suffix of ``previous`` that ``text`` starts with."""
+    for n in range(min(len(previous), len(text), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(text[:n]):
+            return n
+    return 0
+
+
+def pack_context(chunks: Sequence["Document"], budget: int, separator: str = "\n\n",
+                 endpoint: str = "") -> Tuple[str, dict]:
+    """Pack ``chunks``, best first, into at most ``budget`` tokens of context.
+
+    Chunks are taken in rank order while they fit; a chunk that does not fit
+    is skipped so smaller, lower-ranked ones can still use the room, and a
+    top chunk that alone exceeds the budget is truncated. Repeated chunks
+    are dropped, and when neighbouring chunks are both packed the
+    splitter's overlap between them is sent once. The packed chunks are
+    joined in document order. Returns the context and a packing report.
+    """
+    tokenizer = get_tokenizer()
+    by_id = {}
+    seen_texts = set()
+    used = saved = duplicates = 0
+    truncated = False
+
+    for rank, chunk in enumerate(chunks):
+        text = chunk.page_content
+        if text in seen_texts:
+            duplicates += 1
+            continue
+        chunk_id = chunk.metadata.get("chunk_id")
+        if not isinstance(chunk_id, int):
+            chunk_id = f"rank-{rank}"
+            previous = nxt = None
+        else:
+            previous, nxt = by_id.get(chunk_id - 1), by_id.get(chunk_id + 1)
+        trimmed = text[overlap(previous[0], text):] if previous else text
+        if nxt:
+            # The following chunk is already in: its head carries our tail
+            trimmed = trimmed[:len(trimmed) - overlap(trimmed, nxt[0])]
+        trimmed = trimmed.strip()
+        cost = count_tokens(trimmed) if trimmed else 0
+        if used + cost > budget:
+            if by_id or budget <= 0:
+                continue
+            trimmed = tokenizer.truncate(trimmed, budget)
+            cost = count_tokens(trimmed)
+            truncated = True
+        elif trimmed != text:
+            saved += count_tokens(text) - cost
+        seen_texts.add(text)
+        by_id[chunk_id] = (text, trimmed)
+        used += cost
+
+    def order(item):
+        key = item[0]
+        return (0, key) if isinstance(key, int) else (1, int(str(key).split("-")[1]))
+
+    parts = []
+    previous_id = None
+    for chunk_id, (_, trimmed) in sorted(by_id.items(), key=order):
+        if not trimmed:
+            continue
+        # A trimmed chunk continues its predecessor's text
+        joiner = " " if isinstance(chunk_id, int) and previous_id == chunk_id - 1 else separator
+        parts.append((joiner if parts else "") + trimmed)
+        previous_id = chunk_id
+    context = "".join(parts)
+
+    report = {
+        "tokenizer": tokenizer.name,
+        "budget_tokens": budget,
+        "context_tokens": used,
+        "chunks_considered": len(chunks),
+        "chunks_packed": len(by_id),
+        "duplicates_dropped": duplicates,
+        "overlap_tokens_saved": saved,
+        "truncated": truncated,
+    }
+    if endpoint:
+        CONTEXT_TOKENS.observe(used, endpoint=endpoint)
+    return context, report
+
+
+def fit_text(text: str, budget: int, endpoint: str = "") -> Tuple[str, dict]:
+    """Truncate one long text to ``budget`` tokens, for callers without chunks."""
+    from langchain_core.documents import Document
+    return pack_context([Document(page_content=text, metadata={"chunk_id": 0})], budget, endpoint=endpoint)
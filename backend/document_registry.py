@@ -0,0 +1,367 @@
+import glob
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+import faiss
+from langchain_community.vectorstores import FAISS
+
+from chunk_store import ChunkDocstore, ChunkDocuments, ChunkStore, PositionIds
+from hybrid_retrieval import BM25Index
+from index_factory import index_nbytes, tune
+
+logger = logging.getLogger(__name__)
+
+DOC_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+# Versioned so a new version's files never overwrite the ones meta.json points at
+INDEX_FILE = "index_v{version}.faiss"
+CHUNKS_DIR = "chunks_v{version}"
+META_FILE = "meta.json"
+# Per version, so work started for an older version never lands under a newer one
+SUMMARY_FILE = "summary_v{version}_{words}.txt"
+CHALLENGES_FILE = "challenges_v{version}.json"
+
+
+def write_index(vectorstore: FAISS, path: str):
+    """Write only the raw FAISS index; chunk text lives in the chunk store."""
+    tmp_path = path + ".tmp"
+    faiss.write_index(vectorstore.index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def read_index(path: str, mmap: bool = True):
+    """Read a FAISS index, memory-mapping it so worker processes share pages.
+
+    Search parameters (nprobe, efSearch) come from the current settings,
+    not from the saved index.
+    """
+    if mmap:
+        # IO_FLAG_MMAP_IFC maps flat vector codes in newer faiss releases;
+        # older ones only honour IO_FLAG_MMAP for IVF inverted lists.
+        flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        try:
+            return tune(faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY))
+        except RuntimeError as e:
+            logger.warning(f"mmap read of {path} failed ({e}); falling back to a full read")
+    return tune(faiss.read_index(path))
+
+
+def build_vectorstore(index, store: ChunkStore, embeddings) -> FAISS:
+    """Wrap a FAISS index and its chunk store (in index order) as a LangChain store."""
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=ChunkDocstore(store),
+        index_to_docstore_id=PositionIds(len(store)),
+    )
+
+
+class DocumentEntry:
+    """An uploaded document: its chunks, BM25 index and (for local mode) its FAISS index.
+
+    Chunks live in a ChunkStore; ``chunks`` reads it as a sequence of
+    Documents. ``version`` counts uploads under the same ``doc_id``;
+    ``positions`` maps chunk hashes to chunk indexes, for vectors whose
+    stored ``chunk_id`` is from the version that first indexed them
+    (Pinecone keeps unchanged ones).
+    """
+
+    def __init__(self, doc_id: str, store: ChunkStore, vectorstore=None, filename: str = "", created_at: float = None,
+                 bm25: BM25Index = None, version: int = 1):
+        self.doc_id = doc_id
+        self.store = store
+        self.chunks = ChunkDocuments(store)
+        self.vectorstore = vectorstore
+        self.bm25 = bm25 if bm25 is not None else BM25Index.from_texts(list(store.texts()))
+        self.positions = store.positions()
+        self.filename = filename
+        self.version = version
+        self.created_at = created_at or time.time()
+        self.last_access = time.time()
+        self.nbytes = self._estimate_bytes()
+        # meta.json's mtime when this version was saved or loaded; set by the registry
+        self.meta_mtime = None
+
+    def _estimate_bytes(self) -> int:
+        # Memory-mapped vectors still count: they occupy page cache while in use
+        size = self.store.nbytes
+        index = getattr(self.vectorstore, "index", None)
+        if index is not None:
+            size += index_nbytes(index)
+        size += self.bm25.nbytes
+        return size
+
+
+class DocumentRegistry:
+    """Keeps one index per uploaded document, keyed by ``doc_id``.
+
+    Every document is written to ``root/<doc_id>/`` on upload as a raw FAISS
+    index plus a columnar ChunkStore with its BM25 postings, all memory-mapped
+    when reloaded, so restarts and other workers never re-embed or re-tokenize
+    anything. Indexes that
+    have not been used for ``ttl_seconds``, or that push the in-memory total
+    over ``max_bytes``, are dropped from memory and reloaded from disk on the
+    next request.
+    """
+
+    def __init__(self, root: str, embeddings, max_bytes: int = 256 * 1024 * 1024, ttl_seconds: int = 1800, mmap: bool = True):
+        self.root = root
+        self.mmap = mmap
+        self.embeddings = embeddings
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+        os.makedirs(root, exist_ok=True)
+
+    def _doc_dir(self, doc_id: str) -> str:
+        return os.path.join(self.root, doc_id)
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    def add(self, doc_id: str, store: ChunkStore, index=None, filename: str = "",
+            bm25: BM25Index = None) -> DocumentEntry:
+        """Register a document, or a new version of one that is already stored.
+
+        ``index`` is the raw FAISS index of ``store``'s chunks, in order, or
+        None when the vectors live in Pinecone.
+        """
+        previous = self._read_meta(doc_id)
+        version = previous.get("version", 1) + 1 if previous else 1
+        vectorstore = build_vectorstore(index, store, self.embeddings) if index is not None else None
+        entry = DocumentEntry(doc_id, store, vectorstore, filename, bm25=bm25, version=version)
+        if previous:
+            # Summaries and challenges describe the old text
+            for pattern in (SUMMARY_FILE.format(version="*", words="*"), CHALLENGES_FILE.format(version="*")):
+                for path in glob.glob(os.path.join(self._doc_dir(doc_id), pattern)):
+                    os.remove(path)
+        self._save(entry)
+        with self._lock:
+            self._entries[doc_id] = entry
+            self._evict(keep=doc_id)
+        logger.info(f"Registered document {doc_id} v{version} ({filename}) with {len(store)} chunks")
+        return entry
+
+    def get(self, doc_id: str) -> Optional[DocumentEntry]:
+        if not doc_id or not DOC_ID_RE.match(doc_id):
+            return None
+        with self._lock:
+            entry = self._entries.get(doc_id)
+        if entry is not None and not self._is_current_entry(entry):
+            with self._lock:
+                if self._entries.get(doc_id) is entry:
+                    del self._entries[doc_id]
+            entry = None
+        if entry is not None:
+            with self._lock:
+                if doc_id in self._entries:
+                    self._entries.move_to_end(doc_id)
+                entry.last_access = time.time()
+                self._evict(keep=doc_id)
+            return entry
+        entry = self._load(doc_id)
+        if entry is None:
+            return None
+        with self._lock:
+            # Another request may have loaded it while we were reading from disk
+            loaded = self._entries.get(doc_id)
+            if loaded is not None and loaded.version >= entry.version:
+                entry = loaded
+            self._entries[doc_id] = entry
+            self._entries.move_to_end(doc_id)
+            self._evict(keep=doc_id)
+        return entry
+
+    def _is_current_entry(self, entry: DocumentEntry) -> bool:
+        """Whether meta.json still names the version held in memory.
+
+        Another worker may have registered a newer version, or deleted the
+        document. A stat is enough while meta.json has not been rewritten.
+        """
+        mtime = self._meta_mtime(entry.doc_id)
+        if mtime == entry.meta_mtime:
+            return True
+        meta = self._read_meta(entry.doc_id)
+        if meta is None or meta.get("version", 1) != entry.version:
+            logger.info(f"Document {entry.doc_id} changed on disk; reloading it")
+            return False
+        entry.meta_mtime = mtime
+        return True
+
+    def _meta_mtime(self, doc_id: str) -> Optional[int]:
+        try:
+            return os.stat(os.path.join(self._doc_dir(doc_id), META_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def delete(self, doc_id: str) -> bool:
+        if not doc_id or not DOC_ID_RE.match(doc_id):
+            return False
+        with self._lock:
+            self._entries.pop(doc_id, None)
+        path = self._doc_dir(doc_id)
+        if not os.path.isdir(path):
+            return False
+        shutil.rmtree(path, ignore_errors=True)
+        return True
+
+    def _is_current(self, doc_id: str, version: int) -> bool:
+        if not DOC_ID_RE.match(doc_id):
+            return False
+        meta = self._read_meta(doc_id)
+        if meta is None or meta.get("version", 1) != version:
+            logger.info(f"Not saving results for {doc_id} v{version}: no longer the current version")
+            return False
+        return True
+
+    def get_summary(self, doc_id: str, words: int, version: int) -> Optional[str]:
+        path = os.path.join(self._doc_dir(doc_id), SUMMARY_FILE.format(version=int(version), words=int(words)))
+        if not DOC_ID_RE.match(doc_id) or not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def save_summary(self, doc_id: str, words: int, summary: str, version: int):
+        """Store a summary of ``version``; dropped if the document has moved on to another version."""
+        if not self._is_current(doc_id, version):
+            return
+        path = os.path.join(self._doc_dir(doc_id), SUMMARY_FILE.format(version=int(version), words=int(words)))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(summary)
+
+    def get_challenges(self, doc_id: str, version: int) -> Optional[list]:
+        path = os.path.join(self._doc_dir(doc_id), CHALLENGES_FILE.format(version=int(version)))
+        if not DOC_ID_RE.match(doc_id) or not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_challenges(self, doc_id: str, challenges: list, version: int):
+        """Store the challenge bank of ``version``; dropped if the document has moved on to another version."""
+        if not self._is_current(doc_id, version):
+            return
+        path = os.path.join(self._doc_dir(doc_id), CHALLENGES_FILE.format(version=int(version)))
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(challenges, f)
+        os.replace(path + ".tmp", path)
+
+    def evict_idle(self):
+        with self._lock:
+            self._evict()
+
+    def _evict(self, keep: str = None):
+        now = time.time()
+        for doc_id in list(self._entries):
+            if doc_id != keep and now - self._entries[doc_id].last_access > self.ttl_seconds:
+                del self._entries[doc_id]
+                self.evictions += 1
+        total = sum(e.nbytes for e in self._entries.values())
+        for doc_id in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if doc_id == keep:
+                continue
+            total -= self._entries.pop(doc_id).nbytes
+            self.evictions += 1
+
+    def _save(self, entry: DocumentEntry):
+        """Write a version's files, then switch meta.json over to them.
+
+        Nothing meta.json points at is overwritten, so a crash part way, or a
+        worker reloading meanwhile, still sees a consistent version. The
+        previous version's files are kept until the next save, for readers
+        that read meta.json just before it changed.
+        """
+        path = self._doc_dir(entry.doc_id)
+        os.makedirs(path, exist_ok=True)
+        previous = self._read_meta(entry.doc_id)
+        index_file = None
+        if isinstance(entry.vectorstore, FAISS):
+            index_file = INDEX_FILE.format(version=entry.version)
+            write_index(entry.vectorstore, os.path.join(path, index_file))
+        chunks_dir = CHUNKS_DIR.format(version=entry.version)
+        tmp_dir = os.path.join(path, chunks_dir + ".tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        entry.store.save(tmp_dir)
+        entry.bm25.save(tmp_dir)
+        shutil.rmtree(os.path.join(path, chunks_dir), ignore_errors=True)
+        os.replace(tmp_dir, os.path.join(path, chunks_dir))
+        # meta.json is written last and marks the version as complete
+        meta = {"filename": entry.filename, "created_at": entry.created_at, "num_chunks": len(entry.chunks),
+                "version": entry.version, "chunks": chunks_dir, "index": index_file}
+        meta_path = os.path.join(path, META_FILE)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        entry.meta_mtime = self._meta_mtime(entry.doc_id)
+        # Files already memory-mapped by a reader stay valid after they are unlinked
+        keep = self._data_files(meta) | self._data_files(previous)
+        for pattern in (CHUNKS_DIR, INDEX_FILE):
+            for old in glob.glob(os.path.join(path, pattern.format(version="*"))):
+                if os.path.basename(old) in keep:
+                    continue
+                if os.path.isdir(old):
+                    shutil.rmtree(old, ignore_errors=True)
+                else:
+                    os.remove(old)
+
+    @staticmethod
+    def _data_files(meta: Optional[dict]) -> set:
+        """Names of the chunk store and index files a meta.json refers to."""
+        if not meta:
+            return set()
+        return {meta["chunks"], meta["index"]}
+
+    def _read_meta(self, doc_id: str) -> Optional[dict]:
+        meta_path = os.path.join(self._doc_dir(doc_id), META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _load(self, doc_id: str) -> Optional[DocumentEntry]:
+        path = self._doc_dir(doc_id)
+        # Taken before reading, so a version registered meanwhile is noticed on the next get
+        meta_mtime = self._meta_mtime(doc_id)
+        try:
+            meta = self._read_meta(doc_id)
+            if meta is None:
+                return None
+            store = ChunkStore.open(os.path.join(path, meta["chunks"]), self.mmap)
+            bm25 = BM25Index.open(os.path.join(path, meta["chunks"]), self.mmap)
+            vectorstore = None
+            if meta["index"]:
+                vectorstore = build_vectorstore(read_index(os.path.join(path, meta["index"]), self.mmap), store,
+                                                self.embeddings)
+        except Exception as e:
+            logger.error(f"Failed to load document {doc_id} from disk: {e}", exc_info=True)
+            return None
+        self.loads += 1
+        logger.info(f"Reloaded document {doc_id} from disk")
+        entry = DocumentEntry(doc_id, store, vectorstore, meta.get("filename", ""), meta.get("created_at"),
+                              bm25=bm25, version=meta.get("version", 1))
+        entry.meta_mtime = meta_mtime
+        return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loaded": len(self._entries),
+                "bytes": sum(e.nbytes for e in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, List
+
+from langchain_core.embeddings import Embeddings
+
+from embedding_cache import EmbeddingCache, text_hash
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+TORCH = "torch"
+ONNX = "onnx"
+ONNX_INT8 = "onnx_int8"
+
+# Quantized export shipped in the sentence-transformers MiniLM repos; AVX2 runs on any x86-64 host
+DEFAULT_ONNX_INT8_FILE = "onnx/model_quint8_avx2.onnx"
+
+
+def load_encoder(model_name: str, backend: str = TORCH, batch_size: int = 32, onnx_file: str = None) -> Callable:
+    """Load a sentence-transformers model and return ``encode(texts) -> vectors``.
+
+    ``onnx`` runs the model's ONNX export with ONNX Runtime, ``onnx_int8``
+    its dynamically quantized int8 export (``onnx_file`` overrides which).
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend == TORCH:
+        model = SentenceTransformer(model_name, device="cpu")
+    elif backend in (ONNX, ONNX_INT8):
+        file_name = onnx_file or (DEFAULT_ONNX_INT8_FILE if backend == ONNX_INT8 else "onnx/model.onnx")
+        model = SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs={"file_name": file_name})
+    else:
+        raise ValueError(f"Unknown embedding backend '{backend}'")
+
+    def encode(texts: List[str]) -> List[List[float]]:
+        return model.encode(texts, batch_size=batch_size, convert_to_numpy=True).tolist()
+
+    return encode
+
+
+def fake_encoder(dim: int = 384) -> Callable:
+    """``encode(texts) -> vectors`` without a model, for offline benchmarks.
+
+    Each vector is a unit vector seeded by the SHA-256 of its text, so the
+    same text always gets the same vector, but similar texts are not close.
+    """
+    import numpy as np
+
+    def encode(texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(dim)
+            vectors.append((vector / np.linalg.norm(vector)).tolist())
+        return vectors
+
+    return encode
+
+
+class BatchingEmbeddings(Embeddings):
+    """Embeddings served by one dedicated thread that micro-batches requests.
+
+    Callers from any thread or coroutine enqueue texts and get a future
+    back. Under load the worker waits up to ``max_wait_ms`` after the oldest
+    pending request for more to arrive, then encodes up to
+    ``max_batch_size`` texts in one call. Queries are batched ahead of document chunks so /ask stays
+    responsive during ingestion.
+    """
+
+    def __init__(self, encode: Callable[[List[str]], List[List[float]]], max_batch_size: int = 32,
+                 max_wait_ms: float = 5, num_threads: int = None):
+        self.encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.num_threads = num_threads
+        self._queries = deque()
+        self._documents = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.batches = 0
+        self.texts = 0
+        self.wait_seconds = 0.0
+        self.encode_seconds = 0.0
+        self._last_batch_size = 0
+        self._thread = threading.Thread(target=self._run, name="embedding-service", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: List[str], query: bool = False) -> Future:
+        future = Future()
+        if not texts:
+            future.set_result([])
+            return future
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Embedding service is closed")
+            (self._queries if query else self._documents).append((list(texts), future, time.perf_counter()))
+            self._cond.notify()
+        return future
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.submit(texts).result()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.submit([text], query=True).result()[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.wrap_future(self.submit(texts))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await asyncio.wrap_future(self.submit([text], query=True)))[0]
+
+    def _pending(self) -> int:
+        return sum(len(item[0]) for item in self._queries) + sum(len(item[0]) for item in self._documents)
+
+    def _take_batch(self) -> list:
+        batch, size = [], 0
+        for pending in (self._queries, self._documents):
+            while pending and (not batch or size + len(pending[0][0]) <= self.max_batch_size):
+                item = pending.popleft()
+                # Skips requests whose caller was cancelled while waiting
+                if item[1].set_running_or_notify_cancel():
+                    batch.append(item)
+                    size += len(item[0])
+        return batch
+
+    def _run(self):
+        if self.num_threads:
+            try:
+                import torch
+                torch.set_num_threads(self.num_threads)
+            except ImportError:
+                pass
+        while True:
+            with self._cond:
+                while not (self._queries or self._documents or self._closed):
+                    self._cond.wait()
+                if self._closed and not (self._queries or self._documents):
+                    return
+                oldest = min(q[0][2] for q in (self._queries, self._documents) if q)
+                # A lone text in the last batch means low load: don't add latency waiting for company
+                while not self._closed and self._last_batch_size > 1 and self._pending() < self.max_batch_size:
+                    remaining = oldest + self.max_wait - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+            if not batch:
+                continue
+
+            texts = [t for item in batch for t in item[0]]
+            began = time.perf_counter()
+            try:
+                vectors = self.encode(texts)
+            except Exception as e:
+                logger.error(f"Embedding batch of {len(texts)} texts failed: {e}", exc_info=True)
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - began
+            self.encode_seconds += elapsed
+            STAGE_SECONDS.observe(elapsed, stage="embed_batch")
+            self.batches += 1
+            self.texts += len(texts)
+            self._last_batch_size = len(texts)
+            offset = 0
+            for item_texts, future, enqueued_at in batch:
+                self.wait_seconds += began - enqueued_at
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return self._pending()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=30)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "mean_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "mean_encode_ms": round(self.encode_seconds / self.batches * 1000, 2) if self.batches else 0.0,
+            "total_wait_s": round(self.wait_seconds, 3),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embeddings provider so only unseen chunk texts are embedded."""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model_name: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(t) for t in texts]
+        found = self.cache.get_many(self.model_name, hashes)
+
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in found and h not in missing:
+                missing[h] = t
+        if missing:
+            logger.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} chunks to embed")
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(self.model_name, fresh)
+            found.update(fresh)
+        else:
+            logger.info(f"Embedding cache: all {len(texts)} chunks served from cache")
+        return [found[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries are rarely repeated verbatim, so they bypass the cache
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.embeddings.aembed_query(text)
@@ -0,0 +1,281 @@
+import asyncio
+import bisect
+import logging
+import math
+import mmap
+import os
+import re
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+from collections.abc import Sequence as SequenceABC
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Keeps section numbers, clause ids and hyphenated names ("4.2.1", "clause-7b") whole
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+
+RRF_K = 60
+
+# BM25Index files, saved next to a document's chunk store
+BM25_TERMS_FILE = "bm25_terms.bin"
+BM25_ARRAY_FILES = ("bm25_term_offsets.npy", "bm25_indptr.npy", "bm25_doc_ids.npy", "bm25_tfs.npy",
+                    "bm25_doc_lengths.npy")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; compound tokens are also split into their parts."""
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(p for p in re.split(r"[.\-/]", token) if p)
+    return tokens
+
+
+class BM25Builder:
+    """Collects the postings of one document's chunks for a BM25Index.
+
+    Chunks are appended with ``add`` in chunk_id order, so the index can be
+    filled batch by batch while a document is being ingested. Each term's
+    postings are interleaved (chunk, term frequency) pairs in an int array.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, array] = {}
+        self.doc_lengths = array("i")
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, texts: Sequence[str]):
+        for text in texts:
+            doc = len(self.doc_lengths)
+            counts = Counter(tokenize(text))
+            for term, tf in counts.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = array("i")
+                postings.append(doc)
+                postings.append(tf)
+            self.doc_lengths.append(sum(counts.values()))
+
+    def build(self, k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        # str order is code point order, which is also the order of the UTF-8 bytes searched later
+        terms = sorted(self._postings)
+        encoded = [t.encode("utf-8") for t in terms]
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(t) for t in encoded], out=term_offsets[1:])
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(self._postings[t]) // 2 for t in terms], out=indptr[1:])
+        pairs = np.frombuffer(b"".join(self._postings[t].tobytes() for t in terms), dtype=np.int32).reshape(-1, 2)
+        return BM25Index(b"".join(encoded), term_offsets, indptr, pairs[:, 0].copy(), pairs[:, 1].copy(),
+                         np.frombuffer(self.doc_lengths.tobytes(), dtype=np.int32), k1, b)
+
+
+class Vocabulary(SequenceABC):
+    """Sorted terms as UTF-8 bytes, stored in one buffer sliced by ``offsets``."""
+
+    def __init__(self, buffer, offsets: np.ndarray):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i) -> bytes:
+        return bytes(self.buffer[int(self.offsets[i]):int(self.offsets[i + 1])])
+
+    def find(self, term: str) -> Optional[int]:
+        key = term.encode("utf-8")
+        i = bisect.bisect_left(self, key)
+        return i if i < len(self) and self[i] == key else None
+
+
+class BM25Index:
+    """Inverted BM25 (Okapi) index over the chunks of one document.
+
+    Postings are stored CSR-style in flat NumPy arrays: the chunks holding
+    term ``i`` are ``doc_ids[indptr[i]:indptr[i + 1]]``, with their term
+    frequencies at the same positions in ``tfs``. A posting costs 8 bytes,
+    where a dict of dicts cost about a hundred. Built with BM25Builder;
+    saved indexes are memory-mapped when opened, so a reload costs no
+    tokenizing.
+    """
+
+    def __init__(self, terms, term_offsets: np.ndarray, indptr: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+                 doc_lengths: np.ndarray, k1: float = 1.5, b: float = 0.75):
+        self.terms = Vocabulary(terms, term_offsets)
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self._length_norm = None
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """Return up to ``k`` (chunk index, score) pairs, best first."""
+        n = len(self.doc_lengths)
+        if not n:
+            return []
+        if self._length_norm is None:
+            avgdl = float(self.doc_lengths.sum()) / n or 1.0
+            self._length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / avgdl)
+        scores = np.zeros(n)
+        for term in set(tokenize(query)):
+            row = self.terms.find(term)
+            if row is None:
+                continue
+            start, stop = int(self.indptr[row]), int(self.indptr[row + 1])
+            docs = self.doc_ids[start:stop]
+            tf = self.tfs[start:stop].astype(np.float64)
+            df = stop - start
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            # A term lists each chunk once, so fancy-index accumulation is safe
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(int(i), float(scores[i])) for i in hits]
+
+    @classmethod
+    def open(cls, directory: str, memory_map: bool = True) -> "BM25Index":
+        """Load an index written by ``save``, memory-mapping it unless ``memory_map`` is false."""
+        mode = "r" if memory_map else None
+        arrays = [np.load(os.path.join(directory, name), mmap_mode=mode) for name in BM25_ARRAY_FILES]
+        with open(os.path.join(directory, BM25_TERMS_FILE), "rb") as f:
+            if memory_map and os.fstat(f.fileno()).st_size:
+                terms = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                terms = f.read()
+        return cls(terms, *arrays)
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, BM25_TERMS_FILE), "wb") as f:
+            f.write(self.terms.buffer)
+        arrays = (self.terms.offsets, self.indptr, self.doc_ids, self.tfs, self.doc_lengths)
+        for name, array_ in zip(BM25_ARRAY_FILES, arrays):
+            np.save(os.path.join(directory, name), np.ascontiguousarray(array_))
+
+    @property
+    def nbytes(self) -> int:
+        return (len(self.terms.buffer) + self.terms.offsets.nbytes + self.indptr.nbytes + self.doc_ids.nbytes
+                + self.tfs.nbytes + self.doc_lengths.nbytes)
+
+    @classmethod
+    def from_texts(cls, texts: Sequence[str]) -> "BM25Index":
+        builder = BM25Builder()
+        builder.add(texts)
+        return builder.build()
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = RRF_K) -> List[int]:
+    """Fuse ranked lists of chunk ids; ids ranked high in any list come first."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class CrossEncoderReranker:
+    """Optional CPU cross-encoder that rescores (query, chunk) pairs.
+
+    The model is loaded on first use. ``latency`` is a moving average of
+    seconds per call, used by ``HybridRetriever`` to skip reranking when it
+    would not fit the latency budget.
+    """
+
+    def __init__(self, model_name: str, max_length: int = 512):
+        self.model_name = model_name
+        self.max_length = max_length
+        self.latency = 0.0
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu")
+                logger.info(f"Loaded reranker {self.model_name}")
+        return self._model
+
+    def rerank(self, query: str, texts: Sequence[str]) -> List[int]:
+        """Return positions into ``texts``, most relevant first."""
+        began = time.perf_counter()
+        scores = self._load().predict([(query, t) for t in texts])
+        elapsed = time.perf_counter() - began
+        self.latency = elapsed if not self.latency else 0.8 * self.latency + 0.2 * elapsed
+        return sorted(range(len(texts)), key=lambda i: scores[i], reverse=True)
+
+
+class HybridRetriever:
+    """Dense + BM25 retrieval fused with reciprocal rank fusion.
+
+    Both searches fetch ``candidates`` chunks and run concurrently. The
+    fused top ``rerank_top_n`` are reranked by ``reranker`` when one is set
+    and its recent latency fits in what is left of ``budget_ms``; otherwise
+    the fused order is returned as is.
+    """
+
+    def __init__(self, candidates: int = 20, reranker: Optional[CrossEncoderReranker] = None,
+                 rerank_top_n: int = 20, budget_ms: float = 250):
+        self.candidates = candidates
+        self.reranker = reranker
+        self.rerank_top_n = rerank_top_n
+        self.budget_ms = budget_ms
+        self.reranked = 0
+        self.rerank_skipped = 0
+
+    async def search(self, chunks, bm25: Optional[BM25Index], store, query: str, query_vector, k: int = 4,
+                     positions: Optional[Dict[str, int]] = None):
+        """Top ``k`` chunks for the query; ``positions`` maps chunk hashes to indexes in ``chunks``."""
+        began = time.perf_counter()
+        dense_task = asyncio.to_thread(store.similarity_search_by_vector, query_vector, k=self.candidates)
+        if bm25 is None:
+            return (await dense_task)[:k]
+        dense_docs, sparse = await asyncio.gather(dense_task, asyncio.to_thread(bm25.search, query, self.candidates))
+
+        dense_ids = [self._position(d, positions) for d in dense_docs]
+        fused = reciprocal_rank_fusion([[i for i in dense_ids if i is not None], [i for i, _ in sparse]])
+        fused = [i for i in fused if 0 <= i < len(chunks)]
+
+        if self.reranker is not None and len(fused) > 1:
+            elapsed_ms = (time.perf_counter() - began) * 1000
+            if elapsed_ms + self.reranker.latency * 1000 <= self.budget_ms:
+                top = fused[:self.rerank_top_n]
+                order = await asyncio.to_thread(self.reranker.rerank, query, [chunks[i].page_content for i in top])
+                fused = [top[j] for j in order] + fused[len(top):]
+                self.reranked += 1
+            else:
+                self.rerank_skipped += 1
+        return [chunks[i] for i in fused[:k]]
+
+    @staticmethod
+    def _position(doc, positions):
+        # A vector kept from an earlier version has that version's chunk_id
+        if positions and doc.metadata.get("chunk_hash") in positions:
+            return positions[doc.metadata["chunk_hash"]]
+        return doc.metadata.get("chunk_id")
+
+    def stats(self) -> dict:
+        return {
+            "candidates": self.candidates,
+            "reranker": self.reranker.model_name if self.reranker else None,
+            "rerank_latency_ms": round(self.reranker.latency * 1000, 2) if self.reranker else None,
+            "reranked": self.reranked,
+            "rerank_skipped": self.rerank_skipped,
+            "budget_ms": self.budget_ms,
+        }
+
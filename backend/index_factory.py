@@ -0,0 +1,132 @@
+import logging
+import math
+import os
+import time
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FLAT = "flat"
+IVF_FLAT = "ivf_flat"
+IVF_PQ = "ivf_pq"
+HNSW = "hnsw"
+MODES = (FLAT, IVF_FLAT, IVF_PQ, HNSW)
+
+# "auto" picks a mode from the chunk count; any of MODES forces that mode
+INDEX_MODE = os.getenv("INDEX_MODE", "auto").lower()
+# Up to this many vectors an exact flat index is both small and fast enough
+INDEX_FLAT_MAX_CHUNKS = int(os.getenv("INDEX_FLAT_MAX_CHUNKS", "20000"))
+# Between the two thresholds HNSW; above, IVF-PQ keeps memory bounded
+INDEX_HNSW_MAX_CHUNKS = int(os.getenv("INDEX_HNSW_MAX_CHUNKS", "200000"))
+INDEX_NPROBE = int(os.getenv("INDEX_NPROBE", "32"))
+INDEX_EF_SEARCH = int(os.getenv("INDEX_EF_SEARCH", "64"))
+INDEX_HNSW_M = int(os.getenv("INDEX_HNSW_M", "32"))
+INDEX_PQ_BITS = int(os.getenv("INDEX_PQ_BITS", "8"))
+# Vectors sampled for IVF training, per inverted list
+INDEX_TRAIN_PER_LIST = int(os.getenv("INDEX_TRAIN_PER_LIST", "64"))
+
+
+def choose_mode(n: int, mode: str = None) -> str:
+    mode = (mode or INDEX_MODE).lower()
+    if mode in MODES:
+        return mode
+    if n <= INDEX_FLAT_MAX_CHUNKS:
+        return FLAT
+    if n <= INDEX_HNSW_MAX_CHUNKS:
+        return HNSW
+    return IVF_PQ
+
+
+def default_nlist(n: int) -> int:
+    # The usual 4 * sqrt(n) rule, with at least 39 training points per list
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def pq_subquantizers(d: int) -> int:
+    """Largest divisor of ``d`` giving at most 8 dimensions per sub-quantizer."""
+    m = max(1, d // 8)
+    while d % m:
+        m -= 1
+    return m
+
+
+def build_index(vectors: np.ndarray, mode: str = None, nlist: int = None, seed: int = 1234):
+    """Build and fill an L2 index of ``mode`` (or the auto choice) over ``vectors``.
+
+    IVF quantizers are trained on a random sample of ``INDEX_TRAIN_PER_LIST``
+    vectors per list rather than on the whole set.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n, d = vectors.shape
+    mode = choose_mode(n, mode)
+    if mode == FLAT:
+        index = faiss.IndexFlatL2(d)
+    elif mode == HNSW:
+        index = faiss.IndexHNSWFlat(d, INDEX_HNSW_M)
+    else:
+        nlist = nlist or default_nlist(n)
+        quantizer = faiss.IndexFlatL2(d)
+        if mode == IVF_FLAT:
+            index = faiss.IndexIVFFlat(quantizer, d, nlist)
+        else:
+            # Each PQ codebook needs about 39 training points per centroid
+            bits = max(1, min(INDEX_PQ_BITS, int(math.log2(max(2, n // 39)))))
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, pq_subquantizers(d), bits)
+        sample_size = min(n, max(nlist * INDEX_TRAIN_PER_LIST, 2 ** INDEX_PQ_BITS * 39 if mode == IVF_PQ else 0))
+        sample = vectors[np.random.default_rng(seed).choice(n, sample_size, replace=False)] if sample_size < n else vectors
+        index.train(sample)
+    index.add(vectors)
+    tune(index)
+    return index
+
+
+def tune(index, nprobe: int = None, ef_search: int = None):
+    """Apply search-time parameters (nprobe for IVF, efSearch for HNSW)."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe or INDEX_NPROBE, ivf.nlist)
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        hnsw.efSearch = ef_search or INDEX_EF_SEARCH
+    return index
+
+
+def index_mode(index) -> str:
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVFPQ):
+        return IVF_PQ
+    if isinstance(index, faiss.IndexIVF):
+        return IVF_FLAT
+    if hasattr(index, "hnsw"):
+        return HNSW
+    return FLAT
+
+
+def index_nbytes(index) -> int:
+    """Approximate in-memory size of an index."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        # Codes plus a 64-bit id per vector, and the coarse centroids
+        return ivf.ntotal * (ivf.code_size + 8) + ivf.nlist * ivf.d * 4
+    index = faiss.downcast_index(index)
+    size = index.ntotal * index.d * 4
+    hnsw = getattr(index, "hnsw", None)
+    if hnsw is not None:
+        # Level-0 links dominate: 2 * M neighbours of 4 bytes each
+        size += index.ntotal * hnsw.nb_neighbors(0) * 4
+    return size
+
+
+def optimize_index(index):
+    """Rebuild a flat index in the mode chosen for its size; flat ones are returned as is."""
+    mode = choose_mode(index.ntotal)
+    if mode == FLAT or index_mode(index) != FLAT:
+        return index
+    began = time.perf_counter()
+    vectors = index.reconstruct_n(0, index.ntotal)
+    optimized = build_index(vectors, mode)
+    logger.info(f"Rebuilt {index.ntotal} vectors as {mode} in {time.perf_counter() - began:.2f}s "
+                f"({index_nbytes(index)} -> {index_nbytes(optimized)} bytes)")
+    return optimized
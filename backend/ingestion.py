@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import faiss
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+
+from chunk_store import ChunkStoreBuilder
+from hybrid_retrieval import BM25Builder
+from index_factory import optimize_index
+from metrics import STAGE_SECONDS
+from pdf_pages import count_pages, extract_pages
+from vector_sync import chunk_hash
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_BYTES = int(os.getenv("INGEST_UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+PAGES_PER_TASK = int(os.getenv("INGEST_PAGES_PER_TASK", "8"))
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "64"))
+# Parsed page batches allowed to wait for the embedder before parsing pauses
+MAX_PENDING_BATCHES = int(os.getenv("INGEST_MAX_PENDING_BATCHES", "4"))
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+
+_pool = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Forking the server would copy its threads' locks, the loaded models and
+        # every cached index into each worker; forkserver starts them clean
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["pdf_pages"])
+        _pool = ProcessPoolExecutor(max_workers=INGEST_WORKERS, mp_context=context)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+class IngestionResult:
+    def __init__(self):
+        # Builders while ingesting, the ChunkStore and BM25Index once done
+        self.store = ChunkStoreBuilder()
+        self.bm25 = BM25Builder()
+        # Raw FAISS index of the chunks in store order; None when ``index_batch`` sends them elsewhere
+        self.index = None
+        self.pages = 0
+        self.pages_done = 0
+        self.embedded = 0
+        self.reused = 0
+        self.timings = {"upload": 0.0, "parse": 0.0, "split": 0.0, "embed": 0.0, "index": 0.0, "bm25": 0.0}
+
+    def report(self) -> dict:
+        return {
+            "pages": self.pages,
+            "pages_done": self.pages_done,
+            "chunks": len(self.store),
+            "embedded": self.embedded,
+            "reused": self.reused,
+            "timings": {stage: round(seconds, 4) for stage, seconds in self.timings.items()},
+        }
+
+
+async def stream_upload(file, dest_path: str) -> float:
+    """Copy an UploadFile to disk in fixed-size chunks; returns elapsed seconds."""
+    began = time.perf_counter()
+    with open(dest_path, "wb") as out:
+        while True:
+            block = await file.read(UPLOAD_CHUNK_BYTES)
+            if not block:
+                break
+            out.write(block)
+    return time.perf_counter() - began
+
+
+async def _produce_pages(path: str, page_count: int, queue: asyncio.Queue, result: IngestionResult):
+    """Parse page ranges in the process pool and feed them to ``queue`` in order.
+
+    Ends with ``None`` on success, or with the raised exception on failure.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+    pending = deque()
+    try:
+        for start in range(0, page_count, PAGES_PER_TASK):
+            stop = min(start + PAGES_PER_TASK, page_count)
+            pending.append(loop.run_in_executor(pool, extract_pages, path, start, stop))
+            if len(pending) >= INGEST_WORKERS:
+                pages, elapsed = await pending.popleft()
+                result.timings["parse"] += elapsed
+                # Blocks while the embedder is behind, which pauses parsing
+                await queue.put(pages)
+        while pending:
+            pages, elapsed = await pending.popleft()
+            result.timings["parse"] += elapsed
+            await queue.put(pages)
+        await queue.put(None)
+    except Exception as e:
+        await queue.put(e)
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+
+def _split_pages(splitter, pages, metadata: dict, result: IngestionResult) -> List[Document]:
+    """Runs in a thread: split pages into the chunk store and BM25 index.
+
+    Returns the new chunks as Documents for the embedding batch, which is
+    the only place they exist.
+    """
+    began = time.perf_counter()
+    chunks = []
+    for page_number, text in pages:
+        if not text.strip():
+            continue
+        page_metadata = dict(metadata, page=page_number)
+        for piece in splitter.split_text(text):
+            chunk_metadata = dict(page_metadata, chunk_id=len(result.store), chunk_hash=chunk_hash(piece))
+            result.store.add(piece, chunk_metadata)
+            chunks.append(Document(page_content=piece, metadata=chunk_metadata))
+    split_done = time.perf_counter()
+    result.timings["split"] += split_done - began
+
+    # The keyword index grows with the chunks, in chunk_id order
+    result.bm25.add([c.page_content for c in chunks])
+    result.timings["bm25"] += time.perf_counter() - split_done
+    return chunks
+
+
+def _add_vectors(result: IngestionResult, vectors: List[List[float]]):
+    matrix = np.asarray(vectors, dtype="float32")
+    if result.index is None:
+        result.index = faiss.IndexFlatL2(matrix.shape[1])
+    result.index.add(matrix)
+
+
+async def ingest_pdf(
+    path: str,
+    embeddings,
+    source: str = "",
+    metadata: Optional[dict] = None,
+    index_batch: Optional[Callable[[List[Document], List[List[float]]], None]] = None,
+    on_progress: Optional[Callable[[IngestionResult], None]] = None,
+    known_vectors: Optional[Dict[str, Optional[List[float]]]] = None,
+) -> IngestionResult:
+    """Parse, split, embed and index a PDF as a bounded streaming pipeline.
+
+    Pages are extracted in a process pool and handed over through a bounded
+    queue; splitting runs in a thread and writes each chunk straight into a
+    ChunkStore, and chunks are embedded ``EMBED_BATCH_SIZE`` at a time, so
+    only the current batch exists as Documents. By default the vectors go
+    into a new FAISS index; pass ``index_batch`` to send each batch somewhere
+    else (e.g. Pinecone) instead. A BM25 keyword index is built alongside in
+    either case. ``on_progress`` is called with the running result after
+    every page batch.
+
+    Every chunk carries a ``chunk_hash`` of its text. When re-indexing a new
+    version, ``known_vectors`` maps the previous version's hashes to their
+    vectors and those chunks are not embedded again; a ``None`` vector means
+    the chunk is already stored elsewhere (e.g. Pinecone) and is only passed
+    on to ``index_batch`` as such.
+    """
+    result = IngestionResult()
+    loop = asyncio.get_running_loop()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+    began = time.perf_counter()
+    result.pages = await loop.run_in_executor(get_pool(), count_pages, path)
+    result.timings["parse"] += time.perf_counter() - began
+    if on_progress:
+        on_progress(result)
+
+    document_metadata = dict(metadata or {}, source=source)
+    queue = asyncio.Queue(maxsize=MAX_PENDING_BATCHES)
+    producer = asyncio.create_task(_produce_pages(path, result.pages, queue, result))
+
+    batch: List[Document] = []
+
+    async def flush():
+        if not batch:
+            return
+        texts = [c.page_content for c in batch]
+        known = known_vectors or {}
+        vectors = [known.get(c.metadata["chunk_hash"]) for c in batch]
+        todo = [i for i, c in enumerate(batch) if c.metadata["chunk_hash"] not in known]
+        began = time.perf_counter()
+        if todo:
+            embedded = await asyncio.to_thread(embeddings.embed_documents, [texts[i] for i in todo])
+            for i, vector in zip(todo, embedded):
+                vectors[i] = vector
+        result.timings["embed"] += time.perf_counter() - began
+        result.embedded += len(todo)
+        result.reused += len(batch) - len(todo)
+
+        began = time.perf_counter()
+        if index_batch is not None:
+            await asyncio.to_thread(index_batch, list(batch), vectors)
+        else:
+            await asyncio.to_thread(_add_vectors, result, vectors)
+        result.timings["index"] += time.perf_counter() - began
+        batch.clear()
+
+    try:
+        while True:
+            pages = await queue.get()
+            if pages is None:
+                break
+            if isinstance(pages, Exception):
+                raise pages
+            batch.extend(await asyncio.to_thread(_split_pages, splitter, pages, document_metadata, result))
+            result.pages_done += len(pages)
+            if len(batch) >= EMBED_BATCH_SIZE:
+                await flush()
+            if on_progress:
+                on_progress(result)
+        await flush()
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+
+    result.store = result.store.build()
+    began = time.perf_counter()
+    result.bm25 = await asyncio.to_thread(result.bm25.build)
+    result.timings["bm25"] += time.perf_counter() - began
+
+    if result.index is not None:
+        # Vectors were added to a flat index as they arrived; large documents
+        # are rebuilt as HNSW or IVF-PQ once all of them are known
+        began = time.perf_counter()
+        result.index = await asyncio.to_thread(optimize_index, result.index)
+        result.timings["index"] += time.perf_counter() - began
+
+    for stage, seconds in result.timings.items():
+        if stage != "upload":
+            STAGE_SECONDS.observe(seconds, stage=stage)
+    logger.info(f"Ingested {source}: {result.report()}")
+    return result
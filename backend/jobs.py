@@ -0,0 +1,269 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobExistsError(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id: str, payload: dict):
+        self.job_id = job_id
+        self.payload = payload
+        self.status = QUEUED
+        self.stage = QUEUED
+        self.progress = {}
+        self.result = {}
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": dict(self.progress),
+            "result": dict(self.result),
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Job":
+        """A read-only snapshot of a job run by another process."""
+        job = cls(data["job_id"], {})
+        job.status = data["status"]
+        job.stage = data["stage"]
+        job.progress = data["progress"]
+        job.result = data["result"]
+        job.error = data["error"]
+        job.created_at = data["created_at"]
+        job.finished_at = data["finished_at"]
+        return job
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobStore:
+    """SQLite table of job states, shared by the worker processes on a host.
+
+    Each row records the pid of the process running the job, so a job left
+    unfinished by a process that has since exited can be told apart from
+    one that is still running.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # WAL lets workers read job states while another one writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                   job_id TEXT PRIMARY KEY,
+                   data TEXT NOT NULL,
+                   pid INTEGER NOT NULL,
+                   finished_at REAL
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_finished_at ON jobs(finished_at)")
+        self._conn.commit()
+
+    def put(self, job: Job):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, data, pid, finished_at) VALUES (?, ?, ?, ?)",
+                (job.job_id, json.dumps(job.to_dict()), os.getpid(), job.finished_at),
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str):
+        """``(Job snapshot, pid)`` of the last state written for ``job_id``, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT data, pid FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return Job.from_dict(json.loads(row[0])), row[1]
+
+    def prune(self, cutoff: float):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobManager:
+    """Runs jobs on a fixed number of in-process workers fed by a bounded queue.
+
+    ``handler(job)`` does the work and may update ``job.stage``,
+    ``job.progress`` and ``job.result`` as it goes, calling ``save(job)`` to
+    publish them. Finished jobs are kept for ``retention_seconds`` so clients
+    can still read their status. With a ``store``, every state is written
+    to it and ``get`` also finds jobs run by other processes; one whose
+    process exited counts as done if it had set ``job.result["ready"]``,
+    and as failed otherwise.
+    """
+
+    def __init__(self, handler: Callable[[Job], Awaitable[None]], workers: int = 2, max_queued: int = 16,
+                 retention_seconds: int = 3600, on_finished: Callable[[Job], None] = None,
+                 store: Optional[JobStore] = None):
+        self.handler = handler
+        self.workers = workers
+        self.retention_seconds = retention_seconds
+        self.on_finished = on_finished
+        self.store = store
+        self._queue = asyncio.Queue(maxsize=max_queued)
+        self._jobs = OrderedDict()
+        self._worker_tasks = []
+
+    def start(self):
+        self._worker_tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def submit(self, job_id: str, payload: dict) -> Job:
+        """Queue a job; an id whose previous job has not finished is rejected."""
+        self._prune()
+        previous = self.get(job_id)
+        if previous is not None and not previous.finished:
+            raise JobExistsError(f"Job {job_id} is still {previous.status}.")
+        job = Job(job_id, payload)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError("Too many documents are being processed. Please try again shortly.")
+        self._jobs[job_id] = job
+        self.save(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """This process's job, or the stored state of one run by another process."""
+        job = self._jobs.get(job_id)
+        if job is not None or self.store is None:
+            return job
+        found = self.store.get(job_id)
+        if found is None:
+            return None
+        job, pid = found
+        if not job.finished and (pid == os.getpid() or not _process_alive(pid)):
+            # Its process exited (or was restarted) before the job finished
+            if job.result.get("ready"):
+                job.status = job.stage = DONE
+            else:
+                job.status = job.stage = FAILED
+                job.error = "Interrupted: the worker processing this document stopped. Please upload it again."
+        return job
+
+    def save(self, job: Job):
+        """Publish the job's current state to the store, if there is one."""
+        if self.store is None:
+            return
+        try:
+            self.store.put(job)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not store the state of job {job.job_id}: {e}")
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        if job._task is not None:
+            job._task.cancel()
+        else:
+            # Still queued; the worker will skip it
+            self._finish(job, CANCELLED)
+        return job
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _finish(self, job: Job, status: str, error: str = None):
+        job.status = status
+        job.stage = status
+        job.error = error
+        job.finished_at = time.time()
+        self.save(job)
+        if self.on_finished:
+            try:
+                self.on_finished(job)
+            except Exception as e:
+                logger.error(f"on_finished hook failed for job {job.job_id}: {e}", exc_info=True)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        for job_id in list(self._jobs):
+            job = self._jobs[job_id]
+            if job.finished and job.finished_at < cutoff:
+                del self._jobs[job_id]
+        if self.store is not None:
+            self.store.prune(cutoff)
+
+    async def _worker(self, n: int):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.finished:
+                    continue
+                job.status = RUNNING
+                self.save(job)
+                job._task = asyncio.create_task(self.handler(job))
+                try:
+                    # asyncio.wait does not propagate our own cancellation into the job
+                    await asyncio.wait({job._task})
+                except asyncio.CancelledError:
+                    # The worker itself is being stopped
+                    job._task.cancel()
+                    self._finish(job, CANCELLED)
+                    raise
+                if job._task.cancelled():
+                    logger.info(f"Job {job.job_id} cancelled")
+                    self._finish(job, CANCELLED)
+                elif job._task.exception() is not None:
+                    e = job._task.exception()
+                    logger.error(f"Job {job.job_id} failed: {e}", exc_info=e)
+                    self._finish(job, FAILED, str(e) or e.__class__.__name__)
+                else:
+                    self._finish(job, DONE)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,266 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import httpx
+
+from metrics import LLM_REQUEST_SECONDS, LLM_RETRIES, LLM_TIMEOUTS, LLM_TOKENS
+from rate_limiter import INTERACTIVE, RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Any OpenAI-compatible endpoint works; point this at benchmarks/stub_llm_server.py for load tests
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.groq.com/openai/v1")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "30"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+# Starting limits per model (0: none until the API's rate-limit headers report one)
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+# Most background (summary, challenge bank) requests in flight, leaving the rest for interactive ones
+LLM_BACKGROUND_CONCURRENCY = int(os.getenv("LLM_BACKGROUND_CONCURRENCY", str(max(1, LLM_MAX_CONCURRENCY * 3 // 4))))
+# Completion tokens assumed for rate limiting when a request sets no max_tokens
+DEFAULT_COMPLETION_TOKENS = 256
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LLMClient:
+    """Long-lived async chat-completions client for one model.
+
+    Connections are kept alive and pooled, at most ``max_concurrency``
+    requests are in flight at once, and transient failures are retried with
+    jittered exponential backoff. Requests first pass the model's
+    RateLimiter, which learns the provider's limits from response headers
+    and takes over waiting out 429s.
+    """
+
+    def __init__(self, model: str, api_key: str = None, base_url: str = None,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, max_retries: int = LLM_MAX_RETRIES):
+        self.model = model
+        # Read at construction time: main.py loads .env after importing this module
+        self.api_key = api_key if api_key is not None else os.getenv("GROQ_API_KEY")
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+        self.in_flight = 0
+        self.limiter = RateLimiter(model, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE,
+                                   min(LLM_BACKGROUND_CONCURRENCY, max_concurrency))
+        self._client = httpx.AsyncClient(
+            base_url=base_url or os.getenv("LLM_BASE_URL", LLM_BASE_URL),
+            headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+
+    def _payload(self, prompt: str, max_tokens: Optional[int], temperature: Optional[float]) -> dict:
+        data = {"model": self.model, "messages": [{"role": "user", "content": prompt}]}
+        if max_tokens is not None:
+            data["max_tokens"] = max_tokens
+        if temperature is not None:
+            data["temperature"] = temperature
+        return data
+
+    @staticmethod
+    def estimate_tokens(prompt: str, max_tokens: Optional[int]) -> int:
+        """Tokens a request will count against the rate limit, before the API says."""
+        return len(prompt) // 4 + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+    @asynccontextmanager
+    async def _slot(self, cost: int, priority: int):
+        """Pass the rate limiter, then hold one of the ``max_concurrency`` request slots."""
+        self.waiting += 1
+        acquired = False
+        try:
+            async with self.limiter.acquire(cost, priority):
+                await self._semaphore.acquire()
+                acquired = True
+                self.waiting -= 1
+                self.in_flight += 1
+                try:
+                    yield
+                finally:
+                    self.in_flight -= 1
+                    self._semaphore.release()
+        finally:
+            if not acquired:
+                self.waiting -= 1
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        # Full jitter so concurrent callers don't retry in lockstep
+        return random.uniform(0, min(30.0, 2 ** attempt))
+
+    def _record_usage(self, usage: Optional[dict], estimated: int):
+        if usage:
+            LLM_TOKENS.inc(usage.get("prompt_tokens", 0), model=self.model, type="prompt")
+            LLM_TOKENS.inc(usage.get("completion_tokens", 0), model=self.model, type="completion")
+            self.limiter.settle(estimated, usage.get("total_tokens"))
+
+    async def complete(self, prompt: str, max_tokens: int = None, temperature: float = None,
+                       priority: int = INTERACTIVE) -> str:
+        began = time.perf_counter()
+        outcome = "error"
+        try:
+            content = await self._complete(prompt, max_tokens, temperature, priority)
+            outcome = "ok"
+            return content
+        finally:
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - began, model=self.model, mode="complete", outcome=outcome)
+
+    async def _complete(self, prompt: str, max_tokens: int, temperature: float, priority: int) -> str:
+        if not self.api_key:
+            raise LLMError("GROQ_API_KEY not found in environment variables")
+        data = self._payload(prompt, max_tokens, temperature)
+        cost = self.estimate_tokens(prompt, max_tokens)
+        for attempt in range(self.max_retries):
+            last_attempt = attempt == self.max_retries - 1
+            rate_limited = False
+            try:
+                async with self._slot(cost, priority):
+                    response = await self._client.post("/chat/completions", json=data)
+                self.limiter.observe(response.status_code, response.headers)
+                if response.status_code in RETRYABLE_STATUS and not last_attempt:
+                    rate_limited = response.status_code == 429
+                    logger.warning(f"LLM {self.model} returned {response.status_code} (attempt {attempt + 1}/{self.max_retries})")
+                    LLM_RETRIES.inc(model=self.model, reason=str(response.status_code))
+                else:
+                    response.raise_for_status()
+                    body = response.json()
+                    self._record_usage(body.get("usage"), cost)
+                    return body["choices"][0]["message"]["content"].strip()
+            except httpx.TimeoutException:
+                logger.warning(f"LLM {self.model} request timed out (attempt {attempt + 1}/{self.max_retries})")
+                LLM_TIMEOUTS.inc(model=self.model)
+                if last_attempt:
+                    raise LLMError("Request timed out after multiple attempts")
+                LLM_RETRIES.inc(model=self.model, reason="timeout")
+            except (httpx.ConnectError, httpx.RemoteProtocolError, httpx.ReadError) as e:
+                logger.warning(f"LLM {self.model} connection failed: {e} (attempt {attempt + 1}/{self.max_retries})")
+                if last_attempt:
+                    raise LLMError("Connection failed after multiple attempts")
+                LLM_RETRIES.inc(model=self.model, reason="connection")
+            except httpx.HTTPStatusError as e:
+                raise LLMError(f"LLM request failed with status {e.response.status_code}: {e.response.text[:200]}",
+                               e.response.status_code)
+            except (KeyError, IndexError, ValueError) as e:
+                raise LLMError(f"Malformed LLM response: {e}")
+            # After a 429 the limiter holds every caller until the provider's reset
+            if not rate_limited:
+                await asyncio.sleep(self._backoff(attempt))
+        raise LLMError("LLM request failed after multiple attempts")
+
+    async def stream(self, prompt: str, max_tokens: int = None, temperature: float = None,
+                     priority: int = INTERACTIVE):
+        """Yield completion text pieces as the server produces them.
+
+        Failures before the first piece are retried like ``complete``; once
+        text has been yielded an error is raised instead, since the caller
+        has already forwarded part of the answer.
+        """
+        began = time.perf_counter()
+        outcome = "cancelled"
+        try:
+            async for piece in self._stream(prompt, max_tokens, temperature, priority):
+                yield piece
+            outcome = "ok"
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - began, model=self.model, mode="stream", outcome=outcome)
+
+    async def _stream(self, prompt: str, max_tokens: int, temperature: float, priority: int):
+        if not self.api_key:
+            raise LLMError("GROQ_API_KEY not found in environment variables")
+        data = dict(self._payload(prompt, max_tokens, temperature), stream=True)
+        cost = self.estimate_tokens(prompt, max_tokens)
+        for attempt in range(self.max_retries):
+            last_attempt = attempt == self.max_retries - 1
+            rate_limited = False
+            started = False
+            try:
+                async with self._slot(cost, priority):
+                    async with self._client.stream("POST", "/chat/completions", json=data) as response:
+                        self.limiter.observe(response.status_code, response.headers)
+                        if response.status_code in RETRYABLE_STATUS and not last_attempt:
+                            rate_limited = response.status_code == 429
+                            logger.warning(f"LLM {self.model} returned {response.status_code} (attempt {attempt + 1}/{self.max_retries})")
+                            LLM_RETRIES.inc(model=self.model, reason=str(response.status_code))
+                        else:
+                            if response.status_code >= 400:
+                                await response.aread()
+                            response.raise_for_status()
+                            async for line in response.aiter_lines():
+                                if not line.startswith("data:"):
+                                    continue
+                                payload = line[len("data:"):].strip()
+                                if payload == "[DONE]":
+                                    return
+                                chunk = json.loads(payload)
+                                # OpenAI puts usage on the last chunk, Groq under x_groq
+                                self._record_usage(chunk.get("usage") or chunk.get("x_groq", {}).get("usage"), cost)
+                                if not chunk.get("choices"):
+                                    continue
+                                delta = chunk["choices"][0].get("delta", {}).get("content")
+                                if delta:
+                                    started = True
+                                    yield delta
+                            return
+            except (httpx.TimeoutException, httpx.ConnectError, httpx.RemoteProtocolError, httpx.ReadError) as e:
+                logger.warning(f"LLM {self.model} stream failed: {e!r} (attempt {attempt + 1}/{self.max_retries})")
+                if isinstance(e, httpx.TimeoutException):
+                    LLM_TIMEOUTS.inc(model=self.model)
+                if started:
+                    raise LLMError("Stream interrupted")
+                if last_attempt:
+                    raise LLMError("Connection failed after multiple attempts")
+                LLM_RETRIES.inc(model=self.model, reason="timeout" if isinstance(e, httpx.TimeoutException) else "connection")
+            except httpx.HTTPStatusError as e:
+                raise LLMError(f"LLM request failed with status {e.response.status_code}: {e.response.text[:200]}",
+                               e.response.status_code)
+            except (KeyError, IndexError, ValueError) as e:
+                raise LLMError(f"Malformed LLM stream: {e}")
+            # After a 429 the limiter holds every caller until the provider's reset
+            if not rate_limited:
+                await asyncio.sleep(self._backoff(attempt))
+        raise LLMError("LLM request failed after multiple attempts")
+
+    def stats(self) -> dict:
+        return dict(self.limiter.stats(), model=self.model, queued=self.waiting, in_flight=self.in_flight)
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+_clients = {}
+
+
+def get_llm_client(model: str) -> LLMClient:
+    """Return the shared client for ``model``, creating it on first use."""
+    client = _clients.get(model)
+    if client is None:
+        client = _clients[model] = LLMClient(model)
+    return client
+
+
+def llm_clients() -> list:
+    return list(_clients.values())
+
+
+async def close_llm_clients():
+    for client in list(_clients.values()):
+        await client.aclose()
+    _clients.clear()
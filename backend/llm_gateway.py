@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+from llm_client import RETRYABLE_STATUS, LLMClient, LLMError, get_llm_client, llm_clients
+from metrics import LLM_COALESCED, LLM_FAILOVERS
+from rate_limiter import INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+# "primary:fallback|fallback,primary:fallback", e.g.
+# "llama3-70b-8192:llama-3.3-70b-versatile,llama3-8b-8192:llama-3.1-8b-instant".
+# Fallbacks should have at least the primary's context window.
+DEFAULT_FALLBACK_MODELS = ""
+# Send a request to a fallback once the primary's rate limit would hold it this long
+DEFAULT_FAILOVER_WAIT_SECONDS = 5.0
+
+
+def parse_fallbacks(value: str) -> Dict[str, List[str]]:
+    fallbacks = {}
+    for entry in value.split(","):
+        primary, _, rest = entry.partition(":")
+        models = [m.strip() for m in rest.split("|") if m.strip()]
+        if primary.strip() and models:
+            fallbacks[primary.strip()] = models
+    return fallbacks
+
+
+class _Flight:
+    """One request to the provider and the callers waiting on it."""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        # Streams only: pieces so far, replayed to callers that join late
+        self.pieces: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.updated = asyncio.Event()
+
+    def notify(self):
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+
+class LLMGateway:
+    """Single entry point for LLM calls in front of the per-model clients.
+
+    Identical requests (same model, prompt, max_tokens and temperature) that
+    are in flight at the same time share one completion: a double-submitted
+    summary or a question asked twice at once is paid for once. A stream
+    joined late replays what was already generated. The provider request is
+    cancelled only when every caller waiting on it has gone.
+
+    A request goes to a configured fallback model when the primary's rate
+    limiter expects it to wait more than ``failover_wait`` seconds, or when
+    the primary fails with a rate-limit, server or connection error before
+    producing any text.
+    """
+
+    def __init__(self, fallbacks: Dict[str, List[str]] = None, failover_wait: float = None):
+        # Read at construction time: main.py loads .env after importing this module
+        if fallbacks is None:
+            fallbacks = parse_fallbacks(os.getenv("LLM_FALLBACK_MODELS", DEFAULT_FALLBACK_MODELS))
+        if failover_wait is None:
+            failover_wait = float(os.getenv("LLM_FAILOVER_WAIT_SECONDS", str(DEFAULT_FAILOVER_WAIT_SECONDS)))
+        self.fallbacks = fallbacks
+        self.failover_wait = failover_wait
+        self._flights: Dict[str, _Flight] = {}
+
+    @staticmethod
+    def _key(mode: str, model: str, prompt: str, max_tokens: Optional[int], temperature: Optional[float]) -> str:
+        raw = json.dumps([mode, model, prompt, max_tokens, temperature])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _route(self, model: str, prompt: str, max_tokens: Optional[int], priority: int) -> List[LLMClient]:
+        """Clients to try in order: the primary unless it is saturated, then the fallbacks."""
+        clients = [get_llm_client(m) for m in [model] + self.fallbacks.get(model, [])]
+        if len(clients) == 1:
+            return clients
+        cost = LLMClient.estimate_tokens(prompt, max_tokens)
+        waits = [client.limiter.expected_wait(cost, priority) for client in clients]
+        if waits[0] <= self.failover_wait:
+            return clients
+        best = next((i for i, wait in enumerate(waits) if wait <= self.failover_wait),
+                    min(range(len(clients)), key=waits.__getitem__))
+        if best == 0:
+            return clients
+        logger.info(f"LLM {model} saturated ({waits[0]:.1f}s wait); using {clients[best].model}")
+        LLM_FAILOVERS.inc(from_model=model, to_model=clients[best].model, reason="saturated")
+        return [clients[best]] + clients[:best] + clients[best + 1:]
+
+    @staticmethod
+    def _can_fail_over(error: LLMError, clients: List[LLMClient], i: int) -> bool:
+        # A bad request fails on every model alike; only saturation and outages move on
+        if i + 1 >= len(clients) or (error.status_code is not None and error.status_code not in RETRYABLE_STATUS):
+            return False
+        logger.warning(f"LLM {clients[i].model} failed ({error}); failing over to {clients[i + 1].model}")
+        LLM_FAILOVERS.inc(from_model=clients[i].model, to_model=clients[i + 1].model, reason="error")
+        return True
+
+    async def _complete(self, model, prompt, max_tokens, temperature, priority) -> str:
+        clients = self._route(model, prompt, max_tokens, priority)
+        for i, client in enumerate(clients):
+            try:
+                return await client.complete(prompt, max_tokens, temperature, priority)
+            except LLMError as e:
+                if not self._can_fail_over(e, clients, i):
+                    raise
+
+    async def _stream(self, model, prompt, max_tokens, temperature, priority):
+        clients = self._route(model, prompt, max_tokens, priority)
+        for i, client in enumerate(clients):
+            started = False
+            try:
+                async for piece in client.stream(prompt, max_tokens, temperature, priority):
+                    started = True
+                    yield piece
+                return
+            except LLMError as e:
+                if started or not self._can_fail_over(e, clients, i):
+                    raise
+
+    def _join(self, mode: str, key: str, model: str) -> Optional[_Flight]:
+        flight = self._flights.get(key)
+        if flight is not None:
+            LLM_COALESCED.inc(model=model, mode=mode)
+        return flight
+
+    def _start(self, key: str, coro) -> _Flight:
+        flight = self._flights[key] = _Flight()
+        flight.task = asyncio.create_task(coro(flight))
+
+        def forget(_):
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.task.add_done_callback(forget)
+        return flight
+
+    def _leave(self, key: str, flight: _Flight):
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            # Nobody is left to read the result
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.task.cancel()
+
+    async def complete(self, model: str, prompt: str, max_tokens: int = None, temperature: float = None,
+                       priority: int = INTERACTIVE) -> str:
+        key = self._key("complete", model, prompt, max_tokens, temperature)
+        flight = self._join("complete", key, model) or self._start(
+            key, lambda _: self._complete(model, prompt, max_tokens, temperature, priority))
+        flight.waiters += 1
+        try:
+            # Shielded so one caller's cancellation does not cancel the others' result
+            return await asyncio.shield(flight.task)
+        finally:
+            self._leave(key, flight)
+
+    async def stream(self, model: str, prompt: str, max_tokens: int = None, temperature: float = None,
+                     priority: int = INTERACTIVE):
+        key = self._key("stream", model, prompt, max_tokens, temperature)
+
+        async def produce(flight):
+            try:
+                async for piece in self._stream(model, prompt, max_tokens, temperature, priority):
+                    flight.pieces.append(piece)
+                    flight.notify()
+            except Exception as e:
+                flight.error = e
+            finally:
+                flight.done = True
+                flight.notify()
+
+        flight = self._join("stream", key, model) or self._start(key, produce)
+        flight.waiters += 1
+        try:
+            sent = 0
+            while True:
+                if sent < len(flight.pieces):
+                    piece = flight.pieces[sent]
+                    sent += 1
+                    yield piece
+                elif flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    await flight.updated.wait()
+        finally:
+            self._leave(key, flight)
+
+    def for_model(self, model: str, priority: int = INTERACTIVE) -> "LLMHandle":
+        return LLMHandle(self, model, priority)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight_requests": len(self._flights),
+            "fallbacks": self.fallbacks,
+            "failover_wait_seconds": self.failover_wait,
+            "models": {client.model: client.stats() for client in llm_clients()},
+        }
+
+
+class LLMHandle:
+    """One model at one priority lane, with the ``complete``/``stream`` interface callers expect."""
+
+    def __init__(self, gateway: LLMGateway, model: str, priority: int = INTERACTIVE):
+        self.gateway = gateway
+        self.model = model
+        self.priority = priority
+
+    async def complete(self, prompt: str, max_tokens: int = None, temperature: float = None) -> str:
+        return await self.gateway.complete(self.model, prompt, max_tokens, temperature, self.priority)
+
+    def stream(self, prompt: str, max_tokens: int = None, temperature: float = None):
+        return self.gateway.stream(self.model, prompt, max_tokens, temperature, self.priority)
+
+
+_gateway = None
+
+
+def get_gateway() -> LLMGateway:
+    global _gateway
+    if _gateway is None:
+        _gateway = LLMGateway()
+    return _gateway
+
+
+def get_llm(model: str, priority: int = INTERACTIVE) -> LLMHandle:
+    """Handle for ``model`` whose calls go through the shared gateway."""
+    return get_gateway().for_model(model, priority)
@@ -1,20 +1,36 @@
-from fastapi import FastAPI, UploadFile, File, Form
+# Imported first so the startup profile covers every import below
+from startup_profile import profile
+from fastapi import FastAPI, UploadFile, File, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from langchain_groq import ChatGroq
-from langchain.chains import RetrievalQA
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from pydantic import BaseModel
+from typing import List, Optional
 from contextlib import asynccontextmanager
+from embedding_cache import EmbeddingCache
+from jobs import JobExistsError, JobManager, JobStore, QueueFullError
+from llm_client import close_llm_clients, llm_clients
+from llm_gateway import get_gateway, get_llm as get_gateway_llm
+from rate_limiter import BACKGROUND, INTERACTIVE
+from answer_cache import AnswerCache
+from challenge_bank import build_challenge_bank
+from hybrid_retrieval import HybridRetriever, CrossEncoderReranker
+import context_packer
+from context_packer import context_budget, pack_context
+from vector_sync import PineconeSync, VectorIds, previous_vectors
+import summarizer
+import metrics
+from metrics import request_id_var, RequestIdFilter, HTTP_REQUEST_SECONDS, STAGE_SECONDS
 import os
+import asyncio
 import tempfile
 import logging
+import json
 from dotenv import load_dotenv
 import re
+import random
+import time
+import uuid
+import weakref
 
 # Construct the path to the .env file in the project root
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -27,8 +43,12 @@ else:
     logging.warning(f".env file not found at {env_path}. Please ensure it exists.")
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
+# Every line carries the request id, which the frontend forwards as X-Request-ID
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:[%(request_id)s] %(message)s", force=True)
+for handler in logging.getLogger().handlers:
+    handler.addFilter(RequestIdFilter())
 logger = logging.getLogger(__name__)
+profile.record("import main", time.perf_counter() - profile.began)
 
 # --- Environment and API Keys ---
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
@@ -40,66 +60,280 @@ USE_PINECONE = os.getenv("USE_PINECONE", "false").lower() in ("1", "true", "yes"
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_INDEX = os.getenv("PINECONE_INDEX", "docmind-index")
 PINECONE_HOST = os.getenv("PINECONE_HOST")  # optional: serverless host URL
+PINECONE_UPSERT_BATCH = int(os.getenv("PINECONE_UPSERT_BATCH", "100"))
+PINECONE_UPSERT_CONCURRENCY = int(os.getenv("PINECONE_UPSERT_CONCURRENCY", "4"))
 
 # Embedding providers
 EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "hf_inference").lower()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 HF_API_TOKEN = os.getenv("HF_API_TOKEN")
 HF_EMBEDDING_MODEL = os.getenv("HF_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# EMBEDDING_PROVIDER=fake: deterministic vectors without a model, for offline load tests
+FAKE_EMBEDDING_DIM = int(os.getenv("FAKE_EMBEDDING_DIM", "384"))
+# Local models run in a micro-batching service: "torch", "onnx" or "onnx_int8"
+# (the ONNX backends need the sentence-transformers[onnx] extra)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE")  # optional: override the ONNX export to load
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", str(os.cpu_count() or 1)))
+
+# Embedding cache (content-addressed, persisted on local disk)
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "embedding_cache.sqlite3"))
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+
+# Map-stage summaries of chunk groups, reused across word counts and re-uploads
+SUMMARY_CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "summary_cache.sqlite3"))
+
+# Per-document indexes: where they live on disk and how much stays in memory
+DOCUMENT_STORE_DIR = os.getenv("DOCUMENT_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "documents"))
+DOCUMENT_CACHE_MAX_MB = int(os.getenv("DOCUMENT_CACHE_MAX_MB", "256"))
+DOCUMENT_TTL_SECONDS = int(os.getenv("DOCUMENT_TTL_SECONDS", "1800"))
+DOCUMENT_INDEX_MMAP = os.getenv("DOCUMENT_INDEX_MMAP", "true").lower() in ("1", "true", "yes")
+
+# Answer cache for repeated questions on the same document; matching paraphrases (the semantic tier) is opt-in
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2048"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_SEMANTIC = os.getenv("ANSWER_CACHE_SEMANTIC", "false").lower() in ("1", "true", "yes")
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+# Chunks retrieved per question; the context packer keeps as many as fit CONTEXT_BUDGET_TOKENS
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "12"))
+# Completion tokens reserved (and requested as max_tokens) per prompt type
+ANSWER_MAX_TOKENS = int(os.getenv("ANSWER_MAX_TOKENS", "1024"))
+EVALUATION_MAX_TOKENS = int(os.getenv("EVALUATION_MAX_TOKENS", "400"))
+CHALLENGE_MAX_TOKENS = int(os.getenv("CHALLENGE_MAX_TOKENS", "400"))
+# "hybrid" fuses dense and BM25 results; "dense" is vector search only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+RETRIEVAL_BUDGET_MS = float(os.getenv("RETRIEVAL_BUDGET_MS", "250"))
+# Optional CPU cross-encoder, e.g. cross-encoder/ms-marco-MiniLM-L-6-v2
+RERANK_MODEL = os.getenv("RERANK_MODEL", "")
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "20"))
+
+# Challenge questions pre-generated after ingestion
+CHALLENGE_BANK_SECTIONS = int(os.getenv("CHALLENGE_BANK_SECTIONS", "6"))
+CHALLENGE_BANK_QUESTIONS_PER_SECTION = int(os.getenv("CHALLENGE_BANK_QUESTIONS_PER_SECTION", "2"))
+CHALLENGES_PER_REQUEST = 3
+MAX_EVALUATE_BATCH = 20
+
+# Background ingestion jobs
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "2"))
+INGEST_JOB_QUEUE_SIZE = int(os.getenv("INGEST_JOB_QUEUE_SIZE", "16"))
+# Job states, shared so a status poll can land on any worker process
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "jobs.sqlite3"))
+
+# "background": serve at once and load models in a warm-up task,
+# "lazy": load on the first request that needs them,
+# "blocking": load everything before accepting traffic
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "background").lower()
+
+# Requests slower than this are logged with their id and route
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "5"))
 
 # --- Global Variables & In-memory Storage ---
 embeddings = None
-vectorstore = None
-all_docs = []
+embedding_service = None
+embedding_cache = None
+partial_summary_cache = None
+registry = None
+pinecone_index = None
+jobs = None
+background_tasks = set()
+# doc_id -> lock held while a version of that document is ingested; dropped once unused
+document_locks = weakref.WeakValueDictionary()
+# Heavy modules (langchain, faiss) are imported by load_models, off the event loop
+ingestion = None
+warmup_task = None
+models_ready = False
+answer_cache = AnswerCache(
+    max_entries=ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+    similarity=ANSWER_CACHE_SIMILARITY,
+    semantic=ANSWER_CACHE_SEMANTIC,
+)
+retriever = HybridRetriever(
+    candidates=RETRIEVAL_CANDIDATES,
+    reranker=CrossEncoderReranker(RERANK_MODEL) if RERANK_MODEL else None,
+    rerank_top_n=RERANK_TOP_N,
+    budget_ms=RETRIEVAL_BUDGET_MS,
+)
 
 # --- AI Model and Assistant ---
 MODEL_NAME = "sentence-transformers/paraphrase-TinyBERT-L6-v2"
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Load the sentence transformer model at startup."""
-    global embeddings, vectorstore, all_docs, USE_PINECONE
-    
+def load_models():
+    """Import the heavy modules and load the embedding model (runs in a thread)."""
+    global embeddings, embedding_service, registry, ingestion, pinecone_index, USE_PINECONE, models_ready
+
     # Initialize Pinecone if enabled
     if USE_PINECONE:
         try:
-            from pinecone import Pinecone
+            with profile.stage("import pinecone"):
+                from pinecone import Pinecone
+                import langchain_pinecone  # noqa: F401
             # Initialize with new Pinecone API
             pc = Pinecone(api_key=PINECONE_API_KEY)
+            pinecone_index = pc.Index(PINECONE_INDEX, host=PINECONE_HOST) if PINECONE_HOST else pc.Index(PINECONE_INDEX)
             logger.info("Pinecone initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Pinecone: {e}")
             USE_PINECONE = False
-    
+
+    with profile.stage("import embedding_service (langchain)"):
+        from embedding_service import BatchingEmbeddings, CachedEmbeddings, fake_encoder, load_encoder
+    with profile.stage("import document_registry (faiss, langchain)"):
+        from document_registry import DocumentRegistry
+    with profile.stage("import ingestion"):
+        import ingestion as ingestion_module
+    with profile.stage("load tokenizer"):
+        # tiktoken may download its vocabulary, so this stays off the event loop
+        context_packer.get_tokenizer()
+
     logger.info("Initializing embeddings provider: %s", EMBEDDING_PROVIDER)
     if EMBEDDING_PROVIDER == "openai":
         if not OPENAI_API_KEY:
             logger.warning("OPENAI_API_KEY not set. OpenAI embeddings will fail.")
-        embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+        with profile.stage("import langchain_openai"):
+            from langchain_openai import OpenAIEmbeddings
+        provider = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+        embedding_model = f"openai/{provider.model}"
         logger.info("OpenAIEmbeddings initialized.")
-    elif EMBEDDING_PROVIDER in ("hf", "hf_inference", "huggingface"):
-        logger.info("Using HuggingFace embeddings with model: %s", HF_EMBEDDING_MODEL)
-        embeddings = HuggingFaceEmbeddings(
-            model_name=HF_EMBEDDING_MODEL,
-            model_kwargs={"device": "cpu"}
-        )
-        logger.info("HuggingFaceEmbeddings initialized successfully")
     else:
-        logger.warning("Unknown EMBEDDING_PROVIDER '%s'. Falling back to default HF embeddings.", EMBEDDING_PROVIDER)
-        embeddings = HuggingFaceEmbeddings(
-            model_name=MODEL_NAME,
-            model_kwargs={"device": "cpu"}
+        if EMBEDDING_PROVIDER == "fake":
+            logger.warning("Using fake embeddings: retrieval results are meaningless")
+            embedding_model = f"fake/{FAKE_EMBEDDING_DIM}"
+        elif EMBEDDING_PROVIDER in ("hf", "hf_inference", "huggingface"):
+            logger.info("Using HuggingFace embeddings with model: %s", HF_EMBEDDING_MODEL)
+            embedding_model = HF_EMBEDDING_MODEL
+        else:
+            logger.warning("Unknown EMBEDDING_PROVIDER '%s'. Falling back to default HF embeddings.", EMBEDDING_PROVIDER)
+            embedding_model = MODEL_NAME
+        with profile.stage("load embedding model"):
+            if EMBEDDING_PROVIDER == "fake":
+                encode = fake_encoder(FAKE_EMBEDDING_DIM)
+            else:
+                encode = load_encoder(embedding_model, EMBEDDING_BACKEND, EMBEDDING_BATCH_SIZE, EMBEDDING_ONNX_FILE)
+            encode(["warm up"])
+        embedding_service = BatchingEmbeddings(
+            encode,
+            max_batch_size=EMBEDDING_BATCH_SIZE,
+            max_wait_ms=EMBEDDING_MAX_WAIT_MS,
+            num_threads=EMBEDDING_THREADS,
         )
-        logger.info("Default HF embeddings model loaded successfully.")
+        provider = embedding_service
+        if EMBEDDING_BACKEND != "torch":
+            # Quantized vectors differ slightly, so they get their own cache entries
+            embedding_model = f"{embedding_model}#{EMBEDDING_BACKEND}"
+        logger.info(f"Embedding service started: {embedding_model}, {EMBEDDING_THREADS} threads")
+
+    embeddings = CachedEmbeddings(provider, embedding_cache, embedding_model)
+    registry = DocumentRegistry(
+        DOCUMENT_STORE_DIR,
+        embeddings,
+        max_bytes=DOCUMENT_CACHE_MAX_MB * 1024 * 1024,
+        ttl_seconds=DOCUMENT_TTL_SECONDS,
+        mmap=DOCUMENT_INDEX_MMAP,
+    )
+    ingestion = ingestion_module
+    models_ready = True
+
+async def warm_up():
+    began = time.perf_counter()
+    try:
+        await asyncio.to_thread(load_models)
+    except Exception as e:
+        logger.error(f"Model warm-up failed: {e}", exc_info=True)
+        raise
+    profile.record("warm-up", time.perf_counter() - began)
+    profile.mark("ready")
+
+def start_warm_up():
+    global warmup_task
+    warmup_task = asyncio.create_task(warm_up())
+    # Failures are logged by warm_up and re-raised to whoever awaits it
+    warmup_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+async def ensure_ready():
+    """Wait until models are loaded, starting (or retrying) the warm-up if needed."""
+    if warmup_task is None or (warmup_task.done() and not models_ready):
+        start_warm_up()
+    await asyncio.shield(warmup_task)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open caches and start workers; models load according to STARTUP_WARMUP."""
+    global embeddings, embedding_service, embedding_cache, partial_summary_cache, registry, jobs
+
+    embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, max_bytes=EMBEDDING_CACHE_MAX_MB * 1024 * 1024)
+    logger.info(f"Embedding cache opened at {EMBEDDING_CACHE_PATH}: {embedding_cache.stats()}")
+    partial_summary_cache = summarizer.PartialSummaryCache(SUMMARY_CACHE_PATH)
+
+    evictor = asyncio.create_task(evict_idle_documents())
+    jobs = JobManager(
+        run_ingestion_job,
+        workers=INGEST_JOB_WORKERS,
+        max_queued=INGEST_JOB_QUEUE_SIZE,
+        on_finished=cleanup_ingestion_job,
+        store=JobStore(JOB_STORE_PATH),
+    )
+    jobs.start()
+    if STARTUP_WARMUP == "blocking":
+        await ensure_ready()
+    elif STARTUP_WARMUP != "lazy":
+        start_warm_up()
+    profile.mark("serving")
     yield
     # Clean up on shutdown
-    vectorstore = None
+    evictor.cancel()
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+    for task in list(background_tasks):
+        task.cancel()
+    await jobs.stop()
+    jobs.store.close()
+    jobs = None
+    await close_llm_clients()
+    if ingestion:
+        ingestion.shutdown_pool()
+    registry = None
     embeddings = None
-    all_docs = []
+    if embedding_service:
+        embedding_service.close()
+        embedding_service = None
+    if embedding_cache:
+        embedding_cache.close()
+        embedding_cache = None
+    if partial_summary_cache:
+        partial_summary_cache.close()
+        partial_summary_cache = None
     logger.info("Resources cleaned up.")
 
 app = FastAPI(lifespan=lifespan)
 
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """Tag each request with an id (the caller's X-Request-ID if valid) and time it."""
+    request_id = request.headers.get("x-request-id", "")
+    if not re.fullmatch(r"[\w.-]{1,64}", request_id):
+        request_id = uuid.uuid4().hex[:16]
+    token = request_id_var.set(request_id)
+    began = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        elapsed = time.perf_counter() - began
+        # Label by route template so ids in paths don't explode the series count
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method, route=route, status=status)
+        if elapsed > SLOW_REQUEST_SECONDS:
+            logger.warning(f"Slow request: {request.method} {route} -> {status} in {elapsed:.2f}s")
+        request_id_var.reset(token)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -109,62 +343,389 @@ app.add_middleware(
 )
 
 # --- Helper Functions ---
-def get_llm(model="llama3-8b-8192"):
-    return ChatGroq(groq_api_key=GROQ_API_KEY, model=model)
+def get_llm(model="llama3-8b-8192", priority=INTERACTIVE):
+    # Summaries and challenge banks pass BACKGROUND so they queue behind user-facing calls
+    return get_gateway_llm(model, priority)
+
+# Same wording as the RetrievalQA "stuff" chain this replaced
+QA_PROMPT = """Use the following pieces of context to answer the question at the end. If you don't know the answer, just say that you don't know, don't try to make up an answer.
+
+{context}
+
+Question: {question}
+Helpful Answer:"""
+
+async def evict_idle_documents():
+    """Periodically drop indexes that have been idle longer than the TTL."""
+    while True:
+        await asyncio.sleep(60)
+        if registry:
+            registry.evict_idle()
+
+def get_pinecone_store(doc_id):
+    from langchain_pinecone import PineconeVectorStore
+    # Each document gets its own namespace so uploads never see each other's chunks
+    if PINECONE_HOST:
+        return PineconeVectorStore(
+            index_name=PINECONE_INDEX,
+            embedding=embeddings,
+            namespace=doc_id,
+            host=PINECONE_HOST,
+        )
+    return PineconeVectorStore(
+        index_name=PINECONE_INDEX,
+        embedding=embeddings,
+        namespace=doc_id,
+    )
+
+def document_lock(doc_id):
+    lock = document_locks.get(doc_id)
+    if lock is None:
+        lock = document_locks[doc_id] = asyncio.Lock()
+    return lock
+
+async def index_document(doc_id, path, filename, on_progress=None):
+    """Ingest a PDF on disk as a new document, or as a new version of ``doc_id``.
+
+    Chunks are identified by the hash of their text. For a new version only
+    added or changed chunks are embedded; with Pinecone only those are
+    upserted and the ids of removed chunks are deleted, so the cost of an
+    edit is proportional to the edit. Uploads of the same ``doc_id`` are
+    ingested one at a time, each against the version before it. Returns the
+    IngestionResult and the new DocumentEntry (None if no text was found).
+    """
+    await ensure_ready()
+    async with document_lock(doc_id):
+        return await _index_document(doc_id, path, filename, on_progress)
+
+async def _index_document(doc_id, path, filename, on_progress):
+    previous = await asyncio.to_thread(registry.get, doc_id)
+    index_batch = None
+    known_vectors = None
+    sync = None
+    if USE_PINECONE:
+        # Persist to Pinecone index (assumes index already exists)
+        old_ids = VectorIds.for_chunks(previous.chunks) if previous else None
+        if previous and old_ids is None:
+            # Stored before chunks were hashed: its vector ids are unknown
+            await asyncio.to_thread(pinecone_index.delete, delete_all=True, namespace=doc_id)
+        elif previous:
+            known_vectors = {c.metadata["chunk_hash"]: None for c in previous.chunks}
+        logger.info(f"Upserting chunks to Pinecone index '{PINECONE_INDEX}' namespace '{doc_id}'...")
+        sync = PineconeSync(pinecone_index, doc_id, embeddings, old_ids,
+                            batch_size=PINECONE_UPSERT_BATCH, concurrency=PINECONE_UPSERT_CONCURRENCY)
+        index_batch = sync.write
+    elif previous:
+        known_vectors = await asyncio.to_thread(previous_vectors, previous.vectorstore, previous.chunks)
+
+    try:
+        result = await ingestion.ingest_pdf(
+            path,
+            embeddings,
+            source=filename,
+            metadata={"doc_id": doc_id},
+            index_batch=index_batch,
+            on_progress=on_progress,
+            known_vectors=known_vectors,
+        )
+        if sync and len(result.store):
+            logger.info(f"Pinecone namespace {doc_id}: {await asyncio.to_thread(sync.finish)}")
+    finally:
+        if sync:
+            sync.close()
+    if not len(result.store):
+        return result, None
+    # Writing the chunk store and index to disk takes seconds for a large PDF
+    entry = await asyncio.to_thread(registry.add, doc_id, result.store, result.index, filename=filename,
+                                    bm25=result.bm25)
+    answer_cache.invalidate(doc_id)
+    schedule_challenge_bank(entry)
+    return result, entry
+
+def schedule_challenge_bank(entry):
+    """Build the document's challenge bank in the background."""
+    async def build():
+        bank = await build_challenge_bank(
+            entry.chunks,
+            get_llm(priority=BACKGROUND),
+            n_sections=CHALLENGE_BANK_SECTIONS,
+            questions_per_section=CHALLENGE_BANK_QUESTIONS_PER_SECTION,
+            version=entry.version,
+        )
+        # Dropped if a newer version was registered meanwhile
+        registry.save_challenges(entry.doc_id, bank, entry.version)
+        logger.info(f"Challenge bank for {entry.doc_id} v{entry.version}: {len(bank)} questions")
+
+    # Keep a reference so the task is not garbage collected mid-flight
+    task = asyncio.create_task(build())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+async def summarize_document(entry, summary_words):
+    # Map-reduce over every chunk, so the summary covers the whole document
+    summary = registry.get_summary(entry.doc_id, summary_words, entry.version)
+    if summary is None:
+        texts = list(entry.chunks.texts())
+        summary = await summarizer.summarize(texts, summary_words, get_llm(priority=BACKGROUND), partial_summary_cache)
+        registry.save_summary(entry.doc_id, summary_words, summary, entry.version)
+    return summary
+
+async def stream_summary(entry, summary_words):
+    """Like summarize_document, but yields the summary as it is generated."""
+    summary = registry.get_summary(entry.doc_id, summary_words, entry.version)
+    if summary is not None:
+        yield summary
+        return
+    parts = []
+    texts = list(entry.chunks.texts())
+    async for token in summarizer.stream_summary(texts, summary_words, get_llm(priority=BACKGROUND), partial_summary_cache):
+        parts.append(token)
+        yield token
+    registry.save_summary(entry.doc_id, summary_words, "".join(parts).strip(), entry.version)
+
+def sse_event(data, event=None):
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+async def sse_stream(tokens, result_key, first_event=None):
+    """Turn a token generator into server-sent events.
+
+    Emits an optional leading event, one ``token`` event per piece, then a
+    ``done`` event carrying the full text under ``result_key`` (or an
+    ``error`` event if generation fails part way).
+    """
+    if first_event:
+        yield sse_event(*first_event)
+    parts = []
+    try:
+        async for token in tokens:
+            parts.append(token)
+            yield sse_event({"token": token}, "token")
+    except Exception as e:
+        logger.error(f"Streaming failed: {e}", exc_info=True)
+        yield sse_event({"error": "Generation failed."}, "error")
+        return
+    yield sse_event({result_key: "".join(parts).strip()}, "done")
+
+async def single_token(text):
+    yield text
+
+def answer_cache_key(entry):
+    # Versioned: workers that did not handle a re-upload never invalidate, but stop matching the old answers
+    return f"{entry.doc_id}:{entry.version}"
+
+async def cache_answer_when_done(tokens, cache_key, query, query_vector):
+    """Pass tokens through and cache the full answer once the stream completes."""
+    parts = []
+    async for token in tokens:
+        parts.append(token)
+        yield token
+    answer_cache.put(cache_key, query, "".join(parts).strip(), query_vector)
+
+def sse_response(events):
+    # X-Accel-Buffering stops reverse proxies from holding tokens back
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def run_ingestion_job(job):
+    payload = job.payload
+    # Job logs carry the id of the upload request that queued them
+    request_id_var.set(payload.get("request_id", job.job_id[:16]))
+    job.stage = "ingesting"
+    jobs.save(job)
+
+    def on_progress(result):
+        job.progress.update(result.report())
+        jobs.save(job)
+
+    result, entry = await index_document(job.job_id, payload["path"], payload["filename"], on_progress=on_progress)
+    job.progress.update(result.report())
+    if entry is None:
+        raise ValueError("Could not extract text from the document.")
+
+    # The index is usable from here on; the summary follows
+    job.result["doc_id"] = job.job_id
+    job.result["version"] = entry.version
+    job.result["ready"] = True
+    if not payload.get("summarize", True):
+        return
+    job.stage = "summarizing"
+    jobs.save(job)
+    job.result["summary"] = await summarize_document(entry, payload["summary_words"])
+
+def cleanup_ingestion_job(job):
+    path = job.payload.get("path")
+    if path and os.path.exists(path):
+        os.remove(path)
+
+def get_vector_store(doc_id, entry):
+    if USE_PINECONE:
+        # Reconnect to Pinecone-backed vector store on-demand
+        return get_pinecone_store(doc_id)
+    return entry.vectorstore
+
+async def retrieve_chunks(entry, store, query, query_vector, k=RETRIEVAL_K):
+    with STAGE_SECONDS.time(stage="retrieval"):
+        if RETRIEVAL_MODE == "dense":
+            # Similarity search is CPU-bound (or a blocking network call for Pinecone)
+            return await asyncio.to_thread(store.similarity_search_by_vector, query_vector, k=k)
+        return await retriever.search(entry.chunks, entry.bm25, store, query, query_vector, k=k,
+                                      positions=entry.positions)
+
+async def embed_query(text):
+    with STAGE_SECONDS.time(stage="query_embed"):
+        return await embeddings.aembed_query(text)
+
+async def evaluate_one(doc_id, entry, question, answer, challenge_id=None):
+    """Grade one answer against the chunks relevant to its question.
+
+    Bank questions are graded against the chunks they were generated from
+    plus their reference answer; other questions retrieve their own chunks.
+    """
+    challenge = None
+    if challenge_id is not None:
+        challenge = next((c for c in registry.get_challenges(doc_id, entry.version) or [] if c["id"] == challenge_id), None)
+        if challenge and challenge["question"] != question:
+            # The id belongs to some other question; grade this one on retrieval alone
+            challenge = None
+    if challenge:
+        docs = [entry.chunks[i] for i in challenge["chunk_ids"] if i is not None and 0 <= i < len(entry.chunks)]
+    else:
+        query_vector = await embed_query(question)
+        docs = await retrieve_chunks(entry, get_vector_store(doc_id, entry), question, query_vector)
+    template = "Based on the text: '{context}', evaluate this answer: '{answer}' for the question: '{question}'.{reference}"
+    fields = {"answer": answer, "question": question,
+              "reference": f" A reference answer is: '{challenge['answer']}'." if challenge else ""}
+    llm = get_llm()
+    budget = context_budget(llm.model, template.format(context="", **fields), EVALUATION_MAX_TOKENS)
+    context, _ = pack_context(docs, budget, separator=" ", endpoint="evaluate")
+    prompt = template.format(context=context, **fields)
+    return await llm.complete(prompt, max_tokens=EVALUATION_MAX_TOKENS)
+
+class EvaluateItem(BaseModel):
+    question: str
+    answer: str
+    challenge_id: Optional[str] = None
+
+class EvaluateBatchRequest(BaseModel):
+    doc_id: str
+    items: List[EvaluateItem]
+
+async def get_models():
+    """Return None once models are loaded, or a 503 response if they failed to load."""
+    try:
+        await ensure_ready()
+    except Exception:
+        return JSONResponse(status_code=503, content={"error": "The backend failed to load its models. Please try again."})
+    return None
+
+async def get_document(doc_id):
+    """Return (entry, None) or (None, error response) for a doc_id."""
+    error = await get_models()
+    if error:
+        return None, error
+    # A reload opens (and may re-validate) files on disk, so keep it off the event loop
+    entry = await asyncio.to_thread(registry.get, doc_id)
+    if entry is None:
+        return None, JSONResponse(status_code=404, content={"error": "Document not found. Please upload it again."})
+    return entry, None
 
 # --- API Endpoints ---
 @app.get("/")
 def root():
     return {"status": "ok", "message": "Welcome to the optimized DocMind Ai Backend!"}
 
+def update_metric_gauges():
+    """Copy queue statistics into the metrics gauges."""
+    if jobs:
+        metrics.QUEUE_DEPTH.set(jobs.queue_depth(), queue="ingest_jobs")
+    if embedding_service:
+        metrics.QUEUE_DEPTH.set(embedding_service.queue_depth(), queue="embedding_texts")
+    for client in llm_clients():
+        metrics.LLM_WAITING.set(client.waiting, model=client.model)
+        metrics.LLM_IN_FLIGHT.set(client.in_flight, model=client.model)
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text-format metrics."""
+    update_metric_gauges()
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/ready")
+def readiness():
+    """Readiness probe: 200 once models are loaded, 503 while warming up."""
+    if models_ready:
+        return {"status": "ready"}
+    failed = warmup_task is not None and warmup_task.done() and not warmup_task.cancelled()
+    return JSONResponse(status_code=503, content={"status": "failed" if failed else "starting"})
+
+@app.get("/startup-profile")
+def get_startup_profile():
+    return dict(profile.report(), ready=models_ready, warmup=STARTUP_WARMUP)
+
+@app.get("/cache-stats")
+def cache_stats():
+    if not embedding_cache:
+        return JSONResponse(status_code=503, content={"error": "Embedding cache not initialized."})
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "documents": registry.stats() if registry else None,
+        "answer_cache": answer_cache.stats(),
+        "partial_summary_cache": partial_summary_cache.stats(),
+        "retrieval": dict(retriever.stats(), mode=RETRIEVAL_MODE),
+        "embedding_service": embedding_service.stats() if embedding_service else None,
+        "llm": get_gateway().stats(),
+    }
+
+async def check_new_version(doc_id):
+    """Error response if ``doc_id`` cannot take a new version right now, else None."""
+    if doc_id is None:
+        return None
+    if not await asyncio.to_thread(registry.get, doc_id):
+        return JSONResponse(status_code=404, content={"error": "Document not found."})
+    job = jobs.get(doc_id)
+    if (job and not job.finished) or document_lock(doc_id).locked():
+        return JSONResponse(status_code=409, content={"error": "This document is still being processed."})
+    return None
+
 @app.post("/upload-document")
-async def upload_document(file: UploadFile = File(...), summary_words: int = Form(150)):
-    global vectorstore, all_docs
+async def upload_document(file: UploadFile = File(...), summary_words: int = Form(150), stream: bool = Form(False),
+                          doc_id: Optional[str] = Form(None)):
+    """Index and summarize a document; pass ``doc_id`` to upload a new version of it."""
+    error = await get_models()
+    if error:
+        return error
+    error = await check_new_version(doc_id)
+    if error:
+        return error
     try:
         with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(await file.read())
             tmp_path = tmp.name
+        upload_seconds = await ingestion.stream_upload(file, tmp_path)
 
-        loader = PyPDFLoader(tmp_path)
-        documents = loader.load()
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        all_docs = text_splitter.split_documents(documents)
+        doc_id = doc_id or registry.new_id()
+        try:
+            result, entry = await index_document(doc_id, tmp_path, file.filename)
+        except Exception as e:
+            logger.error(f"Ingestion failed: {e}", exc_info=True)
+            error = "Vector store upsert failed." if USE_PINECONE else "Failed to process document."
+            return JSONResponse(status_code=500, content={"error": error})
+        result.timings["upload"] = upload_seconds
+        STAGE_SECONDS.observe(upload_seconds, stage="upload")
 
-        if not all_docs:
+        if entry is None:
             return JSONResponse(status_code=400, content={"error": "Could not extract text from the document."})
-            
-        if USE_PINECONE:
-            # Persist to Pinecone index (assumes index already exists)
-            logger.info(f"Upserting {len(all_docs)} chunks to Pinecone index '{PINECONE_INDEX}'...")
-            try:
-                if PINECONE_HOST:
-                    vectorstore = PineconeVectorStore.from_documents(
-                        documents=all_docs,
-                        embedding=embeddings,
-                        index_name=PINECONE_INDEX,
-                        host=PINECONE_HOST,
-                    )
-                else:
-                    vectorstore = PineconeVectorStore.from_documents(
-                        documents=all_docs,
-                        embedding=embeddings,
-                        index_name=PINECONE_INDEX,
-                    )
-                logger.info("Pinecone upsert complete.")
-            except Exception as e:
-                logger.error(f"Pinecone upsert failed: {e}", exc_info=True)
-                return JSONResponse(status_code=500, content={"error": "Vector store upsert failed."})
-        else:
-            vectorstore = FAISS.from_documents(all_docs, embeddings)
 
-        # Generate summary from the first few pages
-        summary_text = " ".join([doc.page_content for doc in all_docs[:3]])
-        llm = get_llm()
-        prompt = f"Summarize this document in approximately {summary_words} words: {summary_text}"
-        response = llm.invoke(prompt)
-        summary = response.content
+        if stream:
+            ready = ({"doc_id": doc_id, "version": entry.version, "ingestion": result.report()}, "document")
+            return sse_response(sse_stream(stream_summary(entry, summary_words), "summary", first_event=ready))
+
+        summary = await summarize_document(entry, summary_words)
 
-        return {"summary": summary}
+        return {"doc_id": doc_id, "version": entry.version, "summary": summary, "ingestion": result.report()}
     except Exception as e:
         logger.error(f"Error in upload_document: {e}", exc_info=True)
         return JSONResponse(status_code=500, content={"error": "Failed to process document."})
@@ -172,78 +733,218 @@ async def upload_document(file: UploadFile = File(...), summary_words: int = For
         if 'tmp_path' in locals() and os.path.exists(tmp_path):
             os.remove(tmp_path)
 
+@app.post("/documents", status_code=202)
+async def create_document(file: UploadFile = File(...), summary_words: int = Form(150), summarize: bool = Form(True),
+                          doc_id: Optional[str] = Form(None)):
+    """Queue a document for background ingestion and return its job id.
+
+    With ``summarize=false`` the job ends once the index is ready, and the
+    client fetches (or streams) the summary from ``/documents/{id}/summary``.
+    With ``doc_id`` the upload becomes a new version of that document and
+    only its changed chunks are re-indexed; the job id is the ``doc_id``.
+    """
+    error = await get_models()
+    if error:
+        return error
+    error = await check_new_version(doc_id)
+    if error:
+        return error
+    try:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+            tmp_path = tmp.name
+        upload_seconds = await ingestion.stream_upload(file, tmp_path)
+    except Exception as e:
+        logger.error(f"Error receiving upload: {e}", exc_info=True)
+        if 'tmp_path' in locals() and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return JSONResponse(status_code=500, content={"error": "Failed to receive document."})
+
+    doc_id = doc_id or registry.new_id()
+    payload = {"path": tmp_path, "filename": file.filename, "summary_words": summary_words, "summarize": summarize,
+               "request_id": request_id_var.get()}
+    try:
+        job = jobs.submit(doc_id, payload)
+    except JobExistsError:
+        # Another upload of this doc_id got in while this one was being received
+        os.remove(tmp_path)
+        return JSONResponse(status_code=409, content={"error": "This document is still being processed."})
+    except QueueFullError as e:
+        os.remove(tmp_path)
+        return JSONResponse(status_code=503, content={"error": str(e)})
+    job.progress["upload_seconds"] = round(upload_seconds, 4)
+    STAGE_SECONDS.observe(upload_seconds, stage="upload")
+    return {"job_id": doc_id, "doc_id": doc_id, "status": job.status}
+
+@app.get("/documents/{job_id}/status")
+async def document_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        if registry and await asyncio.to_thread(registry.get, job_id):
+            # Finished before this worker started (or after its job record expired)
+            return {"job_id": job_id, "status": "done", "stage": "done", "result": {"doc_id": job_id, "ready": True}}
+        return JSONResponse(status_code=404, content={"error": "Unknown job."})
+    return job.to_dict()
+
+@app.get("/documents/{doc_id}/summary")
+async def document_summary(doc_id: str, summary_words: int = 150, stream: bool = False):
+    entry, error = await get_document(doc_id)
+    if error:
+        return error
+    if stream:
+        return sse_response(sse_stream(stream_summary(entry, summary_words), "summary"))
+    try:
+        return {"doc_id": doc_id, "summary": await summarize_document(entry, summary_words)}
+    except Exception as e:
+        logger.error(f"Error in summary: {e}", exc_info=True)
+        return JSONResponse(status_code=500, content={"error": "Failed to generate summary."})
+
+@app.post("/documents/{job_id}/cancel")
+async def cancel_document(job_id: str):
+    job = jobs.cancel(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown job."})
+    return {"job_id": job_id, "status": job.status}
+
+@app.delete("/documents/{doc_id}")
+async def delete_document(doc_id: str):
+    error = await get_models()
+    if error:
+        return error
+    if jobs.get(doc_id):
+        jobs.cancel(doc_id)
+    if USE_PINECONE and await asyncio.to_thread(registry.get, doc_id):
+        try:
+            get_pinecone_store(doc_id).delete(delete_all=True)
+        except Exception as e:
+            logger.error(f"Failed to delete Pinecone namespace {doc_id}: {e}", exc_info=True)
+    answer_cache.invalidate(doc_id)
+    if not registry.delete(doc_id):
+        return JSONResponse(status_code=404, content={"error": "Document not found."})
+    return {"deleted": doc_id}
+
 @app.post("/ask")
-async def ask_question(query: str = Form(...)):
-    if not vectorstore and not USE_PINECONE:
-        return JSONResponse(status_code=400, content={"error": "No document has been uploaded yet."})
+async def ask_question(doc_id: str = Form(...), query: str = Form(...), stream: bool = Form(False)):
+    entry, error = await get_document(doc_id)
+    if error:
+        return error
     
     try:
+        cache_key = answer_cache_key(entry)
+        cached = answer_cache.get(cache_key, query)
+        query_vector = None
+        if cached is None:
+            # Queries from concurrent requests are embedded together off the event loop.
+            # The vector serves both the semantic cache lookup and retrieval.
+            query_vector = await embed_query(query)
+            cached = answer_cache.get_similar(cache_key, query_vector)
+        if cached is not None:
+            if stream:
+                return sse_response(sse_stream(single_token(cached), "answer"))
+            return {"answer": cached, "cached": True}
+
         llm = get_llm(model="llama3-70b-8192")
-        if USE_PINECONE:
-            # Reconnect to Pinecone-backed vector store on-demand
-            try:
-                if PINECONE_HOST:
-                    pinecone_vs = PineconeVectorStore(
-                        index_name=PINECONE_INDEX,
-                        embedding=embeddings,
-                        host=PINECONE_HOST,
-                    )
-                else:
-                    pinecone_vs = PineconeVectorStore(
-                        index_name=PINECONE_INDEX,
-                        embedding=embeddings,
-                    )
-                retriever = pinecone_vs.as_retriever()
-            except Exception as e:
-                logger.error(f"Failed to connect to Pinecone index: {e}", exc_info=True)
-                return JSONResponse(status_code=500, content={"error": "Vector store unavailable."})
-        else:
-            retriever = vectorstore.as_retriever()
+        try:
+            store = get_vector_store(doc_id, entry)
+        except Exception as e:
+            logger.error(f"Failed to connect to Pinecone index: {e}", exc_info=True)
+            return JSONResponse(status_code=500, content={"error": "Vector store unavailable."})
 
-        qa_chain = RetrievalQA.from_chain_type(llm, retriever=retriever)
-        answer = qa_chain.run(query)
-        return {"answer": answer}
+        docs = await retrieve_chunks(entry, store, query, query_vector)
+        # As many of the retrieved chunks as fit the token budget, best first
+        budget = context_budget(llm.model, QA_PROMPT.format(context="", question=query), ANSWER_MAX_TOKENS)
+        context, packing = pack_context(docs, budget, endpoint="ask")
+        prompt = QA_PROMPT.format(context=context, question=query)
+        if stream:
+            tokens = cache_answer_when_done(llm.stream(prompt, max_tokens=ANSWER_MAX_TOKENS), cache_key, query, query_vector)
+            return sse_response(sse_stream(tokens, "answer"))
+        answer = await llm.complete(prompt, max_tokens=ANSWER_MAX_TOKENS)
+        answer_cache.put(cache_key, query, answer, query_vector)
+        return {"answer": answer, "context": packing}
     except Exception as e:
         logger.error(f"Error in ask: {e}", exc_info=True)
         return JSONResponse(status_code=500, content={"error": "Failed to get an answer."})
 
 @app.post("/challenge")
-async def generate_challenges():
-    if not all_docs:
-        return JSONResponse(status_code=400, content={"error": "No document has been uploaded yet."})
+async def generate_challenges(doc_id: str = Form(...), exclude: str = Form("")):
+    """Serve challenge questions from the document's bank.
+
+    ``exclude`` is a comma-separated list of challenge ids already shown in
+    this session; they are not repeated. When fewer unseen questions are
+    left than a request needs (or the bank is not built yet), the rest are
+    generated live and follow the bank questions, which alone have ids.
+    """
+    entry, error = await get_document(doc_id)
+    if error:
+        return error
+
+    seen = {i for i in exclude.split(",") if i}
+    bank = [c for c in registry.get_challenges(doc_id, entry.version) or [] if c["id"] not in seen]
+    picked = random.sample(bank, min(len(bank), CHALLENGES_PER_REQUEST))
+    questions = [c["question"] for c in picked]
+    challenge_ids = [c["id"] for c in picked]
+    missing = CHALLENGES_PER_REQUEST - len(picked)
+    if not missing:
+        return {"questions": questions, "challenge_ids": challenge_ids, "source": "bank"}
         
     try:
-        context = " ".join([doc.page_content for doc in all_docs[:5]])
+        # Draw live questions from a random part of the document, not just its start
+        start = random.randrange(max(1, len(entry.chunks) - RETRIEVAL_K + 1))
         llm = get_llm()
-        prompt = f"Generate 3 simple, numbered questions based on this text. Each question must end with a question mark. \n\nText: {context}\n\nQuestions:"
-        response = llm.invoke(prompt)
-        content = response.content
+        template = "Generate {n} simple, numbered questions based on this text. Each question must end with a question mark. \n\nText: {context}\n\nQuestions:"
+        budget = context_budget(llm.model, template.format(n=missing, context=""), CHALLENGE_MAX_TOKENS)
+        context, _ = pack_context(entry.chunks[start:start + RETRIEVAL_K], budget, separator=" ", endpoint="challenge")
+        prompt = template.format(n=missing, context=context)
+        content = await llm.complete(prompt, max_tokens=CHALLENGE_MAX_TOKENS)
         
         # Split questions and strip any leading numbering (e.g., "1. ", "2- ") and trailing question marks
         raw_questions = [q.strip() for q in content.split('\n') if '?' in q]
-        questions = [re.sub(r'^\d+[\.\-\)\:]?\s*', '', q).rstrip(' ?') for q in raw_questions]
-        
-        return {"questions": questions[:3]}
+        live = [re.sub(r'^\d+[\.\-\)\:]?\s*', '', q).rstrip(' ?') for q in raw_questions][:missing]
     except Exception as e:
         logger.error(f"Error in challenge: {e}", exc_info=True)
-        return JSONResponse(status_code=500, content={"error": "Failed to generate challenges."})
+        if not picked:
+            return JSONResponse(status_code=500, content={"error": "Failed to generate challenges."})
+        # The remaining bank questions are still worth serving
+        live = []
+
+    source = "mixed" if picked and live else ("bank" if picked else "live")
+    return {"questions": questions + live, "challenge_ids": challenge_ids, "source": source}
 
 @app.post("/evaluate")
-async def evaluate_answer(question: str = Form(...), answer: str = Form(...)):
-    if not all_docs:
-        return JSONResponse(status_code=400, content={"error": "No document has been uploaded yet."})
+async def evaluate_answer(doc_id: str = Form(...), question: str = Form(...), answer: str = Form(...),
+                          challenge_id: Optional[str] = Form(None)):
+    entry, error = await get_document(doc_id)
+    if error:
+        return error
 
     try:
-        context = " ".join([doc.page_content for doc in all_docs[:5]])
-        llm = get_llm()
-        prompt = f"Based on the text: '{context}', evaluate this answer: '{answer}' for the question: '{question}'."
-        response = llm.invoke(prompt)
-        feedback = response.content
+        feedback = await evaluate_one(doc_id, entry, question, answer, challenge_id)
         return {"feedback": feedback}
     except Exception as e:
         logger.error(f"Error in evaluate: {e}", exc_info=True)
         return JSONResponse(status_code=500, content={"error": "Failed to evaluate the answer."})
 
+@app.post("/evaluate-batch")
+async def evaluate_batch(request: EvaluateBatchRequest):
+    """Evaluate several answers concurrently; latency is the slowest one, not the sum."""
+    entry, error = await get_document(request.doc_id)
+    if error:
+        return error
+    if len(request.items) > MAX_EVALUATE_BATCH:
+        return JSONResponse(status_code=400, content={"error": f"At most {MAX_EVALUATE_BATCH} answers per batch."})
+
+    results = await asyncio.gather(
+        *(evaluate_one(request.doc_id, entry, item.question, item.answer, item.challenge_id) for item in request.items),
+        return_exceptions=True,
+    )
+    feedback = []
+    for item, result in zip(request.items, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error evaluating '{item.question}': {result}", exc_info=result)
+            feedback.append(None)
+        else:
+            feedback.append(result)
+    return {"feedback": feedback}
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
@@ -0,0 +1,141 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Sequence, Tuple
+
+# Set per HTTP request by main.py and copied into tasks and threads it starts
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_metrics = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        yield from super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                yield f"{self.name}{_labels(self.label_names, key)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - began, **labels)
+
+    def render(self):
+        yield from super().render()
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    yield f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}"
+                le = 'le="+Inf"'
+                yield f"{self.name}_bucket{_labels(self.label_names, key, le)} {series[-1]}"
+                yield f"{self.name}_sum{_labels(self.label_names, key)} {series[-2]}"
+                yield f"{self.name}_count{_labels(self.label_names, key)} {series[-1]}"
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(line for metric in _metrics for line in metric.render()) + "\n"
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds ``request_id`` to every log record so one request can be traced."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+HTTP_REQUEST_SECONDS = Histogram("docmind_http_request_seconds", "Time to produce a response, by route", ["method", "route", "status"])
+STAGE_SECONDS = Histogram("docmind_stage_seconds", "Time per pipeline stage (parse, split, embed, index, bm25, retrieval, ...)", ["stage"])
+LLM_REQUEST_SECONDS = Histogram("docmind_llm_request_seconds", "LLM call latency including retries", ["model", "mode", "outcome"])
+LLM_RETRIES = Counter("docmind_llm_retries_total", "LLM attempts that were retried", ["model", "reason"])
+LLM_TIMEOUTS = Counter("docmind_llm_timeouts_total", "LLM attempts that timed out", ["model"])
+LLM_TOKENS = Counter("docmind_llm_tokens_total", "Tokens reported by the LLM API", ["model", "type"])
+# Hit ratio: sum by (cache) (rate(docmind_cache_lookups_total{result="hit"}[5m])) / sum by (cache) (rate(docmind_cache_lookups_total[5m]))
+CACHE_LOOKUPS = Counter("docmind_cache_lookups_total", "Cache lookups, by result", ["cache", "result"])
+QUEUE_DEPTH = Gauge("docmind_queue_depth", "Items waiting in internal queues", ["queue"])
+LLM_WAITING = Gauge("docmind_llm_waiting_requests", "LLM requests waiting for a concurrency slot", ["model"])
+LLM_IN_FLIGHT = Gauge("docmind_llm_in_flight_requests", "LLM requests currently in flight", ["model"])
+LLM_COALESCED = Counter("docmind_llm_coalesced_total", "LLM calls served by an identical request already in flight", ["model", "mode"])
+LLM_FAILOVERS = Counter("docmind_llm_failovers_total", "LLM calls sent to a fallback model", ["from_model", "to_model", "reason"])
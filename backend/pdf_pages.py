@@ -0,0 +1,20 @@
+"""PDF page extraction, run in the ingestion process pool.
+
+Kept free of heavy imports: pool workers are started from a clean
+interpreter and only import this module.
+"""
+import time
+
+
+def count_pages(path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def extract_pages(path: str, start: int, stop: int):
+    """Runs in a worker process: extract text for pages [start, stop)."""
+    from pypdf import PdfReader
+    began = time.perf_counter()
+    reader = PdfReader(path)
+    pages = [(i, reader.pages[i].extract_text() or "") for i in range(start, stop)]
+    return pages, time.perf_counter() - began
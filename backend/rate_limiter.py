@@ -0,0 +1,203 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes: lower runs first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds from a reset header: "7.66s", "2m59.56s", "120ms" or a bare number."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    return sum(float(n) * _UNITS[unit] for n, unit in parts) if parts else None
+
+
+class Bucket:
+    """Token bucket refilled continuously at ``rate`` per second up to ``capacity``.
+
+    The level may go negative when a request turns out to cost more than
+    estimated; later requests then wait for the debt to refill.
+    """
+
+    def __init__(self, capacity: float, rate: float, level: float = None):
+        self.capacity = capacity
+        self.rate = rate
+        self.level = capacity if level is None else level
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, cost: float) -> float:
+        """Seconds until ``cost`` (capped at capacity) is available."""
+        need = min(cost, self.capacity)
+        if self.level >= need:
+            return 0.0
+        return (need - self.level) / self.rate if self.rate > 0 else math.inf
+
+    def learn(self, limit: Optional[float], remaining: Optional[float], reset: Optional[float], window: float):
+        if limit:
+            self.capacity = limit
+            # Until the reset says otherwise, assume the limit refills over ``window``
+            self.rate = self.rate or limit / window
+        if remaining is not None:
+            # The server's count wins; it sees requests from every worker and host
+            self.level = min(self.level, remaining)
+            if reset and limit and remaining < limit:
+                self.rate = (limit - remaining) / reset
+
+
+class RateLimiter:
+    """Adaptive client-side limit on requests and tokens for one LLM model.
+
+    Limits start at ``requests_per_minute`` / ``tokens_per_minute`` (0 means
+    unknown: no limit until the API reports one) and are then learned from
+    the ``x-ratelimit-*`` response headers that Groq and OpenAI send. A 429
+    pauses every caller until ``retry-after`` instead of letting each one
+    back off on its own. Waiting callers are served by priority lane, then
+    in arrival order, and background callers are held to
+    ``background_concurrency`` requests in flight so interactive ones always
+    find room.
+    """
+
+    def __init__(self, name: str, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 background_concurrency: int = 0):
+        self.name = name
+        self.requests = Bucket(requests_per_minute, requests_per_minute / 60) if requests_per_minute else None
+        self.tokens = Bucket(tokens_per_minute, tokens_per_minute / 60) if tokens_per_minute else None
+        self.background_concurrency = background_concurrency
+        self.background_in_flight = 0
+        self.paused_until = 0.0
+        self.rate_limited = 0
+        self.waited_seconds = 0.0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._cond = asyncio.Condition()
+
+    def _delay(self, ticket, cost: float, priority: int, now: float) -> float:
+        if self._waiters[0] != ticket:
+            return math.inf
+        if priority != INTERACTIVE and self.background_concurrency and \
+                self.background_in_flight >= self.background_concurrency:
+            return math.inf
+        delay = max(0.0, self.paused_until - now)
+        for bucket, amount in ((self.requests, 1), (self.tokens, cost)):
+            if bucket is not None:
+                bucket.refill(now)
+                delay = max(delay, bucket.wait_for(amount))
+        return delay
+
+    def expected_wait(self, cost: float = 0, priority: int = INTERACTIVE) -> float:
+        """Rough seconds a new request would wait, for failover decisions."""
+        now = time.monotonic()
+        delay = max(0.0, self.paused_until - now)
+        for bucket, amount in ((self.requests, 1), (self.tokens, cost)):
+            if bucket is not None:
+                bucket.refill(now)
+                delay = max(delay, bucket.wait_for(amount))
+        ahead = sum(1 for p, _ in self._waiters if p <= priority)
+        if ahead and self.requests is not None and self.requests.rate > 0:
+            delay += ahead / self.requests.rate
+        return delay
+
+    @asynccontextmanager
+    async def acquire(self, cost: float = 0, priority: int = INTERACTIVE):
+        """Wait for room for one request estimated at ``cost`` tokens."""
+        ticket = (priority, next(self._seq))
+        began = time.monotonic()
+        async with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    delay = self._delay(ticket, cost, priority, time.monotonic())
+                    if delay <= 0:
+                        break
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), None if math.isinf(delay) else delay)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+            if self.requests is not None:
+                self.requests.level -= 1
+            if self.tokens is not None:
+                self.tokens.level -= cost
+            if priority != INTERACTIVE:
+                self.background_in_flight += 1
+        self.waited_seconds += time.monotonic() - began
+        try:
+            yield
+        finally:
+            if priority != INTERACTIVE:
+                async with self._cond:
+                    self.background_in_flight -= 1
+                    self._cond.notify_all()
+
+    def observe(self, status_code: int, headers: Mapping[str, str]):
+        """Learn limits from a response's rate-limit headers."""
+        def number(name):
+            try:
+                return float(headers[name])
+            except (KeyError, TypeError, ValueError):
+                return None
+
+        now = time.monotonic()
+        for kind, window in (("requests", 86400.0), ("tokens", 60.0)):
+            limit, remaining = number(f"x-ratelimit-limit-{kind}"), number(f"x-ratelimit-remaining-{kind}")
+            if limit is None and remaining is None:
+                continue
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            bucket = getattr(self, kind)
+            if bucket is None and limit:
+                bucket = Bucket(limit, 0.0, level=limit)
+                setattr(self, kind, bucket)
+            if bucket is not None:
+                bucket.refill(now)
+                bucket.learn(limit, remaining, reset, window)
+        if status_code == 429:
+            self.rate_limited += 1
+            pause = parse_duration(headers.get("retry-after"))
+            if pause is None:
+                resets = [parse_duration(headers.get(f"x-ratelimit-reset-{k}")) for k in ("requests", "tokens")]
+                pause = min([r for r in resets if r] or [1.0])
+            self.paused_until = max(self.paused_until, now + pause)
+            logger.warning(f"LLM {self.name} rate limited; pausing requests for {pause:.2f}s")
+
+    def settle(self, estimated: float, actual: Optional[float]):
+        """Correct the token bucket once the API reports what a request really cost."""
+        if self.tokens is not None and actual is not None:
+            self.tokens.level += estimated - actual
+
+    def stats(self) -> dict:
+        bucket = lambda b: None if b is None else {
+            "capacity": round(b.capacity, 1), "level": round(b.level, 1), "per_second": round(b.rate, 3)}
+        return {
+            "requests": bucket(self.requests),
+            "tokens": bucket(self.tokens),
+            "waiting": len(self._waiters),
+            "background_in_flight": self.background_in_flight,
+            "paused_for": round(max(0.0, self.paused_until - time.monotonic()), 3),
+            "rate_limited": self.rate_limited,
+            "waited_seconds": round(self.waited_seconds, 3),
+        }
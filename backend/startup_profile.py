@@ -0,0 +1,42 @@
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfile:
+    """Wall-clock seconds spent in each startup stage, in the order they ran.
+
+    Import this module first so ``began`` marks the start of the process's
+    own imports. For a per-module breakdown of a stage, run
+    ``python -X importtime -c "import <module>"``.
+    """
+
+    def __init__(self):
+        self.began = time.perf_counter()
+        self.stages = {}
+        self.marks = {}
+
+    def record(self, name: str, seconds: float):
+        self.stages[name] = round(seconds, 4)
+        logger.info(f"Startup: {name} took {seconds:.3f}s")
+
+    @contextmanager
+    def stage(self, name: str):
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - began)
+
+    def mark(self, name: str):
+        """Record seconds from process start until now, e.g. "serving" or "ready"."""
+        self.marks[name] = round(time.perf_counter() - self.began, 4)
+        logger.info(f"Startup: {name} after {self.marks[name]:.3f}s")
+
+    def report(self) -> dict:
+        return {"stages": dict(self.stages), "marks": dict(self.marks)}
+
+
+profile = StartupProfile()
@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import List
+
+from metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Inputs up to this size go straight to the final summary prompt
+FINAL_INPUT_CHARS = int(os.getenv("SUMMARY_FINAL_INPUT_CHARS", "8000"))
+GROUP_CHARS = int(os.getenv("SUMMARY_GROUP_CHARS", "6000"))
+MAP_WORDS = int(os.getenv("SUMMARY_MAP_WORDS", "150"))
+MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
+
+# Bump when MAP_PROMPT changes so stale partial summaries are not reused
+MAP_PROMPT_VERSION = "1"
+MAP_PROMPT = """Summarize the following part of a document in at most {words} words. Keep key facts, names, numbers and conclusions.
+
+Text:
+{text}
+
+Summary:"""
+
+
+class PartialSummaryCache:
+    """SQLite store of map-stage summaries keyed by (model, chunk group hash)."""
+
+    def __init__(self, path: str, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS partial_summaries (
+                   key TEXT PRIMARY KEY,
+                   summary TEXT NOT NULL,
+                   last_used REAL NOT NULL
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_partial_last_used ON partial_summaries(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{MAP_PROMPT_VERSION}\0{MAP_WORDS}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT summary FROM partial_summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(cache="partial_summary", result="miss")
+                return None
+            self._conn.execute("UPDATE partial_summaries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            CACHE_LOOKUPS.inc(cache="partial_summary", result="hit")
+            return row[0]
+
+    def put(self, key: str, summary: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO partial_summaries (key, summary, last_used) VALUES (?, ?, ?)",
+                (key, summary, time.time()),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM partial_summaries").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM partial_summaries WHERE key IN "
+                    "(SELECT key FROM partial_summaries ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def group_texts(texts: List[str], max_chars: int = GROUP_CHARS) -> List[str]:
+    """Join consecutive texts into groups of at most ``max_chars`` (one text may exceed it)."""
+    groups, current, size = [], [], 0
+    for text in texts:
+        if current and size + len(text) > max_chars:
+            groups.append("\n".join(current))
+            current, size = [], 0
+        current.append(text)
+        size += len(text) + 1
+    if current:
+        groups.append("\n".join(current))
+    return groups
+
+
+async def condense(texts: List[str], llm, cache: PartialSummaryCache = None) -> str:
+    """Map-reduce ``texts`` until they fit in one final summary prompt.
+
+    Groups of consecutive texts are summarized concurrently (map); the
+    partial summaries are then grouped and summarized again (reduce) until
+    the result is at most ``FINAL_INPUT_CHARS``. Map results for unchanged
+    groups come from ``cache``, so a different word count or a re-upload
+    only pays for the final step.
+    """
+    semaphore = asyncio.Semaphore(MAP_CONCURRENCY)
+
+    async def summarize_group(text):
+        key = PartialSummaryCache.key(llm.model, text)
+        if cache is not None:
+            cached = await asyncio.to_thread(cache.get, key)
+            if cached is not None:
+                return cached
+        async with semaphore:
+            summary = await llm.complete(MAP_PROMPT.format(words=MAP_WORDS, text=text), temperature=0.3)
+        if cache is not None:
+            await asyncio.to_thread(cache.put, key, summary)
+        return summary
+
+    level = 0
+    while sum(len(t) + 1 for t in texts) > FINAL_INPUT_CHARS:
+        groups = group_texts(texts)
+        if len(groups) == len(texts) and level > 0:
+            # Summaries are not getting shorter; stop rather than loop forever
+            break
+        texts = await asyncio.gather(*(summarize_group(g) for g in groups))
+        level += 1
+        logger.info(f"Summary level {level}: {len(groups)} groups -> {sum(len(t) for t in texts)} chars")
+    return "\n".join(texts)[:FINAL_INPUT_CHARS * 2]
+
+
+def summary_max_tokens(max_words: int) -> int:
+    # Calculate max_tokens more generously for longer summaries
+    if max_words <= 200:
+        return int(max_words * 2) + 200
+    elif max_words <= 400:
+        return int(max_words * 2.5) + 300
+    return int(max_words * 3) + 500
+
+
+def final_prompt(text: str, max_words: int) -> str:
+    # Create stronger prompts based on detail level
+    if max_words <= 200:
+        return f"""Create a concise summary of this document in EXACTLY {max_words} words. Do not exceed this word count.
+
+Document:
+{text}
+
+Instructions:
+- Write exactly {max_words} words
+- Focus on main points and key findings
+- Be concise but comprehensive
+
+Summary:"""
+    elif max_words <= 400:
+        return f"""Create a detailed summary of this document in EXACTLY {max_words} words. Do not exceed this word count.
+
+Document:
+{text}
+
+Instructions:
+- Write exactly {max_words} words
+- Include main points, methodology, key findings, and conclusions
+- Structure the summary clearly
+
+Summary:"""
+    return f"""Create a comprehensive summary of this document in EXACTLY {max_words} words. Do not exceed this word count.
+
+Document:
+{text}
+
+Instructions:
+- Write exactly {max_words} words
+- Include main points, methodology, key findings, conclusions, and important details
+- Structure the summary with clear sections
+- Be thorough and detailed
+
+Summary:"""
+
+
+async def summarize(texts: List[str], max_words: int, llm, cache: PartialSummaryCache = None) -> str:
+    condensed = await condense(texts, llm, cache)
+    return await llm.complete(final_prompt(condensed, max_words), max_tokens=summary_max_tokens(max_words), temperature=0.3)
+
+
+async def stream_summary(texts: List[str], max_words: int, llm, cache: PartialSummaryCache = None):
+    """Like ``summarize``, but streams the final reduce step."""
+    condensed = await condense(texts, llm, cache)
+    async for token in llm.stream(final_prompt(condensed, max_words), max_tokens=summary_max_tokens(max_words), temperature=0.3):
+        yield token
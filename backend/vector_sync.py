@@ -0,0 +1,146 @@
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Iterable, List, Optional, Set
+
+from embedding_cache import text_hash
+
+logger = logging.getLogger(__name__)
+
+# 128 bits of the SHA-256 is plenty to tell the chunks of one document apart
+CHUNK_HASH_LENGTH = 32
+
+# Pinecone accepts at most 1000 ids per delete request
+DELETE_BATCH_SIZE = 1000
+
+
+def chunk_hash(text: str) -> str:
+    return text_hash(text)[:CHUNK_HASH_LENGTH]
+
+
+class VectorIds:
+    """Deterministic vector ids: the chunk hash plus its occurrence number.
+
+    Repeated chunks (headers, boilerplate) get ``<hash>-0``, ``<hash>-1``...
+    so an unchanged chunk keeps its id across versions of a document.
+    """
+
+    def __init__(self):
+        self._seen = Counter()
+
+    def next(self, hash_: str) -> str:
+        vector_id = f"{hash_}-{self._seen[hash_]}"
+        self._seen[hash_] += 1
+        return vector_id
+
+    @classmethod
+    def for_chunks(cls, chunks) -> Optional[List[str]]:
+        """Ids for a stored version, or None if it predates chunk hashes."""
+        ids = cls()
+        hashes = [c.metadata.get("chunk_hash") for c in chunks]
+        if not all(hashes):
+            return None
+        return [ids.next(h) for h in hashes]
+
+
+def previous_vectors(vectorstore, chunks) -> Dict[str, List[float]]:
+    """Vectors of a stored version keyed by chunk hash, so they are not re-embedded.
+
+    Only exact vectors are reused: flat and HNSW indexes hand them back
+    directly and IVF-Flat after building its direct map. Product-quantized
+    indexes only hold approximations, so their chunks go through the
+    embedding cache instead.
+    """
+    index = getattr(vectorstore, "index", None)
+    if index is None or index.ntotal != len(chunks):
+        return {}
+    import faiss
+    try:
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            if not isinstance(faiss.downcast_index(ivf), faiss.IndexIVFFlat):
+                return {}
+            ivf.make_direct_map()
+        vectors = index.reconstruct_n(0, index.ntotal)
+    except RuntimeError as e:
+        logger.info(f"Cannot reuse vectors from the previous version ({e}); using the embedding cache")
+        return {}
+    return {c.metadata["chunk_hash"]: v.tolist() for c, v in zip(chunks, vectors) if c.metadata.get("chunk_hash")}
+
+
+class PineconeSync:
+    """Writes a new document version into its Pinecone namespace incrementally.
+
+    ``write`` is the ``index_batch`` callback of ``ingest_pdf``: chunks whose
+    id already exists in the namespace (``old_ids``) are skipped, the rest
+    are upserted in ``batch_size`` requests on ``concurrency`` threads while
+    ingestion carries on. ``finish`` waits for the upserts and deletes the
+    ids of chunks that are gone. ``old_ids=None`` means a first upload.
+    """
+
+    def __init__(self, index, namespace: str, embeddings, old_ids: Optional[Iterable[str]] = None,
+                 batch_size: int = 100, concurrency: int = 4, text_key: str = "text"):
+        self.index = index
+        self.namespace = namespace
+        self.embeddings = embeddings
+        self.old_ids: Set[str] = set(old_ids or ())
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.text_key = text_key
+        self.new_ids: Set[str] = set()
+        self.upserted = 0
+        self.skipped = 0
+        self.deleted = 0
+        self._ids = VectorIds()
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"pinecone-{namespace[:8]}")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def write(self, chunks, vectors):
+        rows = []
+        for chunk, vector in zip(chunks, vectors):
+            vector_id = self._ids.next(chunk.metadata["chunk_hash"])
+            self.new_ids.add(vector_id)
+            if vector_id in self.old_ids:
+                self.skipped += 1
+                continue
+            rows.append([vector_id, vector, dict(chunk.metadata, **{self.text_key: chunk.page_content})])
+
+        # Unchanged text under a new id (a duplicate shifted) was not embedded
+        missing = [row for row in rows if row[1] is None]
+        if missing:
+            for row, vector in zip(missing, self.embeddings.embed_documents([r[2][self.text_key] for r in missing])):
+                row[1] = vector
+
+        for start in range(0, len(rows), self.batch_size):
+            batch = [{"id": i, "values": v, "metadata": m} for i, v, m in rows[start:start + self.batch_size]]
+            with self._lock:
+                # Backpressure: at most two rounds of requests in flight
+                while len(self._pending) >= self.concurrency * 2:
+                    done, self._pending = wait(self._pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                self._pending.add(self._pool.submit(self.index.upsert, vectors=batch, namespace=self.namespace))
+            self.upserted += len(batch)
+
+    def finish(self) -> dict:
+        try:
+            with self._lock:
+                pending, self._pending = self._pending, set()
+            for future in pending:
+                future.result()
+            removed = sorted(self.old_ids - self.new_ids)
+            batches = [removed[i:i + DELETE_BATCH_SIZE] for i in range(0, len(removed), DELETE_BATCH_SIZE)]
+            for future in [self._pool.submit(self.index.delete, ids=b, namespace=self.namespace) for b in batches]:
+                future.result()
+            self.deleted = len(removed)
+        finally:
+            self.close()
+        return self.report()
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def report(self) -> dict:
+        return {"upserted": self.upserted, "unchanged": self.skipped, "deleted": self.deleted}
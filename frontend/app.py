@@ -1,23 +1,77 @@
-from flask import Flask, render_template, request, flash, redirect, url_for, session
+from flask import Flask, render_template, request, flash, redirect, url_for, session, jsonify, Response, stream_with_context, g, has_request_context
 import requests
+from requests.adapters import HTTPAdapter
+from session_store import SqliteSessionInterface, SqliteSessionStore, load_secret_key
 import os
+import re
+import uuid
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+class RequestIdFilter(logging.Filter):
+    """Adds the current request id to log records (``-`` outside requests)."""
+    def filter(self, record):
+        record.request_id = g.get("request_id", "-") if has_request_context() else "-"
+        return True
+
+# Set up logging; the request id matches the backend's log lines for the same request
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:[%(request_id)s] %(message)s")
+for handler in logging.getLogger().handlers:
+    handler.addFilter(RequestIdFilter())
 logger = logging.getLogger(__name__)
 
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+# Sessions live server-side in SQLite; the cookie only carries a signed session id
+SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH", os.path.join(DATA_DIR, "sessions.sqlite3"))
+# All workers must share the key; without FLASK_SECRET_KEY one is generated into this file
+SECRET_KEY_PATH = os.environ.get("SECRET_KEY_PATH", os.path.join(DATA_DIR, "secret_key"))
+
+# Backend calls share a pool of keep-alive connections
+BACKEND_POOL_SIZE = int(os.environ.get("BACKEND_POOL_SIZE", "32"))
+BACKEND_CONNECT_TIMEOUT = float(os.environ.get("BACKEND_CONNECT_TIMEOUT", "5"))
+# Long enough for a slow LLM generation
+BACKEND_READ_TIMEOUT = float(os.environ.get("BACKEND_READ_TIMEOUT", "120"))
+
 app = Flask(__name__)
 app.jinja_env.globals.update(zip=zip)
-app.secret_key = os.urandom(24)  # Use a secure, random secret key
+app.secret_key = os.environ.get("FLASK_SECRET_KEY") or load_secret_key(SECRET_KEY_PATH)
+app.session_interface = SqliteSessionInterface(SqliteSessionStore(SESSION_DB_PATH))
 API_URL = os.environ.get("API_URL", "http://localhost:8000")
 
+backend = requests.Session()
+_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=BACKEND_POOL_SIZE)
+backend.mount("http://", _adapter)
+backend.mount("https://", _adapter)
+
 # Log the API URL being used
 logger.info(f"Frontend configured to connect to backend at: {API_URL}")
 
 # Project name for branding
 PROJECT_NAME = "DocMind Ai"
 
+@app.before_request
+def assign_request_id():
+    incoming = request.headers.get("X-Request-ID", "")
+    g.request_id = incoming if re.fullmatch(r"[\w.-]{1,64}", incoming) else uuid.uuid4().hex[:16]
+
+@app.after_request
+def add_request_id_header(response):
+    response.headers["X-Request-ID"] = g.get("request_id", "")
+    return response
+
+def backend_headers():
+    """Headers for backend calls; X-Request-ID lets the backend log under the same id."""
+    return {"X-Request-ID": g.request_id}
+
+def backend_request(method, path, timeout=None, **kwargs):
+    """Call the backend over the pooled session, always with a timeout."""
+    return backend.request(
+        method,
+        f"{API_URL}{path}",
+        headers=backend_headers(),
+        timeout=timeout or (BACKEND_CONNECT_TIMEOUT, BACKEND_READ_TIMEOUT),
+        **kwargs
+    )
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     if 'summary' not in session:
@@ -29,31 +83,40 @@ def index():
     answer = None
     challenge_mode = request.args.get("mode") == "challenge"
 
-    if request.method == "GET" and not challenge_mode:
+    if request.method == "GET" and not challenge_mode and not request.args.get("ready"):
         # Reset session for a fresh start
         session.clear()
 
+    if request.method == "POST" and session.get("doc_uploaded") and not session.get("summary"):
+        # The summary was streamed to the page; the backend has it cached by now
+        session["summary"] = fetch_summary()
+
     if request.method == "POST":
         if "file" in request.files and request.files["file"].filename != "":
             file = request.files["file"]
             summary_words = request.form.get("summary_words", 150)
-            logger.info(f"Uploading file: {file.filename} to {API_URL}/upload-document")
+            logger.info(f"Uploading file: {file.filename} to {API_URL}/documents")
             try:
-                resp = requests.post(
-                    f"{API_URL}/upload-document",
-                    files={"file": (file.filename, file.read())},
-                    data={"summary_words": summary_words},
-                    timeout=60  # Increase timeout to 60 seconds
+                # Only the upload itself happens here; processing runs as a backend job
+                resp = backend_request(
+                    "POST",
+                    "/documents",
+                    files={"file": (file.filename, file.stream)},
+                    # The summary is streamed to the page once the index is ready
+                    data={"summary_words": summary_words, "summarize": "false"},
+                    timeout=(BACKEND_CONNECT_TIMEOUT, 60)
                 )
                 logger.info(f"Upload response status: {resp.status_code}")
-                if resp.status_code == 200:
+                if resp.status_code in (200, 202):
                     try:
                         data = resp.json()
-                        session["summary"] = data.get("summary", "")
-                        session["doc_uploaded"] = True
+                        session["job_id"] = data.get("job_id")
+                        session["doc_id"] = None
+                        session["summary"] = None
+                        session["summary_words"] = summary_words
+                        session["doc_uploaded"] = False
                         session["challenge_questions"] = []
                         session["challenge_feedback"] = []
-                        flash(f"✅ {PROJECT_NAME}: Document processed successfully!", "success")
                     except ValueError:
                         logger.error(f"Invalid JSON response: {resp.text}")
                         flash("❌ Invalid response from server.", "danger")
@@ -76,7 +139,7 @@ def index():
         elif "question" in request.form:
             question = request.form["question"]
             try:
-                resp = requests.post(f"{API_URL}/ask", data={"query": question})
+                resp = backend_request("POST", "/ask", data={"doc_id": session.get("doc_id"), "query": question})
                 if resp.status_code == 200:
                     try:
                         answer = resp.json().get("answer", "No answer returned.")
@@ -91,10 +154,19 @@ def index():
                 flash(f"❌ Connection error: {str(e)}", "danger")
         elif "get_challenges" in request.form:
             try:
-                resp = requests.post(f"{API_URL}/challenge")
+                seen = session.get("challenge_ids_seen", [])
+                resp = backend_request(
+                    "POST",
+                    "/challenge",
+                    data={"doc_id": session.get("doc_id"), "exclude": ",".join(seen)}
+                )
                 if resp.status_code == 200:
                     try:
-                        session["challenge_questions"] = resp.json().get("questions", [])
+                        data = resp.json()
+                        session["challenge_questions"] = data.get("questions", [])
+                        session["challenge_ids"] = data.get("challenge_ids", [])
+                        # Remember served bank questions so they are not repeated this session
+                        session["challenge_ids_seen"] = seen + data.get("challenge_ids", [])
                         session["challenge_feedback"] = [None] * len(session["challenge_questions"])
                     except ValueError:
                         flash("❌ Invalid response from server.", "danger")
@@ -107,35 +179,143 @@ def index():
                 flash(f"❌ Connection error: {str(e)}", "danger")
 
         elif "submit_all_answers" in request.form:
-            session["challenge_feedback"] = []
-            for i, question in enumerate(session.get("challenge_questions", [])):
-                user_answer = request.form.get(f"user_answer_{i}", "")
-                
-                try:
-                    resp = requests.post(
-                        f"{API_URL}/evaluate",
-                        data={"question": question, "answer": user_answer}
-                    )
-                    
-                    if resp.status_code == 200:
-                        feedback_data = resp.json()
-                        session["challenge_feedback"].append(feedback_data.get("feedback", "No feedback."))
-                    else:
-                        session["challenge_feedback"].append("Error from server.")
-                
-                except requests.exceptions.RequestException:
-                    session["challenge_feedback"].append("Connection error.")
+            questions = session.get("challenge_questions", [])
+            challenge_ids = session.get("challenge_ids", [])
+            items = []
+            for i, question in enumerate(questions):
+                item = {"question": question, "answer": request.form.get(f"user_answer_{i}", "")}
+                if i < len(challenge_ids):
+                    item["challenge_id"] = challenge_ids[i]
+                items.append(item)
+
+            # One request for all answers; the backend evaluates them concurrently
+            try:
+                resp = backend_request(
+                    "POST",
+                    "/evaluate-batch",
+                    json={"doc_id": session.get("doc_id"), "items": items}
+                )
+                if resp.status_code == 200:
+                    feedback = resp.json().get("feedback", [])
+                    session["challenge_feedback"] = [
+                        f if f is not None else "Error from server." for f in feedback
+                    ]
+                else:
+                    session["challenge_feedback"] = ["Error from server."] * len(questions)
+            except (requests.exceptions.RequestException, ValueError):
+                session["challenge_feedback"] = ["Connection error."] * len(questions)
 
     return render_template(
         "index.html",
         summary=session.get("summary"),
         doc_uploaded=session.get("doc_uploaded"),
+        processing_job=session.get("job_id") if not session.get("doc_uploaded") else None,
         answer=answer,
         challenge_mode=challenge_mode,
         challenge_questions=session.get("challenge_questions", []),
         challenge_feedback=session.get("challenge_feedback", [])
     )
 
+@app.route("/upload-status")
+def upload_status():
+    """Polled by the page while the backend ingests the uploaded document."""
+    job_id = session.get("job_id")
+    if not job_id:
+        return jsonify({"status": "none"}), 404
+    try:
+        resp = backend_request("GET", f"/documents/{job_id}/status", timeout=(BACKEND_CONNECT_TIMEOUT, 10))
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Status request failed: {str(e)}")
+        return jsonify({"status": "unknown", "error": "Cannot connect to backend server."}), 502
+    try:
+        data = resp.json()
+    except ValueError:
+        return jsonify({"status": "unknown", "error": f"Server error (Status: {resp.status_code})"}), 502
+    if resp.status_code != 200:
+        session.pop("job_id", None)
+        return jsonify({"status": "failed", "error": data.get("error", "Unknown job.")}), resp.status_code
+
+    result = data.get("result") or {}
+    if data.get("status") == "done":
+        session["doc_id"] = result.get("doc_id", job_id)
+        session["summary"] = result.get("summary")
+        session["doc_uploaded"] = True
+        flash(f"✅ {PROJECT_NAME}: Document processed successfully!", "success")
+    elif data.get("status") in ("failed", "cancelled"):
+        session.pop("job_id", None)
+        flash(f"❌ Document processing {data.get('status')}: {data.get('error') or 'no details'}", "danger")
+    return jsonify(data)
+
+def fetch_summary():
+    try:
+        resp = backend_request(
+            "GET",
+            f"/documents/{session.get('doc_id')}/summary",
+            params={"summary_words": session.get("summary_words", 150)},
+            timeout=(BACKEND_CONNECT_TIMEOUT, 60),
+        )
+        if resp.status_code == 200:
+            return resp.json().get("summary")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.error(f"Summary request failed: {str(e)}")
+    return None
+
+def relay_stream(method, path, **kwargs):
+    """Forward a backend server-sent event stream to the browser as it arrives."""
+    try:
+        # The read timeout bounds the gap between events, not the whole stream
+        resp = backend_request(method, path, stream=True, **kwargs)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Stream request failed: {str(e)}")
+        return Response('event: error\ndata: {"error": "Cannot connect to backend server."}\n\n', mimetype="text/event-stream")
+    if resp.status_code != 200:
+        try:
+            error = resp.json().get("error", "Request failed.")
+        except ValueError:
+            error = f"Server error (Status: {resp.status_code})"
+        resp.close()
+        return jsonify({"error": error}), resp.status_code
+
+    def generate():
+        try:
+            for chunk in resp.iter_content(chunk_size=None):
+                yield chunk
+        finally:
+            resp.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route("/summary-stream")
+def summary_stream():
+    return relay_stream(
+        "GET",
+        f"/documents/{session.get('doc_id')}/summary",
+        params={"summary_words": session.get("summary_words", 150), "stream": "true"},
+    )
+
+@app.route("/ask-stream", methods=["POST"])
+def ask_stream():
+    return relay_stream(
+        "POST",
+        "/ask",
+        data={"doc_id": session.get("doc_id"), "query": request.form.get("question", ""), "stream": "true"},
+    )
+
+@app.route("/cancel-upload", methods=["POST"])
+def cancel_upload():
+    job_id = session.pop("job_id", None)
+    if job_id:
+        try:
+            backend_request("POST", f"/documents/{job_id}/cancel", timeout=(BACKEND_CONNECT_TIMEOUT, 10))
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Cancel request failed: {str(e)}")
+    flash("Document processing cancelled.", "danger")
+    return redirect(url_for("index", ready=1))
+
 @app.route("/challenge")
 def challenge():
     return redirect(url_for("index", mode="challenge"))
@@ -143,7 +323,7 @@ def challenge():
 @app.route("/debug")
 def debug():
     try:
-        resp = requests.get(f"{API_URL}/test")
+        resp = backend_request("GET", "/test", timeout=(BACKEND_CONNECT_TIMEOUT, 10))
         if resp.status_code == 200:
             return f"Backend connection successful: {resp.json()}"
         else:
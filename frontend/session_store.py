@@ -0,0 +1,151 @@
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+logger = logging.getLogger(__name__)
+
+# Expired sessions are deleted on roughly one save in this many
+PURGE_EVERY = 200
+
+
+def load_secret_key(path: str) -> bytes:
+    """The key stored at ``path``, created on first use.
+
+    Every worker reads the same file, so a session cookie signed by one
+    worker is accepted by the others and survives restarts. Prefer setting
+    FLASK_SECRET_KEY when workers run on more than one host.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    try:
+        # O_EXCL: when several workers start at once, exactly one writes the key
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        for _ in range(50):
+            with open(path, "rb") as f:
+                key = f.read()
+            if key:
+                return key
+            time.sleep(0.1)  # Another worker is still writing it
+        raise RuntimeError(f"Secret key file {path} is empty")
+    key = secrets.token_hex(32).encode("ascii")
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+class SqliteSessionStore:
+    """SQLite table of serialized sessions; safe to share between worker processes."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._saves = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # WAL lets workers read sessions while another one writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS sessions (
+                   sid TEXT PRIMARY KEY,
+                   data TEXT NOT NULL,
+                   expires REAL NOT NULL
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires)")
+        self._conn.commit()
+
+    def get(self, sid: str):
+        with self._lock:
+            row = self._conn.execute("SELECT data, expires FROM sessions WHERE sid = ?", (sid,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def put(self, sid: str, data: str, expires: float):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)", (sid, data, expires))
+            self._saves += 1
+            if self._saves % PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM sessions WHERE expires < ?", (time.time(),))
+            self._conn.commit()
+
+    def delete(self, sid: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class SqliteSessionInterface(SessionInterface):
+    """Keeps session data in a SqliteSessionStore; the cookie holds only a signed session id.
+
+    Summaries, challenge questions and feedback no longer travel with every
+    request, and the session is written back only when a request changed it.
+    """
+
+    def __init__(self, store: SqliteSessionStore):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt="docmind-session-id")
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode("ascii")
+            except BadSignature:
+                sid = None
+            data = self.store.get(sid) if sid else None
+            if data is not None:
+                try:
+                    return ServerSideSession(session_json_serializer.loads(data), sid=sid)
+                except ValueError:
+                    logger.warning("Discarding unreadable session")
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not self.should_set_cookie(app, session):
+            return
+        expires = self.get_expiration_time(app, session)
+        # Browser-session cookies still need a server-side expiry
+        expires_at = expires.timestamp() if expires else time.time() + app.permanent_session_lifetime.total_seconds()
+        self.store.put(session.sid, session_json_serializer.dumps(dict(session)), expires_at)
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid.encode("ascii")).decode("ascii"),
+            expires=expires,
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )